@@ -0,0 +1,158 @@
+"""Caps how many games and LLM calls run at once. LLM calls are shared between
+games by llm_scheduler.
+
+Games past max_active_games wait in a queue, with an estimate of how long from the
+recent game durations. Once the queue is full, new games are refused with ServerBusy
+instead, which is better than every game slowing down as they share rate limits.
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque
+
+from llm_scheduler import LLMScheduler
+from metrics import metrics
+
+
+@dataclass
+class AdmissionSettings:
+    max_active_games: int = 20
+    max_queued_games: int = 40
+    max_llm_calls: int = 32
+    # Assumed game length until some have finished
+    default_game_duration_s: float = 600.0
+
+
+class ServerBusy(Exception):
+    def __init__(self, retry_after_s: float):
+        super().__init__(f"Server busy, retry in {retry_after_s:.0f}s")
+        self.retry_after_s = retry_after_s
+
+
+class Slots:
+    """A semaphore that's first come first served and knows its queue length.
+    Futures are made as needed, so it isn't tied to the loop it was created in."""
+
+    def __init__(self, capacity: int, name: str):
+        self.capacity = capacity
+        self.name = name
+        self.in_use = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def num_waiting(self) -> int:
+        return len(self.waiters)
+
+    async def acquire(self) -> None:
+        if self.in_use < self.capacity and not self.waiters:
+            self.in_use += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            self.update_gauges()
+            try:
+                # release() hands its slot straight to the waiter
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed a slot just as it was cancelled
+                    self.release()
+                else:
+                    self.waiters.remove(waiter)
+                    self.update_gauges()
+                raise
+        self.update_gauges()
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.update_gauges()
+                return
+        self.in_use -= 1
+        self.update_gauges()
+
+    @asynccontextmanager
+    async def hold(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def update_gauges(self) -> None:
+        metrics.set_gauge(f"{self.name}_in_use", self.in_use)
+        metrics.set_gauge(f"{self.name}_waiting", self.num_waiting)
+
+
+@dataclass
+class Admission:
+    # Games ahead of this one in the queue, 0 if it can start now
+    position: int
+    estimated_wait_s: float
+
+
+class AdmissionControl:
+    def __init__(self, settings: AdmissionSettings = None):
+        self.settings = settings or AdmissionSettings()
+        self.games = Slots(self.settings.max_active_games, "active_games")
+        self.llm_calls = LLMScheduler(self.settings.max_llm_calls)
+        # Admitted and not finished, whether playing or queued
+        self.num_games = 0
+        self.recent_durations: Deque[float] = deque(maxlen=50)
+
+    @property
+    def queue_length(self) -> int:
+        return max(0, self.num_games - self.settings.max_active_games)
+
+    @property
+    def average_game_duration_s(self) -> float:
+        if not self.recent_durations:
+            return self.settings.default_game_duration_s
+        return sum(self.recent_durations) / len(self.recent_durations)
+
+    def estimate_wait_s(self, position: int) -> float:
+        """With every slot busy, one frees about every average duration / max
+        active games seconds, and a game at position waits for that many."""
+        return (
+            position
+            * self.average_game_duration_s
+            / self.settings.max_active_games
+        )
+
+    def request(self, can_shed: bool = True) -> Admission:
+        """Admits a new game, which must then be played in game_slot. Raises
+        ServerBusy if the queue is full, unless can_shed is False, as for games
+        whose humans already waited in the lobby."""
+        position = max(0, self.num_games - self.settings.max_active_games + 1)
+        if position > self.settings.max_queued_games and can_shed:
+            metrics.increment("games_shed")
+            raise ServerBusy(self.estimate_wait_s(position))
+        self.num_games += 1
+        metrics.increment("games_admitted")
+        if position:
+            metrics.increment("games_queued")
+        metrics.set_gauge("admission_queue_length", self.queue_length)
+        return Admission(position, self.estimate_wait_s(position))
+
+    @asynccontextmanager
+    async def game_slot(self) -> AsyncIterator[None]:
+        """Waits for an admitted game's turn, then holds a slot while it plays."""
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        try:
+            async with self.games.hold():
+                started_at = loop.time()
+                metrics.observe("admission_wait_s", started_at - queued_at)
+                try:
+                    yield
+                finally:
+                    self.recent_durations.append(loop.time() - started_at)
+        finally:
+            self.num_games -= 1
+            metrics.set_gauge("admission_queue_length", self.queue_length)
+
+
+admission_control = AdmissionControl()
@@ -1,5 +1,3 @@
-import random
-
 models = [
     "openrouter/openai/gpt-4o",
     # "openrouter/openai/gpt-4o-mini",
@@ -18,9 +16,11 @@ models = [
     # "openrouter/mistralai/mixtral-8x22b-instruct"
 ]
 
-
-def get_random_model():
-    return random.choice(models)
+# Tried when a request to the chosen model fails or is slow
+fallback_models = [
+    "openrouter/meta-llama/llama-3.1-8b-instruct:free",
+    "openrouter/nousresearch/hermes-3-llama-3.1-405b:free",
+]
 
 
 # info = litellm.get_model_info(model)
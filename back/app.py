@@ -1,24 +1,59 @@
-from fastapi import FastAPI, WebSocket, Depends, BackgroundTasks
+from fastapi import FastAPI, WebSocket, Depends, BackgroundTasks, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 from starlette.websockets import WebSocketDisconnect
 
-from games.one_night_ultimate_werewolf.game import OneNightWerewolf
 import asyncio
+import os
+import secrets
+import time
+from contextlib import asynccontextmanager
 from loguru import logger
-from typing import Dict
+from typing import Dict, List, Set
+
+from admission import Admission, ServerBusy, admission_control
+from base_game import Game
+from games import (
+    create_game,
+    validate_game_config,
+    DEFAULT_GAME_TYPE,
+    GameConfigError,
+)
+from lobby import Lobby, Match
 
 from message_types import (
     BaseMessage,
+    GameConnectMessage,
     GameEndedMessage,
-    PromptMessage,
 )
+from logging_config import configure_logging
+from metrics import metrics
+from model_performance import performance_tracker
+from persistence import persistence_writer
+from profiling import ProfilerBusy, profiler
+from serialization import encode_event
+from supervisor import GameSupervisor
 from player import WebHumanPlayer
 from websocket_management import websocket_manager, UserLogin
 
-app = FastAPI(debug=True)
 
-# Configure loguru
-logger.add("app.log", rotation="500 MB", level="DEBUG")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Read once up front, so games never touch the disk for it
+    await asyncio.to_thread(lambda: performance_tracker.performance_data)
+    server_state = get_server_state()
+    lobby_task = asyncio.create_task(
+        server_state.lobby.run(server_state.start_match), name="lobby"
+    )
+    yield
+    lobby_task.cancel()
+    await asyncio.to_thread(persistence_writer.flush)
+    await logger.complete()
+
+
+app = FastAPI(debug=True, lifespan=lifespan)
+
+configure_logging()
 
 # Enable CORS
 app.add_middleware(
@@ -36,8 +71,10 @@ UserID = str
 class GameManager:
     GAME_TIMEOUT = 3600  # 1 hour in seconds
 
-    def __init__(self, game: OneNightWerewolf):
-        self.game: OneNightWerewolf = game
+    def __init__(self, game: Game):
+        self.game: Game = game
+        self.supervisor = GameSupervisor(game.id, is_watched=self.is_watched)
+        game.supervisor = self.supervisor
 
     def has_player(self, user_id: UserID):
         return user_id in [p.user_id for p in self.web_players]
@@ -50,14 +87,29 @@ class GameManager:
     def web_players(self):
         return [p for p in self.players if isinstance(p, WebHumanPlayer)]
 
+    def is_watched(self) -> bool:
+        if self.players:
+            user_ids = [p.user_id for p in self.web_players]
+        else:
+            # Not seated yet, so the humans are the ones the game was made for
+            user_ids = [login.user_id for login in self.game.logins]
+        return any(
+            user_id in websocket_manager.active_connections for user_id in user_ids
+        )
+
     def get_web_human_player(self, user_id: UserID):
         return next((p for p in self.web_players if p.user_id == user_id), None)
 
     def remove_player(self, user_id: UserID):
         player = self.get_web_human_player(user_id)
         if player:
-            self.game.state.players.remove(player)
+            self.game.state.remove_player(player)
             logger.info(f"Removed player {user_id} from game {self.game.id}")
+            if self.web_players:
+                self.supervisor.presence_changed()
+            else:
+                # Nobody can come back to it, so don't wait out the grace window
+                self.supervisor.abandon()
 
     async def end_game(self):
         for player in self.web_players:
@@ -69,16 +121,84 @@ class GameManager:
         logger.info("Game ended due to inactivity")
 
 
+class StartGameRequest(UserLogin):
+    game_type: str = DEFAULT_GAME_TYPE
+    num_players: int = 5
+
+
 class ServerState:
     def __init__(self):
         self.game_id_to_game_manager: Dict[GameID, GameManager] = {}
-
-    async def setup_new_game(self, login: UserLogin):
-        game = OneNightWerewolf(num_players=5, has_human=True, login=login)
+        self.lobby = Lobby()
+        self.admission = admission_control
+        # Games started by the lobby, kept so their tasks aren't garbage collected
+        self.game_tasks: Set[asyncio.Task] = set()
+
+    async def setup_new_game(
+        self,
+        login: UserLogin = None,
+        game_type: str = DEFAULT_GAME_TYPE,
+        num_players: int = 5,
+        logins: List[UserLogin] = (),
+    ):
+        game = create_game(
+            game_type,
+            num_players=num_players,
+            has_human=True,
+            login=login,
+            logins=logins,
+        )
         game_manager = GameManager(game)
         self.game_id_to_game_manager[game.id] = game_manager
         return game_manager
 
+    async def start_match(self, match: Match):
+        game_manager = await self.setup_new_game(
+            game_type=match.game_type,
+            num_players=match.num_players,
+            logins=match.logins,
+        )
+        game_id = game_manager.game.id
+        logger.info(
+            "Matched {} humans into game {}", len(match.logins), game_id
+        )
+        for login in match.logins:
+            await websocket_manager.send_personal_message(
+                GameConnectMessage(message="Found a game", gameId=game_id),
+                login.user_id,
+            )
+        # These humans already waited in the lobby, so the game is queued even if
+        # the queue is full
+        self.admission.request(can_shed=False)
+        task = asyncio.create_task(
+            self.run_game(game_manager), name=f"play_game, {game_id}"
+        )
+        self.game_tasks.add(task)
+        task.add_done_callback(self.game_tasks.discard)
+
+    async def run_game(self, game_manager: GameManager):
+        """Plays an admitted game, once it's through the admission queue."""
+        async with self.admission.game_slot():
+            await self.play_game(game_manager)
+
+    async def play_game(self, game_manager: GameManager):
+        game = game_manager.game
+        metrics.increment(f"games_started.{game.game_type}")
+        start_time = time.time()
+        try:
+            await game_manager.supervisor.run(game.play_game())
+            if game_manager.supervisor.abandoned:
+                metrics.increment(f"games_abandoned.{game.game_type}")
+            else:
+                metrics.increment(f"games_finished.{game.game_type}")
+        except Exception:
+            metrics.increment(f"games_failed.{game.game_type}")
+            raise
+        finally:
+            metrics.observe(
+                f"game_duration_s.{game.game_type}", time.time() - start_time
+            )
+
 
 _server_state = ServerState()
 
@@ -102,6 +222,64 @@ async def debug():
     return
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Admin endpoints don't exist unless ADMIN_TOKEN is set, and need it in the
+    X-Admin-Token header."""
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404)
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), admin_token.encode()
+    ):
+        raise HTTPException(status_code=403)
+
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_cpu(
+    duration_s: float = 10.0,
+    game_id: str = None,
+    mode: str = "sampling",
+    server_state: ServerState = Depends(get_server_state),
+):
+    """Profiles the server for duration_s, or one game until then or it ends.
+    Returns folded stacks for a flamegraph, or cProfile's stats with
+    mode=cprofile."""
+    if game_id is not None and game_id not in server_state.game_id_to_game_manager:
+        raise HTTPException(status_code=404, detail="No active game with that id")
+    try:
+        profile = await profiler.profile(duration_s, game_id, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        profile.text,
+        headers={
+            "X-Profile-Duration-S": f"{profile.duration_s:.3f}",
+            "X-Profile-Samples": str(profile.num_samples),
+            "X-Profile-Samples-Kept": str(profile.num_kept),
+        },
+    )
+
+
+@app.post("/admin/memory", dependencies=[Depends(require_admin)])
+async def snapshot_memory(limit: int = 30, group_by: str = "lineno"):
+    """Where memory grew since the last snapshot. The first starts tracemalloc."""
+    if group_by not in ("filename", "lineno", "traceback"):
+        raise HTTPException(status_code=400, detail=f"Can't group by {group_by}")
+    return profiler.memory_diff(limit, group_by)
+
+
+@app.delete("/admin/memory", dependencies=[Depends(require_admin)])
+async def stop_memory_tracing():
+    profiler.stop_memory_tracing()
+
+
 @app.websocket("/ws/{name}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -132,17 +310,7 @@ async def websocket_endpoint(
                 await websocket_manager.resume_game(
                     user_id, game_manager.game.id, web_human_player
                 )
-                # Resend the last prompt message if it exists
-                last_prompt = next(
-                    (
-                        msg
-                        for msg in reversed(web_human_player.observations)
-                        if isinstance(msg, PromptMessage)
-                    ),
-                    None,
-                )
-                if last_prompt:
-                    await websocket_manager.send_personal_message(last_prompt, user_id)
+                game_manager.supervisor.presence_changed()
                 found_game_with_player = True
             break
 
@@ -157,24 +325,99 @@ async def websocket_endpoint(
         await websocket_manager.listen_on_connection(websocket, user_id, server_state)
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for user {user_id}")
-        await websocket_manager.disconnect(user_id)
+        websocket_manager.disconnect(user_id, websocket)
+    finally:
+        if user_id not in websocket_manager.active_connections:
+            # Nobody to seat if they're matched now
+            server_state.lobby.leave(user_id)
+        for game_manager in server_state.game_id_to_game_manager.values():
+            if game_manager.has_player(user_id):
+                game_manager.supervisor.presence_changed()
+
+
+@app.websocket("/ws/spectate/{game_id}")
+async def spectate_endpoint(
+    websocket: WebSocket,
+    game_id: str,
+    server_state: ServerState = Depends(get_server_state),
+):
+    await websocket.accept()
+    game_manager = server_state.game_id_to_game_manager.get(game_id)
+    if game_manager is None:
+        await websocket.send_text(
+            encode_event(GameEndedMessage(message="No active game with that id"))
+        )
+        await websocket.close()
+        return
+
+    logger.info(f"Spectator joined game {game_id}")
+    await game_manager.game.spectators.serve(websocket)
 
 
 @app.post("/start_game")
 async def start_game(
-    user_login: UserLogin,
+    request: StartGameRequest,
     background_tasks: BackgroundTasks,
     server_state: ServerState = Depends(get_server_state),
 ):
-    game_manager = await server_state.setup_new_game(login=user_login)
+    user_login = UserLogin(name=request.name, api_key=request.api_key)
+    try:
+        validate_game_config(request.game_type, request.num_players)
+    except GameConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        admission: Admission = server_state.admission.request()
+    except ServerBusy as e:
+        # Answered at once, so a spike costs the server almost nothing
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(round(e.retry_after_s))},
+        )
 
-    background_tasks.add_task(game_manager.game.play_game)
+    game_manager = await server_state.setup_new_game(
+        login=user_login,
+        game_type=request.game_type,
+        num_players=request.num_players,
+    )
+    background_tasks.add_task(server_state.run_game, game_manager)
     # asyncio.create_task(
     #     game_manager.game.play_game(),
     #     name=f"play_game, {game_manager.game.id}",
     # )
 
-    return {"gameId": game_manager.game.id}
+    return {
+        "gameId": game_manager.game.id,
+        "queuePosition": admission.position,
+        "estimatedWaitS": round(admission.estimated_wait_s),
+    }
+
+
+@app.post("/lobby/join")
+async def join_lobby(
+    request: StartGameRequest,
+    server_state: ServerState = Depends(get_server_state),
+):
+    """Queues for a game with other humans. The game's id arrives over the
+    websocket as a game_connect message once it's formed."""
+    try:
+        validate_game_config(request.game_type, request.num_players)
+    except GameConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    user_login = UserLogin(name=request.name, api_key=request.api_key)
+    server_state.lobby.join(user_login, request.game_type, request.num_players)
+    return {
+        "waiting": server_state.lobby.num_waiting,
+        "maxWaitS": server_state.lobby.settings.max_wait_s,
+    }
+
+
+@app.post("/lobby/leave")
+async def leave_lobby(
+    login: UserLogin,
+    server_state: ServerState = Depends(get_server_state),
+):
+    return {"left": server_state.lobby.leave(login.user_id)}
 
 
 if __name__ == "__main__":
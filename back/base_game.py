@@ -1,18 +1,83 @@
+import asyncio
+import os
 import random
 import string
-from typing import List
-from player import Player
+from typing import List, Optional
+
+from loguru import logger
+
+from message_types import BaseEvent
+from persistence import persistence_writer
+from player import Player, everyone_observe
 from game_state import GameState
+from replay import ReplayRecorder
+from spectators import SpectatorHub
+from supervisor import GameSupervisor
+
+RECORD_REPLAYS = os.environ.get("RECORD_REPLAYS", "true").lower() == "true"
 
 
 class Game:
-    def __init__(self, num_players: int, has_human: bool = False):
+    game_type: str = None  # Key in games.GAME_TYPES
+
+    def __init__(
+        self,
+        num_players: int,
+        has_human: bool = False,
+        record_replay: bool = None,
+        seed: int = None,
+    ):
         self.num_players: int = num_players
         self.has_human: bool = has_human
-        self.state: GameState = GameState(num_players)
 
-        self.id = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        # All game randomness comes from this, so a seed reproduces the whole game
+        # without being affected by other games running at the same time.
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.state: GameState = GameState(num_players, rng=self.rng)
+
+        self.id = "".join(
+            self.rng.choices(string.ascii_uppercase + string.digits, k=6)
+        )
         self.game_over = False
+        self.spectators = SpectatorHub(self.id)
+        # Set when the server runs the game, see supervisor.py
+        self.supervisor: Optional[GameSupervisor] = None
+
+        if record_replay is None:
+            record_replay = RECORD_REPLAYS
+        self.recorder: Optional[ReplayRecorder] = None
+        if record_replay:
+            self.recorder = ReplayRecorder(
+                game_id=self.id,
+                game_type=self.game_type,
+                num_players=num_players,
+                seed=seed,
+            )
+
+    async def announce(
+        self, event: BaseEvent, players: Optional[List[Player]] = None
+    ) -> None:
+        """Shows a public event to players (all by default) and spectators.
+        Private information should go through player.observe instead."""
+        if players is None:
+            players = self.state.players
+        await everyone_observe(players, event)
+        self.spectators.publish(event)
+        self.record("event", event=event.model_dump())
+
+    def record(self, kind: str, **data) -> None:
+        """Adds an entry to this game's replay, if it's being recorded."""
+        if self.recorder:
+            self.recorder.record(kind, **data)
+
+    async def save_replay(self) -> None:
+        if self.recorder:
+            written = await persistence_writer.submit(self.recorder.save)
+            path = await written
+            logger.info(f"Saved replay of game {self.id} to {path}")
 
     def setup_game(self) -> None:
         raise NotImplementedError("Subclasses must implement setup_game method")
@@ -0,0 +1,40 @@
+"""Cost of snapshotting and branching a game's cards.
+
+Plays a mock game's setup and night, then compares deep copying the GameState (which
+drags in the players and their AI prompt state) with taking a CardState snapshot and
+branching from it. Run from the back directory with
+`python -m benchmarks.bench_card_state`.
+"""
+import asyncio
+import copy
+import os
+import timeit
+
+os.environ["USE_MOCK_API"] = "true"
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+
+
+async def night_game():
+    game = OneNightWerewolf(num_players=10, seed=1)
+    await game.setup_game()
+    await game.play_night_phase()
+    return game
+
+
+def per_call_ns(statement, number: int) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    state = asyncio.run(night_game()).state
+    snapshot = state.snapshot()
+    print(f"{len(state.players)} players, {len(snapshot.changes())} changes")
+    print(f"deepcopy(GameState)   {per_call_ns(lambda: copy.deepcopy(state), 20) / 1000:10.1f}us")
+    print(f"snapshot()            {per_call_ns(state.snapshot, 1_000_000):10.1f}ns")
+    print(f"branch with a swap    {per_call_ns(lambda: snapshot.swap(0, 1, 'what if'), 200_000):10.1f}ns")
+    print(f"branch with set_role  {per_call_ns(lambda: snapshot.set_role(2, 'Werewolf', 'what if'), 200_000):10.1f}ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Post game chat round trip: time from a human's message until every AI replied.
+
+Uses the mock API with simulated latency. Run from the back directory with
+`python -m benchmarks.bench_chat`.
+"""
+import asyncio
+import os
+import time
+
+os.environ["USE_MOCK_API"] = "true"
+os.environ["MOCK_API_LATENCY"] = "0.5"
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf, ChatSettings
+from player import HumanPlayer, AIPlayer
+
+NUM_MESSAGES = 3
+
+
+class ScriptedHuman(HumanPlayer):
+    def __init__(self, game):
+        super().__init__(game, "Human")
+        self.messages_left = NUM_MESSAGES
+        self.message_times = []
+
+    async def prompt_with(self, prompt, should_think=False, params=None) -> str:
+        if not self.messages_left:
+            return "(No response)"
+        self.messages_left -= 1
+        self.message_times.append(time.perf_counter())
+        return "Good game everyone!"
+
+    async def print(self, event):
+        pass
+
+
+async def time_chat(chat_settings: ChatSettings) -> float:
+    game = OneNightWerewolf(num_players=5, chat_settings=chat_settings)
+    await game.setup_game()
+    human = ScriptedHuman(game)
+    game.state.players[0] = human
+
+    start = time.perf_counter()
+    await game.chat()
+    return (time.perf_counter() - start) / NUM_MESSAGES
+
+
+async def main():
+    latency = float(os.environ["MOCK_API_LATENCY"])
+    print(f"4 AIs replying, {latency}s per completion")
+    for name, chat_settings in [
+        ("sequential", ChatSettings(concurrent_replies=False)),
+        ("concurrent, in order", ChatSettings(reply_order="in_order")),
+        ("concurrent, as completed", ChatSettings(reply_order="as_completed")),
+        ("concurrent, max 2", ChatSettings(max_concurrent_replies=2)),
+    ]:
+        round_trip = await time_chat(chat_settings)
+        print(f"{name:<26} {round_trip:.2f}s per chat round trip")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
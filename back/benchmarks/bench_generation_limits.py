@@ -0,0 +1,82 @@
+"""Output tokens and latency per prompt type, with and without generation limits.
+
+The stand-in model writes what real models tend to: thinking, the answer block, then
+more explanation after it, with the chat reply running on. It takes
+MOCK_API_TOKEN_LATENCY seconds per token and honors the prompt's limits like a
+provider would. Run from the back directory with
+`python -m benchmarks.bench_generation_limits`.
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+os.environ["USE_MOCK_API"] = "true"
+os.environ.setdefault("MOCK_API_TOKEN_LATENCY", "0.001")
+
+from core import GenerationLimits
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+import player
+from player import AIPlayer
+
+THINKING = " ".join(["- Bob claimed Seer but his story doesn't add up."] * 30)
+AFTER = " ".join(["This also explains why Carol stayed quiet."] * 20)
+STAND_IN_TEXT = {
+    "speech": f"{THINKING} {{I'm the Seer and Bob is a Werewolf.}} {AFTER}",
+    "choice": f"{THINKING} Answer in the form {{1, Bob}}. {{2, Bob}} {AFTER}",
+    "rules_check": f"{THINKING} {{No errors found}}",
+    "chat": " ".join(["Good game everyone, that was close."] * 60),
+}
+ROUNDS = 5
+
+
+def stand_in_text(self, litellm_prompt) -> str:
+    return STAND_IN_TEXT[litellm_prompt.limits.name]
+
+
+async def measure() -> dict:
+    results = defaultdict(list)
+    respond = AIPlayer.mock_api_response
+
+    async def timed_response(self, litellm_prompt):
+        start = time.perf_counter()
+        text = await respond(self, litellm_prompt)
+        duration = time.perf_counter() - start
+        results[litellm_prompt.limits.name].append((len(text.split(" ")), duration))
+        return text
+
+    AIPlayer.mock_api_response = timed_response
+    try:
+        game = OneNightWerewolf(num_players=5, seed=1)
+        await game.setup_game()
+        ai = next(p for p in game.state.players if isinstance(p, AIPlayer))
+        for _ in range(ROUNDS):
+            await ai.speak()
+            await ai.speak(chat=True)
+            await ai.vote(game.state.players)
+    finally:
+        AIPlayer.mock_api_response = respond
+    return results
+
+
+def main():
+    AIPlayer.mock_text = stand_in_text
+    limited = asyncio.run(measure())
+    player.GENERATION_LIMITS = {
+        name: GenerationLimits(name=name) for name in player.GENERATION_LIMITS
+    }
+    unlimited = asyncio.run(measure())
+    print(f"{'prompt':12} {'tokens before':>14} {'after':>6} {'latency before':>15} {'after':>8}")
+    for name in STAND_IN_TEXT:
+        before_tokens = sum(t for t, _ in unlimited[name]) / len(unlimited[name])
+        after_tokens = sum(t for t, _ in limited[name]) / len(limited[name])
+        before_s = sum(d for _, d in unlimited[name]) / len(unlimited[name])
+        after_s = sum(d for _, d in limited[name]) / len(limited[name])
+        print(
+            f"{name:12} {before_tokens:14.0f} {after_tokens:6.0f}"
+            f" {before_s * 1000:13.0f}ms {after_s * 1000:6.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Turn latency in games with a human, while headless simulations share the LLM slots.
+
+Two interactive games take turns one after another, like a human waiting on each AI.
+Eight simulations each keep five AI calls going at once. Calls take CALL_S and there
+are CAPACITY slots. Compares a first come first served queue with LLMScheduler. Run
+from the back directory with `python -m benchmarks.bench_llm_scheduler`.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from admission import Slots
+from llm_scheduler import LLMScheduler
+from metrics import percentile
+
+CAPACITY = 8
+CALL_S = 0.05
+TURNS = 100
+SIMULATIONS = 8
+AIS_PER_SIMULATION = 5
+
+
+class FifoSlots(Slots):
+    @asynccontextmanager
+    async def hold(self, game_id: str = "", interactive: bool = False):
+        async with super().hold():
+            yield
+
+
+async def call(slots, game_id: str, interactive: bool) -> float:
+    start = time.perf_counter()
+    async with slots.hold(game_id, interactive=interactive):
+        await asyncio.sleep(CALL_S)
+    return time.perf_counter() - start
+
+
+async def interactive_game(slots, game_id: str) -> list:
+    return [await call(slots, game_id, interactive=True) for _ in range(TURNS)]
+
+
+async def simulation(slots, game_id: str) -> None:
+    async def ai():
+        while True:
+            await call(slots, game_id, interactive=False)
+
+    await asyncio.gather(*[ai() for _ in range(AIS_PER_SIMULATION)])
+
+
+async def turn_latencies(slots, with_simulations: bool) -> list:
+    simulations = []
+    if with_simulations:
+        simulations = [
+            asyncio.create_task(simulation(slots, f"sim{i}")) for i in range(SIMULATIONS)
+        ]
+        await asyncio.sleep(CALL_S)
+    results = await asyncio.gather(
+        *[interactive_game(slots, f"human{i}") for i in range(2)]
+    )
+    for task in simulations:
+        task.cancel()
+    await asyncio.gather(*simulations, return_exceptions=True)
+    return sorted(latency for game in results for latency in game)
+
+
+def report(name: str, latencies: list) -> None:
+    print(
+        f"{name:28} p50 {percentile(latencies, 0.5) * 1000:6.0f}ms"
+        f"  p99 {percentile(latencies, 0.99) * 1000:6.0f}ms"
+    )
+
+
+async def main():
+    print(f"{CAPACITY} slots, {CALL_S * 1000:.0f}ms per call")
+    report("alone", await turn_latencies(LLMScheduler(CAPACITY), False))
+    report("with simulations, FIFO", await turn_latencies(FifoSlots(CAPACITY, "bench"), True))
+    report("with simulations, fair", await turn_latencies(LLMScheduler(CAPACITY), True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
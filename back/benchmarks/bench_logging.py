@@ -0,0 +1,69 @@
+"""Logging overhead per game, for the messages logged as events are sent to web players.
+
+Plays a mock game to get realistic events, then logs each one for five web players,
+the old way (f-string with the event's repr) and through log_sampled. Both go to a
+file sink with enqueue, like app.log. Run from the back directory with
+`python -m benchmarks.bench_logging`.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ["USE_MOCK_API"] = "true"
+
+from loguru import logger
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+import logging_config
+from logging_config import log_sampled
+
+NAMES = ["Alice", "Bob", "Carol", "Dave", "Eve"]
+REPEATS = 20
+
+
+async def game_events():
+    game = OneNightWerewolf(num_players=5)
+    game.save_replay = lambda: asyncio.sleep(0)
+    game.update_performance = lambda winners: asyncio.sleep(0)
+    await game.play_game()
+    return game.state.players[0].observations
+
+
+def log_old(events):
+    for event in events:
+        for name in NAMES:
+            logger.info(f"informing {name} with {event}")
+
+
+def log_new(events):
+    for event in events:
+        for name in NAMES:
+            log_sampled("events", "INFO", "Sending {} to {}", event.type, name)
+
+
+def time_per_game(log, events) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        log(events)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    events = asyncio.run(game_events())
+    logger.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        logger.add(Path(directory) / "app.log", level="DEBUG", enqueue=True)
+        print(f"{len(events)} events x {len(NAMES)} web players per game")
+        print(f"f-string repr    {time_per_game(log_old, events) * 1000:6.2f}ms per game")
+        rate = logging_config.sample_rates["events"]
+        logging_config.sample_rates["events"] = 1.0
+        print(f"type, unsampled  {time_per_game(log_new, events) * 1000:6.2f}ms per game")
+        logging_config.sample_rates["events"] = rate
+        print(f"type, sampled    {time_per_game(log_new, events) * 1000:6.2f}ms per game")
+        logger.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Tail latency of LLM requests with and without hedging in the model router, and
+with and without circuit breakers while one model is down.
+
+Stand-in models answer in 20-40ms most of the time, and occasionally stall for 10x
+as long, like a provider with a congested queue. In the outage runs one of them
+fails every request after 100ms. Run from the back directory with
+`python -m benchmarks.bench_model_router`.
+"""
+import asyncio
+import random
+import time
+
+from loguru import logger
+
+from metrics import metrics, percentile
+from model_performance import ModelPerformanceTracker
+from model_router import Completion, ModelRouter, RouterSettings
+
+NUM_REQUESTS = 1000
+CONCURRENCY = 20
+STALL_CHANCE = 0.04
+
+
+async def stand_in(
+    model: str, rng: random.Random, sent: list, down: str = None
+) -> Completion:
+    sent.append(model)
+    if model == down:
+        await asyncio.sleep(0.1)
+        raise ConnectionError(f"{model} is down")
+    latency = rng.uniform(0.02, 0.04)
+    if rng.random() < STALL_CHANCE:
+        latency *= 10
+    await asyncio.sleep(latency)
+    return Completion(text="Mock response.", model=model)
+
+
+async def run(hedge: bool, down: str = None, breakers: bool = True):
+    router = ModelRouter(
+        ModelPerformanceTracker(),
+        ["stand-in-a", "stand-in-b"],
+        settings=RouterSettings(
+            hedge=hedge,
+            min_hedge_delay_s=0.01,
+            default_hedge_delay_s=0.1,
+            model_failure_threshold=3 if breakers else NUM_REQUESTS,
+            provider_failure_threshold=NUM_REQUESTS,
+        ),
+    )
+    rng = random.Random(0)
+    sent = []
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def request():
+        async with semaphore:
+            started = time.perf_counter()
+            model = router.choose_model(rng)
+            await router.complete(model, lambda m: stand_in(m, rng, sent, down))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(request() for _ in range(NUM_REQUESTS)))
+    latencies.sort()
+    return latencies, len(sent) / NUM_REQUESTS - 1, sent.count(down)
+
+
+def report(label: str, latencies, extra: float, sent_to_down: int):
+    p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99))
+    print(
+        f"{label:24}  p50 {p50:5.1f}ms  p95 {p95:5.1f}ms  p99 {p99:5.1f}ms"
+        f"  extra requests {extra:5.1%}  sent to down model {sent_to_down}"
+    )
+
+
+async def main():
+    logger.disable("model_router")
+    logger.disable("circuit_breaker")
+    for hedge in (False, True):
+        report(f"hedge={hedge}", *await run(hedge))
+    for breakers in (False, True):
+        metrics.counters.clear()
+        report(
+            f"outage, breakers={breakers}",
+            *await run(True, down="stand-in-a", breakers=breakers),
+        )
+        print(f"  breaker time saved {metrics.counters['llm_breaker_time_saved_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
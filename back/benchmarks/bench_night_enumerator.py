@@ -0,0 +1,54 @@
+"""Time exact final role probabilities for one player's view of the night.
+
+Run from the back directory with `python -m benchmarks.bench_night_enumerator`.
+"""
+import random
+import time
+
+from games.one_night_ultimate_werewolf.night_enumerator import (
+    NightEnumerator,
+    NightObservation,
+)
+from games.one_night_ultimate_werewolf.onuw_roles import get_roles_in_game
+
+OBSERVATIONS = [
+    NightObservation(0, "Villager"),
+    NightObservation(0, "Werewolf", ("werewolves", (3,))),
+    NightObservation(0, "Seer", ("center", ("Villager", "Tanner"))),
+    NightObservation(0, "Robber", ("rob", 2, "Werewolf")),
+    NightObservation(0, "Troublemaker", ("swap", 1, 3)),
+    NightObservation(0, "Insomniac", ("own_card", "Robber")),
+    NightObservation(0, "Doppelganger", ("copy", 2, "Robber", ("rob", 4, "Seer"))),
+    NightObservation(0, "Thing", ("tap", 1), taps=1),
+]
+
+
+def bench(num_players: int) -> None:
+    # Large games have every role, so there's the most going on at night
+    role_pool = [role.name for role in get_roles_in_game(num_players, random.Random(0))]
+    print(f"{num_players} players: {', '.join(sorted(role_pool))}")
+    for observation in OBSERVATIONS:
+        enumerator = NightEnumerator(role_pool, num_players)
+        start = time.perf_counter()
+        try:
+            enumerator.given(observation)
+        except ValueError:
+            # Role not in this pool
+            continue
+        cold_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        enumerator.given(observation)
+        cached_us = (time.perf_counter() - start) * 1e6
+        print(
+            f"  {observation.role:>12} {str(observation.action):<50} "
+            f"{cold_ms:8.1f} ms, cached {cached_us:5.1f} us"
+        )
+
+
+def main():
+    for num_players in [5, 7, 10]:
+        bench(num_players)
+
+
+if __name__ == "__main__":
+    main()
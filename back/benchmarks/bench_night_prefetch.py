@@ -0,0 +1,62 @@
+"""Time from a human pressing Start until the day begins.
+
+A web human takes READING_S to read the rules before pressing Start, then answers
+night prompts at once. AI night choices either start once roles are dealt, or one by
+one once the night starts. Uses the mock API with simulated latency. Run from the
+back directory with `python -m benchmarks.bench_night_prefetch`.
+"""
+import asyncio
+import os
+import time
+
+os.environ["USE_MOCK_API"] = "true"
+os.environ["MOCK_API_LATENCY"] = "0.5"
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from player import WebHumanPlayer
+from websocket_management import UserLogin
+
+READING_S = 3.0
+SEEDS = [1, 2, 3]
+
+
+class ReadingHuman(WebHumanPlayer):
+    async def wait_for_ready(self):
+        await asyncio.sleep(READING_S)
+        self.game.started_at = time.perf_counter()
+
+    async def prompt_with(self, prompt, should_think=False, params=None) -> str:
+        return "1 2"
+
+    async def print(self, event):
+        pass
+
+
+class ReadingGame(OneNightWerewolf):
+    def make_human_players(self):
+        return [ReadingHuman(self, login) for login in self.logins]
+
+
+async def start_to_day(seed: int, prefetch: bool) -> float:
+    game = ReadingGame(
+        num_players=10,
+        logins=[UserLogin(name="Human", api_key="")],
+        record_replay=False,
+        seed=seed,
+    )
+    game.prefetch_night_choices = prefetch
+    await game.setup_game()
+    await game.play_night_phase()
+    return time.perf_counter() - game.started_at
+
+
+async def main():
+    latency = float(os.environ["MOCK_API_LATENCY"])
+    print(f"10 players, {latency}s per completion, {READING_S}s reading the rules")
+    for name, prefetch in [("when the night starts", False), ("once roles are dealt", True)]:
+        times = [await start_to_day(seed, prefetch) for seed in SEEDS]
+        print(f"AI choices {name:22} {sum(times) / len(times):5.2f}s from Start to day")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Compare the vectorized outcome evaluator against calling did_win per player.
+
+Run from the back directory with `python -m benchmarks.bench_outcomes`.
+"""
+import random
+import time
+
+import numpy as np
+
+from games.one_night_ultimate_werewolf import outcomes
+from games.one_night_ultimate_werewolf.onuw_roles import get_roles_in_game
+from tests.test_outcomes import did_win_loop
+
+LOOP_SCENARIOS = 20_000
+VECTORIZED_SCENARIOS = 1_000_000
+
+
+def bench(num_players: int) -> None:
+    role_pool = get_roles_in_game(num_players, rng=random.Random(0))
+    rng = np.random.default_rng(0)
+
+    final_roles = outcomes.random_deals(role_pool, num_players, LOOP_SCENARIOS, rng)
+    votes = outcomes.random_votes(num_players, LOOP_SCENARIOS, rng)
+    # The loop works on role objects, as check_win_condition does
+    role_objects = {role.name: role for role in role_pool}
+    role_rows = [
+        [role_objects[outcomes.ROLE_NAMES[role_id]] for role_id in row]
+        for row in final_roles
+    ]
+    start = time.perf_counter()
+    for roles, row_votes in zip(role_rows, votes):
+        did_win_loop(roles, row_votes)
+    loop_us = (time.perf_counter() - start) / LOOP_SCENARIOS * 1e6
+
+    final_roles = outcomes.random_deals(
+        role_pool, num_players, VECTORIZED_SCENARIOS, rng
+    )
+    votes = outcomes.random_votes(num_players, VECTORIZED_SCENARIOS, rng)
+    start = time.perf_counter()
+    outcomes.winners_mask(final_roles, votes)
+    vectorized_us = (time.perf_counter() - start) / VECTORIZED_SCENARIOS * 1e6
+
+    print(
+        f"{num_players:>2} players: loop {loop_us:7.2f} us/scenario, "
+        f"vectorized {vectorized_us:6.3f} us/scenario "
+        f"({loop_us / vectorized_us:5.0f}x)"
+    )
+
+
+def main():
+    for num_players in [3, 5, 7, 10]:
+        bench(num_players)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Micro-benchmarks for outbound event encoding and inbound message parsing.
+
+Run from the back directory with `python -m benchmarks.bench_serialization`.
+"""
+import json
+import timeit
+
+from message_types import (
+    BaseMessage,
+    GameConnectMessage,
+    GameDisconnectMessage,
+    GameStartedMessage,
+    GameEndedMessage,
+    PhaseMessage,
+    SpeechMessage,
+    PromptChoice,
+    PromptMessage,
+    NextSpeakerMessage,
+    PlayerActionMessage,
+    ObservationMessage,
+    RulesError,
+)
+from serialization import encode_event, decode_client_message
+
+NUM_RECIPIENTS = 5
+NUMBER = 2000
+
+SPEECH = "I was the Seer and I saw that Hal is a Werewolf. We should vote for Hal. " * 3
+
+EVENTS = [
+    BaseMessage(type="player_voted", message="Hal voted for Eliza"),
+    GameConnectMessage(message="Reconnected to existing game", gameId="ABC123"),
+    GameDisconnectMessage(message="Disconnected"),
+    GameStartedMessage(
+        message="The players in this game are: Hal, Eliza, Watson, Blue, Human.",
+        players=["Hal", "Eliza", "Watson", "Blue", "Human"],
+    ),
+    GameEndedMessage(message="The game server shut down."),
+    PhaseMessage(message="Day phase begins", phase="day"),
+    SpeechMessage(message=SPEECH, username="Hal"),
+    PromptMessage(
+        message="Which player do you want to vote to execute?",
+        choices=[PromptChoice(index=i, name=name) for i, name in enumerate("ABCD")],
+    ),
+    NextSpeakerMessage(player="Hal"),
+    PlayerActionMessage(message="Hal wins!", player="Hal", action="win"),
+    ObservationMessage(message="Rules:\n" + "Some rules text. " * 200),
+    RulesError(message="Rules Genie: " + "Possible error. " * 10),
+]
+
+CLIENT_MESSAGE = json.dumps(
+    {
+        "type": "player_action",
+        "player": "Human",
+        "action": "speak",
+        "message": SPEECH,
+    }
+)
+
+
+def per_call_us(func) -> float:
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1e6
+
+
+def bench_outbound():
+    print(f"Outbound, {NUM_RECIPIENTS} recipients per event (us per event)")
+    print(f"{'type':<18}{'stdlib json':>14}{'model_dump_json':>18}{'encode_event':>15}")
+    for event in EVENTS:
+
+        def old_path():
+            for _ in range(NUM_RECIPIENTS):
+                json.dumps(event.model_dump())
+
+        def model_dump_json_path():
+            for _ in range(NUM_RECIPIENTS):
+                event.model_dump_json()
+
+        def new_path():
+            event.__pydantic_private__["_encoded"] = None  # Each call is a fresh event
+            for _ in range(NUM_RECIPIENTS):
+                encode_event(event)
+
+        print(
+            f"{event.type:<18}"
+            f"{per_call_us(old_path):>14.1f}"
+            f"{per_call_us(model_dump_json_path):>18.1f}"
+            f"{per_call_us(new_path):>15.1f}"
+        )
+
+
+def bench_inbound():
+    print("\nInbound player_action (us per message)")
+    print(f"stdlib json.loads:        {per_call_us(lambda: json.loads(CLIENT_MESSAGE)):.1f}")
+    print(
+        f"json.loads + validate:    {per_call_us(lambda: PlayerActionMessage.model_validate(json.loads(CLIENT_MESSAGE))):.1f}"
+    )
+    print(
+        f"validated fast path:      {per_call_us(lambda: decode_client_message(CLIENT_MESSAGE)):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    bench_outbound()
+    bench_inbound()
@@ -0,0 +1,32 @@
+"""Time the game loop spends publishing one event to N spectators.
+
+Run from the back directory with `python -m benchmarks.bench_spectators`.
+"""
+import asyncio
+import timeit
+
+from message_types import SpeechMessage
+from spectators import SpectatorHub, Spectator
+
+NUMBER = 200
+
+
+async def bench(num_spectators: int) -> float:
+    hub = SpectatorHub("BENCH")
+    spectators = [Spectator(websocket=None) for _ in range(num_spectators)]
+    hub.spectators.update(spectators)
+
+    def publish():
+        hub.publish(SpeechMessage(message="I am the Seer. " * 10, username="Hal"))
+
+    return timeit.timeit(publish, number=NUMBER) / NUMBER * 1e6
+
+
+async def main():
+    for num_spectators in [0, 10, 100, 500, 1000]:
+        us = await bench(num_spectators)
+        print(f"{num_spectators:>5} spectators: {us:8.1f} us per published event")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
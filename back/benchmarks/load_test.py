@@ -0,0 +1,365 @@
+"""Load test: many simulated humans playing games against one server.
+
+Each client connects to /ws/{name}, starts a game with /start_game and answers every
+prompt after a random think time, like the frontend does. Now and then a client drops
+its connection and reconnects, or leaves the game. At the end it prints percentiles
+for connecting, starting a game and message latency (from an event's timestamp to the
+client receiving it), and counts of outcomes and errors.
+
+By default it starts a local server with the mock LLM and no replays. Pass --url to
+test a server that's already running; message latency assumes it shares this
+machine's clock. Run from the back directory with
+`python -m benchmarks.load_test --clients 200`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import websockets
+
+from metrics import percentile
+
+
+@dataclass
+class LoadSettings:
+    clients: int = 100
+    games_per_client: int = 1
+    # Clients start evenly over this long
+    ramp_s: float = 10.0
+    think_s: Tuple[float, float] = (0.5, 2.0)
+    # Chance per prompt answered
+    reconnect_chance: float = 0.02
+    leave_chance: float = 0.005
+    chat_messages: int = 2
+    game_timeout_s: float = 600.0
+    # Longest a client waits before retrying a start the server was too busy for
+    max_retry_s: float = 10.0
+
+
+@dataclass
+class Results:
+    timings: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    counts: Counter = field(default_factory=Counter)
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    def report(self) -> None:
+        print(f"{'':22} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name, values in sorted(self.timings.items()):
+            values = sorted(values)
+            print(
+                f"{name:22} {len(values):7}"
+                + "".join(
+                    f" {percentile(values, fraction) * 1000:6.0f}ms"
+                    for fraction in (0.5, 0.95, 0.99)
+                )
+                + f" {values[-1] * 1000:6.0f}ms"
+            )
+        for name, count in sorted(self.counts.items()):
+            print(f"{name:22} {count:7}")
+
+
+async def http_request(
+    host: str, port: int, method: str, path: str, body: dict = None
+) -> Tuple[int, dict, dict]:
+    """A minimal HTTP/1.1 client, so thousands of requests don't wait on threads."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        payload = json.dumps(body).encode() if body is not None else b""
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = dict(
+        (key.lower(), value.strip())
+        for key, _, value in (line.partition(":") for line in lines[1:])
+    )
+    if headers.get("transfer-encoding") == "chunked":
+        content = dechunk(content)
+    return status, json.loads(content or b"null"), headers
+
+
+def dechunk(content: bytes) -> bytes:
+    body = b""
+    while content:
+        size_line, _, content = content.partition(b"\r\n")
+        size = int(size_line, 16)
+        if size == 0:
+            break
+        body += content[:size]
+        content = content[size + 2 :]
+    return body
+
+
+def answer(prompt: dict, chat_messages_left: int) -> str:
+    choices = prompt.get("choices")
+    if choices:
+        num = prompt.get("min_choices") or 1
+        picked = random.sample([choice["index"] for choice in choices], num)
+        return ",".join(str(index) for index in picked)
+    if chat_messages_left <= 0:
+        return "(No response)"
+    return random.choice(
+        ["I'm the Seer, I saw a Werewolf in the center.", "I'm a Villager.", "gg"]
+    )
+
+
+def message_latency(event: dict, connected_at: datetime) -> Optional[float]:
+    """Seconds since the server made the event, None for history resent on
+    reconnecting."""
+    timestamp = event.get("timestamp")
+    if not timestamp:
+        return None
+    made_at = datetime.fromisoformat(timestamp)
+    if made_at < connected_at:
+        return None
+    return (datetime.now() - made_at).total_seconds()
+
+
+class Client:
+    def __init__(self, index: int, server: str, settings: LoadSettings, results: Results):
+        self.name = f"Load{index}"
+        self.api_key = f"load-{uuid.uuid4().hex}"
+        self.server = urlparse(server)
+        self.settings = settings
+        self.results = results
+        self.answered = set()
+
+    async def run(self) -> None:
+        for _ in range(self.settings.games_per_client):
+            try:
+                outcome = await asyncio.wait_for(
+                    self.play_game(), self.settings.game_timeout_s
+                )
+            except asyncio.TimeoutError:
+                outcome = "error_game_timeout"
+            except (OSError, websockets.WebSocketException) as e:
+                outcome = f"error_{type(e).__name__}"
+            self.results.counts[outcome] += 1
+
+    async def connect(self):
+        scheme = "wss" if self.server.scheme == "https" else "ws"
+        url = f"{scheme}://{self.server.netloc}/ws/{self.name}?api_key={self.api_key}"
+        start = time.perf_counter()
+        websocket = await websockets.connect(url, open_timeout=30, max_size=None)
+        self.results.observe("connect", time.perf_counter() - start)
+        return websocket, datetime.now()
+
+    async def start_game(self) -> None:
+        while True:
+            start = time.perf_counter()
+            status, body, headers = await http_request(
+                self.server.hostname,
+                self.server.port,
+                "POST",
+                "/start_game",
+                {"name": self.name, "api_key": self.api_key},
+            )
+            self.results.observe("start_game", time.perf_counter() - start)
+            if status == 200:
+                if body.get("queuePosition"):
+                    self.results.counts["start_queued"] += 1
+                return
+            if status != 503:
+                raise OSError(f"start_game answered {status}")
+            self.results.counts["start_busy"] += 1
+            retry_after = float(headers.get("retry-after", 1))
+            await asyncio.sleep(min(retry_after, self.settings.max_retry_s))
+
+    async def play_game(self) -> str:
+        websocket, connected_at = await self.connect()
+        await self.start_game()
+        started = False
+        chat_messages_left = self.settings.chat_messages
+        answered_at = None
+        self.answered.clear()
+        try:
+            while True:
+                try:
+                    event = json.loads(await websocket.recv())
+                except websockets.ConnectionClosed:
+                    self.results.counts["error_dropped"] += 1
+                    websocket, connected_at = await self.connect()
+                    continue
+                if answered_at is not None:
+                    self.results.observe("answer_to_next", time.perf_counter() - answered_at)
+                    answered_at = None
+                latency = message_latency(event, connected_at)
+                if latency is not None:
+                    self.results.observe("message_latency", latency)
+                kind = event.get("type")
+                if kind == "game_started":
+                    started = True
+                elif kind == "game_ended" and started:
+                    return "games_finished"
+                elif kind == "phase" and event.get("phase") == "post game chat":
+                    chat_messages_left = self.settings.chat_messages
+                elif kind == "prompt":
+                    # Prompts are resent after reconnecting
+                    prompt_id = event.get("promptId")
+                    if prompt_id in self.answered:
+                        continue
+                    self.answered.add(prompt_id)
+                    await asyncio.sleep(random.uniform(*self.settings.think_s))
+                    if random.random() < self.settings.leave_chance:
+                        await self.send(websocket, "leave_game", None)
+                        return "games_left"
+                    text = answer(event, chat_messages_left)
+                    if not event.get("choices"):
+                        chat_messages_left -= 1
+                    await self.send(websocket, "make_choice", text, prompt_id)
+                    answered_at = time.perf_counter()
+                    if random.random() < self.settings.reconnect_chance:
+                        await websocket.close()
+                        self.results.counts["reconnects"] += 1
+                        websocket, connected_at = await self.connect()
+                        answered_at = None
+        finally:
+            await websocket.close()
+
+    async def send(
+        self,
+        websocket,
+        action: str,
+        message: Optional[str],
+        prompt_id: Optional[str] = None,
+    ) -> None:
+        await websocket.send(
+            json.dumps(
+                {
+                    "type": "player_action",
+                    "player": self.name,
+                    "action": action,
+                    "message": message,
+                    "promptId": prompt_id,
+                }
+            )
+        )
+
+
+def start_server(port: int, mock_latency: float) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        USE_MOCK_API="true",
+        MOCK_API_LATENCY=str(mock_latency),
+        RECORD_REPLAYS="false",
+        LOG_LEVEL="WARNING",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(host: str, port: int, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            await http_request(host, port, "GET", "/metrics")
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run_load(server: str, settings: LoadSettings) -> Results:
+    results = Results()
+    clients = [Client(i, server, settings, results) for i in range(settings.clients)]
+
+    async def run_later(client: Client, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await client.run()
+
+    interval = settings.ramp_s / max(1, settings.clients)
+    await asyncio.gather(
+        *[run_later(client, i * interval) for i, client in enumerate(clients)]
+    )
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=LoadSettings.clients)
+    parser.add_argument("--games", type=int, default=LoadSettings.games_per_client)
+    parser.add_argument("--ramp-s", type=float, default=LoadSettings.ramp_s)
+    parser.add_argument("--think-s", type=float, nargs=2, default=LoadSettings.think_s)
+    parser.add_argument(
+        "--reconnect-chance", type=float, default=LoadSettings.reconnect_chance
+    )
+    parser.add_argument("--leave-chance", type=float, default=LoadSettings.leave_chance)
+    parser.add_argument("--url", help="Server to test, instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mock-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    settings = LoadSettings(
+        clients=args.clients,
+        games_per_client=args.games,
+        ramp_s=args.ramp_s,
+        think_s=tuple(args.think_s),
+        reconnect_chance=args.reconnect_chance,
+        leave_chance=args.leave_chance,
+    )
+
+    # Each client has a websocket and sometimes an HTTP connection open
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args.port, args.mock_latency)
+    host, port = urlparse(url).hostname, urlparse(url).port
+    try:
+        await wait_until_up(host, port)
+        start = time.perf_counter()
+        results = await run_load(url, settings)
+        elapsed = time.perf_counter() - start
+        _, server_metrics, _ = await http_request(host, port, "GET", "/metrics")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{settings.clients} clients, {settings.games_per_client} games each, {elapsed:.0f}s")
+    results.report()
+    counters = server_metrics["counters"]
+    print(
+        "server: games admitted {:.0f}, shed {:.0f}, LLM slot waits p99 {:.0f}ms".format(
+            counters.get("games_admitted", 0),
+            counters.get("games_shed", 0),
+            server_metrics["timings"]
+            .get("llm_slot_wait_s.interactive", {})
+            .get("p99", 0)
+            * 1000,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""Immutable snapshot of where the cards are, separate from the Player objects.
+
+A CardState holds each seat's current and original role name, the center cards and
+the log of changes. Changing it returns a new CardState and leaves the old one as it
+was, so keeping a snapshot is free, and branching from one copies only the tuple of
+seats. Branches share their history, which is a linked list that only grows at the
+front.
+
+GameState keeps one up to date, see GameState.snapshot.
+"""
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+
+class CardChange(NamedTuple):
+    seat: int
+    old_role: str
+    new_role: str
+    cause: str
+    # The change before this one, shared between branches
+    previous: Optional["CardChange"]
+
+
+class CardState(NamedTuple):
+    seats: Tuple[str, ...]
+    original_seats: Tuple[str, ...]
+    center: Tuple[str, ...] = ()
+    last_change: Optional[CardChange] = None
+
+    @classmethod
+    def deal(cls, seats: Tuple[str, ...], center: Tuple[str, ...] = ()) -> "CardState":
+        seats = tuple(seats)
+        return cls(seats, seats, tuple(center))
+
+    def set_role(self, seat: int, role: str, cause: str) -> "CardState":
+        seats = self.seats[:seat] + (role,) + self.seats[seat + 1 :]
+        change = CardChange(seat, self.seats[seat], role, cause, self.last_change)
+        # Built directly, _replace is several times slower
+        return CardState(seats, self.original_seats, self.center, change)
+
+    def swap(self, first: int, second: int, cause: str) -> "CardState":
+        seats = list(self.seats)
+        seats[first], seats[second] = seats[second], seats[first]
+        first_change = CardChange(
+            first, self.seats[first], seats[first], cause, self.last_change
+        )
+        second_change = CardChange(
+            second, self.seats[second], seats[second], cause, first_change
+        )
+        return CardState(tuple(seats), self.original_seats, self.center, second_change)
+
+    def seats_with(self, role: str, original: bool = False) -> List[int]:
+        seats = self.original_seats if original else self.seats
+        return [seat for seat, seat_role in enumerate(seats) if seat_role == role]
+
+    def changes(self) -> List[CardChange]:
+        """Every change, oldest first."""
+        changes = list(self._changes_newest_first())
+        changes.reverse()
+        return changes
+
+    def _changes_newest_first(self) -> Iterator[CardChange]:
+        change = self.last_change
+        while change is not None:
+            yield change
+            change = change.previous
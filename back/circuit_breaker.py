@@ -0,0 +1,80 @@
+"""Circuit breakers for LLM models and providers, shared by every game.
+
+A breaker opens after a run of consecutive failures, and requests skip it instead of
+waiting for another failure. After reset_timeout_s it half opens and lets a single
+probe request through. The probe succeeding closes it, failing opens it again.
+"""
+import time
+from typing import Callable
+
+from loguru import logger
+
+from metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        # Running average of how long failed requests took, for the time saved metric
+        self.failure_latency_s = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if self.clock() - self.opened_at < self.reset_timeout_s:
+            return OPEN
+        return HALF_OPEN
+
+    def available(self) -> bool:
+        """Whether a request may be sent, without claiming the half open probe."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self.probing)
+
+    def on_request(self) -> None:
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def on_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+            metrics.adjust_gauge("llm_breakers_open", -1)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def on_failure(self, latency_s: float) -> None:
+        if self.failure_latency_s:
+            self.failure_latency_s += (latency_s - self.failure_latency_s) * 0.2
+        else:
+            self.failure_latency_s = latency_s
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None:
+            # A failed probe, wait out another reset timeout
+            self.opened_at = self.clock()
+        elif self.failures >= self.failure_threshold:
+            logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            metrics.increment("llm_breakers_opened")
+            metrics.adjust_gauge("llm_breakers_open", 1)
+            self.opened_at = self.clock()
+
+    def on_cancel(self) -> None:
+        """The request was abandoned without an answer, so free the probe."""
+        self.probing = False
@@ -1,10 +1,18 @@
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Optional, Tuple
 
-import litellm
-from litellm import completion, completion_cost
+from metrics import metrics
 
-litellm.modify_params = True
+
+def get_litellm():
+    """Imports litellm on first use. It takes seconds to import, which would slow
+    down server startup and test collection."""
+    import litellm
+
+    litellm.modify_params = True
+    return litellm
 
 
 # Load API keys from environment variables or dev files
@@ -25,10 +33,58 @@ ANTHROPIC_API_KEY = get_api_key("ANTHROPIC_API_KEY")
 OPENROUTER_API_KEY = get_api_key("OPENROUTER_API_KEY")
 
 
+@dataclass(frozen=True)
+class GenerationLimits:
+    """How much of a response to generate, per kind of prompt."""
+
+    name: str = "default"
+    max_tokens: Optional[int] = None
+    # Sent to the provider, which stops before the first one it generates. Only safe
+    # where the text before the answer can't contain them.
+    stop: Tuple[str, ...] = ()
+    # Checked as the response streams in, ending it once this says the text so far
+    # ends with a complete answer.
+    is_complete: Optional[Callable[[str], bool]] = None
+
+
+NO_LIMITS = GenerationLimits()
+
+
+def answer_end(
+    text: str, is_complete: Callable[[str], bool], start: int = 0
+) -> Optional[int]:
+    """Where the first complete answer in text ends, checking each closing bracket
+    from start on. None if there isn't one."""
+    end = text.find("}", start)
+    while end != -1:
+        if is_complete(text[: end + 1]):
+            return end + 1
+        end = text.find("}", end + 1)
+    return None
+
+
+def apply_limits(text: str, limits: GenerationLimits) -> str:
+    """The part of text a model honoring limits would have returned. Tokens are
+    approximated as words, which is close enough for a stand-in model."""
+    for stop in limits.stop:
+        text = text.split(stop, 1)[0]
+    if limits.is_complete is not None:
+        end = answer_end(text, limits.is_complete)
+        if end is not None:
+            text = text[:end]
+    if limits.max_tokens is not None:
+        words = text.split(" ")
+        if len(words) > limits.max_tokens:
+            text = " ".join(words[: limits.max_tokens])
+    return text
+
+
 class Prompt:
-    def __init__(self):
+    def __init__(self, limits: GenerationLimits = NO_LIMITS):
         self.messages = []
         self.total_cost = 0
+        self.total_tokens = 0
+        self.limits = limits
 
     def add_message(self, message: str, role="user"):
         if role not in ["user", "assistant", "system"]:
@@ -39,46 +95,85 @@ class Prompt:
         self.messages.append({"role": role, "content": message})
         return self
 
-    def run(self, model, should_print=True, api_key=None) -> str:
-        try:
-            # Use the provided API key or the one from the environment
-            if api_key:
-                os.environ["OPENROUTER_API_KEY"] = api_key
-
-            response = completion(
-                model=model,
-                messages=self.messages,
-                timeout=60,
-                num_retries=2,
-                fallbacks=[
-                    "openrouter/meta-llama/llama-3.1-8b-instruct:free",
-                    "openrouter/nousresearch/hermes-3-llama-3.1-405b:free",
-                ],
-            )
-        except Exception as e:
-            print("COMPLETION FAILED. Try to manually fix before continuing.", e)
-            try:
-                response = completion(
-                    model=model,
-                    messages=self.messages,
-                    timeout=60,
-                    num_retries=2,
-                )
-            except Exception as e:
-                return f"(No response) {e}"
-        response_text = response["choices"][0]["message"]["content"]
+    def copy(self) -> "Prompt":
+        """A copy with its own messages and totals, for running the same prompt
+        against more than one model."""
+        prompt = Prompt(self.limits)
+        prompt.messages = list(self.messages)
+        return prompt
+
+    async def run(self, model, should_print=True, api_key=None, timeout=60) -> str:
+        """Runs the completion without blocking the event loop, so many prompts
+        can be in flight at once. This is a single attempt that raises on failure,
+        model_router handles failover and retries."""
+        litellm = get_litellm()
+        # The key is passed per request rather than set in the environment,
+        # since concurrent games may use different keys.
+        request = dict(
+            model=model, messages=self.messages, timeout=timeout, api_key=api_key
+        )
+        if self.limits.max_tokens is not None:
+            request["max_tokens"] = self.limits.max_tokens
+        if self.limits.stop:
+            request["stop"] = list(self.limits.stop)
+        if self.limits.is_complete is None:
+            response = await litellm.acompletion(**request)
+        else:
+            response = await self._stream_until_complete(litellm, request)
+        response_text = response["choices"][0]["message"]["content"] or ""
+        if response["choices"][0].get("finish_reason") == "length":
+            metrics.increment("llm_hit_max_tokens")
         self.add_message(response_text, role="assistant")
         if should_print:
             print(f"Bot: {response_text}\n\n")
 
         try:
-            total_cost = completion_cost(completion_response=response)
+            total_cost = litellm.completion_cost(completion_response=response)
         except:
             total_cost = 0
 
         self.total_cost += total_cost
+        usage = response.get("usage")
+        self.total_tokens += getattr(usage, "total_tokens", 0) or 0
         return response_text
 
+    async def _stream_until_complete(self, litellm, request: dict):
+        """Streams the response and stops reading once it ends with a complete
+        answer. Closing the stream ends generation, so the tokens after the answer
+        are never generated or billed."""
+        stream = await litellm.acompletion(
+            **request, stream=True, stream_options={"include_usage": True}
+        )
+        chunks = []
+        text = ""
+        end = None
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                text += delta
+                # Answers end with a closing bracket, which can be anywhere in the
+                # chunk, so each one in it is checked
+                if "}" in delta:
+                    end = answer_end(
+                        text, self.limits.is_complete, start=len(text) - len(delta)
+                    )
+                    if end is not None:
+                        metrics.increment("llm_stopped_at_answer")
+                        break
+        finally:
+            close = getattr(stream, "aclose", None)
+            if close is not None:
+                await close()
+        response = litellm.stream_chunk_builder(chunks, messages=self.messages)
+        if end is not None:
+            # Without whatever came after the answer in its chunk
+            response.choices[0].message.content = text[:end]
+            response.choices[0].finish_reason = "stop"
+        return response
+
 
 system_message = ""
 memory_window_size = 5
@@ -89,6 +184,7 @@ if system_message:
 
 
 def converse(initial_message: str = None, model: str = "gpt-4o-2024-08-06"):
+    completion = get_litellm().completion
     if initial_message:
         past_messages.append({"role": "user", "content": initial_message})
 
@@ -1,12 +1,27 @@
-from typing import List, Tuple, TYPE_CHECKING
-from games.one_night_ultimate_werewolf.onuw_roles import Role
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, TYPE_CHECKING, Union
+
+from card_state import CardState
+from roles import Role
 
 if TYPE_CHECKING:
     from .player import Player
 
 
+@dataclass(frozen=True)
+class RoleChange:
+    player: "Player"
+    old_role: Role
+    new_role: Role
+    # What changed it, eg "Robber"
+    cause: str
+
+
 class GameState:
-    def __init__(self, num_players: int):
+    def __init__(self, num_players: int, rng: random.Random = None):
+        self.rng = rng or random.Random()
         self.center_cards: List[Role] = []
         self.night_actions: List[Tuple["Player", str]] = []
         self.day_actions: List[Tuple["Player", str]] = []
@@ -14,14 +29,78 @@ class GameState:
         self.role_pool: List[Role] = []
         self.num_players = num_players
 
+        # Role name -> players, kept up to date by index_roles, swap_roles and
+        # set_role. Dicts are used as ordered sets
+        self.players_by_role: Dict[str, Dict["Player", None]] = defaultdict(dict)
+        self.players_by_original_role: Dict[str, Dict["Player", None]] = defaultdict(
+            dict
+        )
+        self.seats: Dict["Player", int] = {}
+        self.role_changes: List[RoleChange] = []
+        # The same cards by seat, for snapshots
+        self.cards = CardState.deal(())
+
     def add_center_cards(self, cards: List[Role]) -> None:
         self.center_cards = cards
+        self.cards = self.cards._replace(center=tuple(role.name for role in cards))
+
+    def snapshot(self) -> CardState:
+        """Where the cards are now. Immutable, so it stays valid as the game goes
+        on and can be branched from without touching the players."""
+        return self.cards
 
     def add_player(self, player: "Player") -> None:
-        if len(self.players) < self.num_players:
-            self.players.append(player)
-        else:
+        if len(self.players) >= self.num_players:
             raise ValueError("Maximum number of players reached")
+        if any(p.name == player.name for p in self.players):
+            raise ValueError(f"A player named {player.name} is already in the game")
+        self.players.append(player)
+
+    def remove_player(self, player: "Player") -> None:
+        self.players.remove(player)
+        for index in (self.players_by_role, self.players_by_original_role):
+            for players in index.values():
+                players.pop(player, None)
+
+    def index_roles(self) -> None:
+        """Builds the role indexes from the players' roles, once they're dealt."""
+        self.players_by_role.clear()
+        self.players_by_original_role.clear()
+        self.seats = {player: seat for seat, player in enumerate(self.players)}
+        for player in self.players:
+            self.players_by_role[player.role.name][player] = None
+            self.players_by_original_role[player.original_role.name][player] = None
+        self.cards = CardState(
+            seats=tuple(player.role.name for player in self.players),
+            original_seats=tuple(player.original_role.name for player in self.players),
+            center=self.cards.center,
+        )
+
+    def players_with_role(
+        self, role: Union[Role, str], original: bool = False
+    ) -> List["Player"]:
+        """Players with a current (or original) role, in seat order."""
+        index = self.players_by_original_role if original else self.players_by_role
+        name = role if isinstance(role, str) else role.name
+        return sorted(index.get(name, ()), key=self.seats.__getitem__)
+
+    def has_role(self, role: Union[Role, str]) -> bool:
+        name = role if isinstance(role, str) else role.name
+        return bool(self.players_by_role.get(name))
+
+    def set_role(self, player: "Player", role: Role, cause: str) -> None:
+        """Changes a player's current role. Their original role stays the same."""
+        old_role = player.role
+        del self.players_by_role[old_role.name][player]
+        self.players_by_role[role.name][player] = None
+        player.role = role
+        self.role_changes.append(RoleChange(player, old_role, role, cause))
+        self.cards = self.cards.set_role(self.seats[player], role.name, cause)
+
+    def swap_roles(self, first: "Player", second: "Player", cause: str) -> None:
+        first_role, second_role = first.role, second.role
+        self.set_role(first, second_role, cause)
+        self.set_role(second, first_role, cause)
 
     def record_night_action(self, player: "Player", action: str) -> None:
         self.night_actions.append((player, action))
@@ -0,0 +1,53 @@
+import importlib
+from types import ModuleType
+from typing import Dict, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from base_game import Game
+    from websocket_management import UserLogin
+
+# Game type -> package implementing it. Packages are only imported when a game of
+# that type is first created, so adding games doesn't slow down server startup.
+# Each package must define MIN_PLAYERS, MAX_PLAYERS and create_game(...).
+GAME_TYPES: Dict[str, str] = {
+    "one_night_ultimate_werewolf": "games.one_night_ultimate_werewolf",
+}
+DEFAULT_GAME_TYPE = "one_night_ultimate_werewolf"
+
+_loaded_games: Dict[str, ModuleType] = {}
+
+
+class GameConfigError(ValueError):
+    pass
+
+
+def get_game_module(game_type: str) -> ModuleType:
+    if game_type not in _loaded_games:
+        if game_type not in GAME_TYPES:
+            raise GameConfigError(
+                f"Unknown game type: {game_type}. Options are {', '.join(GAME_TYPES)}"
+            )
+        _loaded_games[game_type] = importlib.import_module(GAME_TYPES[game_type])
+    return _loaded_games[game_type]
+
+
+def validate_game_config(game_type: str, num_players: int) -> ModuleType:
+    game_module = get_game_module(game_type)
+    if not game_module.MIN_PLAYERS <= num_players <= game_module.MAX_PLAYERS:
+        raise GameConfigError(
+            f"{game_type} needs between {game_module.MIN_PLAYERS} and {game_module.MAX_PLAYERS} players"
+        )
+    return game_module
+
+
+def create_game(
+    game_type: str,
+    num_players: int,
+    has_human: bool = False,
+    login: "UserLogin" = None,
+    logins: Sequence["UserLogin"] = (),
+) -> "Game":
+    game_module = validate_game_config(game_type, num_players)
+    return game_module.create_game(
+        num_players=num_players, has_human=has_human, login=login, logins=logins
+    )
@@ -0,0 +1,20 @@
+from typing import Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from websocket_management import UserLogin
+
+MIN_PLAYERS = 3
+MAX_PLAYERS = 10
+
+
+def create_game(
+    num_players: int,
+    has_human: bool = False,
+    login: "UserLogin" = None,
+    logins: Sequence["UserLogin"] = (),
+):
+    from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+
+    return OneNightWerewolf(
+        num_players=num_players, has_human=has_human, login=login, logins=logins
+    )
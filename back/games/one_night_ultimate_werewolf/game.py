@@ -2,11 +2,17 @@ from loguru import logger
 
 import asyncio
 import random
-from typing import List
+from dataclasses import dataclass
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 import time
 
-from ai_models import get_random_model
-from games.one_night_ultimate_werewolf.onuw_roles import get_roles_in_game, assign_roles
+from games.one_night_ultimate_werewolf.onuw_roles import (
+    Doppelganger,
+    get_roles_in_game,
+    assign_roles,
+)
+from roles import Role
 from message_types import (
     ObservationMessage,
     GameStartedMessage,
@@ -15,8 +21,11 @@ from message_types import (
     PlayerActionMessage,
     NextSpeakerMessage,
     GameEndedMessage,
+    VoteResultsMessage,
 )
+from metrics import metrics
 from model_performance import performance_tracker
+from model_router import model_router
 from ai_personalities import PERSONALITIES
 from player import (
     Player,
@@ -33,71 +42,100 @@ from websocket_management import UserLogin, DISCONNECTED_MESSAGE, NO_RESPONSE_ME
 from base_game import Game
 
 
+@dataclass
+class ChatSettings:
+    # Generate AI replies to a chat message at the same time instead of one by one
+    concurrent_replies: bool = True
+    max_concurrent_replies: int = 4
+    # "in_order" shows replies in seating order, "as_completed" shows each when ready
+    reply_order: str = "in_order"
+
+    # Post game chat ends once AIs have used any of these
+    max_cost: float = 0.25  # USD
+    max_tokens: Optional[int] = 200_000
+    max_ai_replies: int = 20
+
+    def is_exhausted(self, cost: float, tokens: int, num_ai_replies: int) -> bool:
+        return (
+            cost >= self.max_cost
+            or (self.max_tokens is not None and tokens >= self.max_tokens)
+            or num_ai_replies >= self.max_ai_replies
+        )
+
+
+@dataclass
+class VotingSettings:
+    # Seconds each player has to vote. Votes are collected concurrently, so the
+    # voting phase takes as long as the slowest voter, at most this long.
+    deadline: float = 180.0
+    # When the deadline passes, "random" votes for a random other player and
+    # "abstain" doesn't count the vote
+    deadline_policy: str = "random"
+
+
 class OneNightWerewolf(Game):
+    game_type = "one_night_ultimate_werewolf"
+    # Start AI night choices once roles are dealt, rather than when the night starts
+    prefetch_night_choices = True
+
     def __init__(
-        self, num_players: int, has_human: bool = False, login: UserLogin = None
+        self,
+        num_players: int,
+        has_human: bool = False,
+        login: UserLogin = None,
+        logins: Sequence[UserLogin] = (),
+        chat_settings: ChatSettings = None,
+        voting_settings: VotingSettings = None,
+        record_replay: bool = None,
+        seed: int = None,
     ):
-        super().__init__(num_players, has_human)
-        self.login = login
+        # Web players, in the order they joined. login is the single player case
+        self.logins = list(logins) or ([login] if login else [])
+        super().__init__(
+            num_players,
+            has_human or bool(self.logins),
+            record_replay=record_replay,
+            seed=seed,
+        )
+        self.chat_settings = chat_settings or ChatSettings()
+        self.voting_settings = voting_settings or VotingSettings()
         self.current_phase = "setup"
         self.current_action = None
         self.last_action_time = time.time()
 
     async def setup_game(self) -> None:
         logger.info("Setting up game")
-        if self.has_human:
-            num_ai = self.num_players - 1
-            if self.login:
-                web_human_player = WebHumanPlayer(
-                    game=self,
-                    login=self.login,
-                )
-                self.state.add_player(web_human_player)
-            else:
-                self.state.add_player(LocalHumanPlayer(game=self, name="Human"))
-        else:
-            num_ai = self.num_players
-
-        ai_pool = PERSONALITIES.copy()
-        for i in range(num_ai):
-            name = random.choice(list(ai_pool.keys()))
-            personality = ai_pool[name]
-            del ai_pool[name]
-
-            model = get_random_model()
-            player = AIPlayer(
-                game=self,
-                name=name,
-                model=model,
-                personality=personality,
-                api_key=self.get_key(),
-            )
-            self.state.add_player(player)
-
-        random.shuffle(self.state.players)
+        humans = self.create_players()
+        self.record(
+            "players",
+            players=[player.replay_info() for player in self.state.players],
+            humans=[human.name for human in humans],
+        )
 
-        await everyone_observe(
-            self.state.players,
+        await self.announce(
             GameStartedMessage(
                 message=f"The players in this game are: {', '.join([p.name for p in self.state.players])}.",
                 players=[p.name for p in self.state.players],
             ),
         )
 
-        rules = get_rules(get_roles_in_game(len(self.state.players)))
-        await everyone_observe(
-            [p for p in self.state.players if isinstance(p, WebHumanPlayer)],
+        roles_in_game = self.choose_role_pool()
+        rules = get_rules(roles_in_game)
+        await self.announce(
             ObservationMessage(message=rules),
+            players=[p for p in self.state.players if isinstance(p, WebHumanPlayer)],
         )
 
         # Assign roles
-        roles_in_game = get_roles_in_game(len(self.state.players))
-        center_cards = await assign_roles(
-            self.state.players, roles_in_game=roles_in_game
-        )
+        center_cards = await self.deal_roles(roles_in_game)
         self.state.role_pool = roles_in_game
-        await everyone_observe(
-            self.state.players,
+        self.record(
+            "roles",
+            role_pool=[role.name for role in roles_in_game],
+            assignment={p.name: p.role.name for p in self.state.players},
+            center=[role.name for role in center_cards],
+        )
+        await self.announce(
             ObservationMessage(
                 message=f"The full role pool in this game are: {', '.join([role.name for role in roles_in_game])}. Remember that 3 of them are in the center, not owned by other players."
             ),
@@ -111,15 +149,111 @@ class OneNightWerewolf(Game):
                 )
             )
 
+        if self.prefetch_night_choices:
+            self.start_night_choices()
+
         # Wait for human players to be ready
         human_players = [p for p in self.state.players if isinstance(p, WebHumanPlayer)]
         if human_players:
             await asyncio.gather(*[p.wait_for_ready() for p in human_players])
 
+    def start_night_choices(self) -> None:
+        """Starts the AI players' night choices, which then run while humans read
+        the rules. The night still plays out in wake order, using each answer when
+        its player wakes."""
+        told_at_night = self.players_told_at_night()
+        for player in self.state.players:
+            if isinstance(player, AIPlayer) and player not in told_at_night:
+                request = player.original_role.night_choice(player, self.state)
+                if request is not None:
+                    player.prefetch_choice(request)
+
+    def players_told_at_night(self) -> Set[Player]:
+        """Players another night action might tell something before they wake. Their
+        choice has to wait, so it's made knowing that."""
+        if not any(role.taps_neighbours for role in self.state.role_pool):
+            return set()
+        told = set()
+        players = self.state.players
+        for seat, player in enumerate(players):
+            role = player.original_role
+            # The Doppelganger could copy a role that taps
+            if role.taps_neighbours or isinstance(role, Doppelganger):
+                told.add(players[seat - 1])
+                told.add(players[(seat + 1) % len(players)])
+        return told
+
+    def cancel_night_choices(self) -> None:
+        for player in self.state.players:
+            if isinstance(player, AIPlayer):
+                player.cancel_prefetch()
+
+    def create_players(self) -> List[HumanPlayer]:
+        """Seats the humans (if any) and AI players in a random order. Returns the
+        humans in the order they were added, which the seating depends on."""
+        humans = self.make_human_players()
+        for human in humans:
+            self.state.add_player(human)
+        num_ai = self.num_players - len(humans)
+
+        human_names = {human.name for human in humans}
+        ai_pool = {
+            name: personality
+            for name, personality in PERSONALITIES.items()
+            if name not in human_names
+        }
+        for i in range(num_ai):
+            name = self.rng.choice(list(ai_pool.keys()))
+            personality = ai_pool[name]
+            del ai_pool[name]
+
+            model = model_router.choose_model(self.rng)
+            self.state.add_player(self.make_ai_player(name, model, personality))
+
+        self.rng.shuffle(self.state.players)
+        return humans
+
+    def make_human_players(self) -> List[HumanPlayer]:
+        if self.logins:
+            players = []
+            names = set()
+            for login in self.logins:
+                # Humans matched by the lobby can share a name, numbered like Alex2
+                name = login.name
+                number = 2
+                while name in names:
+                    name = f"{login.name}{number}"
+                    number += 1
+                names.add(name)
+                players.append(WebHumanPlayer(game=self, login=login, name=name))
+            return players
+        if self.has_human:
+            return [LocalHumanPlayer(game=self, name="Human")]
+        return []
+
+    def make_ai_player(self, name: str, model: str, personality: str) -> AIPlayer:
+        return AIPlayer(
+            game=self,
+            name=name,
+            model=model,
+            personality=personality,
+            api_key=self.get_key(),
+        )
+
+    def choose_role_pool(self) -> List[Role]:
+        return get_roles_in_game(len(self.state.players), rng=self.rng)
+
+    async def deal_roles(self, roles_in_game: List[Role]) -> List[Role]:
+        """Gives each player a role, returning the center cards."""
+        center_cards = await assign_roles(
+            self.state.players, roles_in_game=roles_in_game, rng=self.rng
+        )
+        self.state.index_roles()
+        return center_cards
+
     async def play_night_phase(self) -> None:
         logger.info("Starting night phase")
-        await everyone_observe(
-            self.state.players,
+        await self.announce(
             PhaseMessage(message="Night phase begins.", phase="night"),
         )
 
@@ -129,14 +263,16 @@ class OneNightWerewolf(Game):
         )
         night_roles = list(dict.fromkeys(night_roles))  # ordered dedup
         for role in night_roles:
-            for player in [p for p in self.state.players if p.original_role == role]:
+            for player in self.state.players_with_role(role, original=True):
                 action = await player.night_action(self.state)
                 if action:
                     self.state.record_night_action(player, action)
+                    self.record("night_action", player=player.name, action=action)
+        # Any not used, such as an AI whose role's choice changed
+        self.cancel_night_choices()
 
     async def play_day_phase(self) -> None:
-        await everyone_observe(
-            self.state.players,
+        await self.announce(
             PhaseMessage(message="Day phase begins", phase="day"),
         )
 
@@ -148,70 +284,94 @@ class OneNightWerewolf(Game):
             if round_i + 1 == num_rounds:
                 conversation_round_message += " (FINAL CHANCE TO TALK)"
 
-            await everyone_observe(
-                self.state.players,
+            await self.announce(
                 ObservationMessage(message=conversation_round_message),
             )
 
             for speaker in self.state.players:
-                await everyone_observe(
-                    [p for p in self.state.players if isinstance(p, WebHumanPlayer)],
+                await self.announce(
                     NextSpeakerMessage(player=speaker.name),
+                    players=[
+                        p for p in self.state.players if isinstance(p, WebHumanPlayer)
+                    ],
                 )
                 message = await speaker.speak()
-                await everyone_observe(
-                    self.state.players,
+                if message is None:
+                    # No model answered, so the AI stays quiet this round
+                    continue
+                await self.announce(
                     SpeechMessage(message=message, username=speaker.name),
                 )
 
     async def voting_phase(self) -> List[Player]:
-        await everyone_observe(
-            self.state.players,
+        await self.announce(
             PhaseMessage(message="Beginning of voting phase", phase="voting"),
         )
 
-        voter_to_vote = {}
-        vote_coroutines = []
-        for player in self.state.players:
-            vote_coroutine = player.vote([p for p in self.state.players if p != player])
-            vote_coroutines.append(vote_coroutine)
-
-        votes = await asyncio.gather(*vote_coroutines)
-        for player, voted_player in zip(self.state.players, votes):
-            voter_to_vote[player] = voted_player
-
-        for player, voted_player in voter_to_vote.items():
-            await everyone_observe(
-                self.state.players,
-                BaseMessage(
-                    type="player_voted",
-                    message=f"{player.name} voted for {voted_player.name}",
-                ),
-            )
-
-        vote_count = {}
-        for voted_player in voter_to_vote.values():
-            vote_count[voted_player] = vote_count.get(voted_player, 0) + 1
-
-        max_votes = max(vote_count.values())
+        voter_to_vote: Dict[Player, Optional[Player]] = {}
+        vote_tasks = [
+            asyncio.create_task(self.collect_vote(player))
+            for player in self.state.players
+        ]
+        try:
+            for next_vote in asyncio.as_completed(vote_tasks):
+                voter, voted_player = await next_vote
+                voter_to_vote[voter] = voted_player
+                await self.announce(
+                    BaseMessage(type="player_voted", message=f"{voter.name} has voted."),
+                )
+        finally:
+            for vote_task in vote_tasks:
+                vote_task.cancel()
+            await asyncio.gather(*vote_tasks, return_exceptions=True)
+
+        vote_count = Counter(
+            voted_player
+            for voted_player in voter_to_vote.values()
+            if voted_player is not None
+        )
+        max_votes = max(vote_count.values(), default=0)
         executed_players = [p for p, v in vote_count.items() if v == max_votes]
 
-        for executed_player in executed_players:
-            await everyone_observe(
-                self.state.players,
-                PlayerActionMessage(
-                    message=f"\n{executed_player.name} has been executed!",
-                    player=executed_player.name,
-                    action="executed",
-                ),
-            )
+        # Results are listed in seating order rather than the order votes arrived
+        voter_to_vote = {p: voter_to_vote[p] for p in self.state.players}
+        vote_lines = [
+            f"{voter.name} voted for {voted_player.name}"
+            if voted_player
+            else f"{voter.name} did not vote"
+            for voter, voted_player in voter_to_vote.items()
+        ]
+        execution_lines = [f"{p.name} has been executed!" for p in executed_players]
+        await self.announce(
+            VoteResultsMessage(
+                message="\n".join(vote_lines) + "\n\n" + "\n".join(execution_lines),
+                votes={
+                    voter.name: voted_player.name if voted_player else None
+                    for voter, voted_player in voter_to_vote.items()
+                },
+                executed=[p.name for p in executed_players],
+            ),
+        )
 
         return executed_players
 
+    async def collect_vote(self, voter: Player) -> Tuple[Player, Optional[Player]]:
+        """Gets a player's vote, applying the deadline policy if they're too slow."""
+        candidates = [p for p in self.state.players if p != voter]
+        try:
+            voted_player = await asyncio.wait_for(
+                voter.vote(candidates), timeout=self.voting_settings.deadline
+            )
+            return voter, voted_player
+        except asyncio.TimeoutError:
+            metrics.increment("votes_past_deadline")
+            logger.warning(f"{voter.name} did not vote before the deadline")
+            if self.voting_settings.deadline_policy == "random":
+                return voter, self.rng.choice(candidates)
+            return voter, None
+
     async def check_win_condition(self, executed_players: List[Player]) -> None:
-        werewolves_exist = any(
-            p for p in self.state.players if p.role.name == "Werewolf"
-        )
+        werewolves_exist = self.state.has_role("Werewolf")
         winners = [
             p
             for p in self.state.players
@@ -219,16 +379,14 @@ class OneNightWerewolf(Game):
         ]
 
         for winner in winners:
-            await everyone_observe(
-                self.state.players,
+            await self.announce(
                 PlayerActionMessage(
                     message=f"{winner} wins!", player=winner.name, action="win"
                 ),
             )
 
         for player in self.state.players:
-            await everyone_observe(
-                self.state.players,
+            await self.announce(
                 PlayerActionMessage(
                     message=f"{player.name} started as {player.original_role.name} and ended as {player.role.name}.",
                     player=player.name,
@@ -236,16 +394,23 @@ class OneNightWerewolf(Game):
                 ),
             )
 
+        self.record(
+            "result",
+            winners=[p.name for p in winners],
+            final_roles={p.name: p.role.name for p in self.state.players},
+        )
+        await self.update_performance(winners)
+
+    async def update_performance(self, winners: List[Player]) -> None:
         for player in self.state.players:
             if isinstance(player, AIPlayer):
                 performance_tracker.update_performance(
                     player, did_win=player in winners
                 )
-        performance_tracker.save_performance_data()
+        await performance_tracker.save_in_background()
 
     async def chat(self) -> None:
-        await everyone_observe(
-            self.state.players,
+        await self.announce(
             PhaseMessage(
                 message="Game is over. Post game chat.", phase="post game chat"
             ),
@@ -257,11 +422,26 @@ class OneNightWerewolf(Game):
         ai_players = [p for p in self.state.players if not isinstance(p, HumanPlayer)]
         ai_names = [p.name for p in ai_players]
 
-        for i in range(5):
+        spent_at_start = self.ai_spending(ai_players)
+        num_ai_replies = 0
+        while human_players_in_chat:
+            cost, tokens = [
+                now - start
+                for now, start in zip(self.ai_spending(ai_players), spent_at_start)
+            ]
+            if self.chat_settings.is_exhausted(cost, tokens, num_ai_replies):
+                await everyone_observe(
+                    human_players_in_chat,
+                    BaseMessage(
+                        type="warn",
+                        message="Sorry, cutting off conversation here in case this is an unintentional loop, to avoid high charges",
+                    ),
+                )
+                break
+
             for human in human_players_in_chat:
                 message = await human.speak(chat=True)
-                await everyone_observe(
-                    self.state.players,
+                await self.announce(
                     SpeechMessage(message=message, username=human.name),
                 )
 
@@ -277,27 +457,62 @@ class OneNightWerewolf(Game):
                 else:
                     ais_to_speak = ai_players
 
-                for ai_to_speak in ais_to_speak:
-                    await everyone_observe(
-                        [
-                            p
-                            for p in self.state.players
-                            if isinstance(p, WebHumanPlayer)
-                        ],
-                        NextSpeakerMessage(player=ai_to_speak.name),
-                    )
-                    message = await ai_to_speak.speak()
-                    await everyone_observe(
-                        self.state.players,
-                        SpeechMessage(message=message, username=ai_to_speak.name),
-                    )
-
-        await everyone_observe(
-            human_players_in_chat,
-            BaseMessage(
-                type="warn",
-                message="Sorry, cutting off conversation here in case this is an unintentional loop, to avoid high charges",
-            ),
+                round_trip_start = time.time()
+                await self.chat_replies(ais_to_speak)
+                num_ai_replies += len(ais_to_speak)
+                round_trip = time.time() - round_trip_start
+                metrics.observe("chat_round_trip_s", round_trip)
+                logger.info(
+                    "Chat round trip for {} AI replies took {:.2f}s",
+                    len(ais_to_speak),
+                    round_trip,
+                )
+
+    async def chat_replies(self, ais_to_speak: List[AIPlayer]) -> None:
+        """Has each AI reply to the latest chat message."""
+        web_players = [p for p in self.state.players if isinstance(p, WebHumanPlayer)]
+
+        async def show_reply(ai_player: AIPlayer, message: Optional[str]):
+            if message is None:
+                return
+            await self.announce(
+                NextSpeakerMessage(player=ai_player.name), players=web_players
+            )
+            await self.announce(
+                SpeechMessage(message=message, username=ai_player.name),
+            )
+
+        if not self.chat_settings.concurrent_replies:
+            # Each AI also sees the replies before its own
+            for ai_to_speak in ais_to_speak:
+                await show_reply(ai_to_speak, await ai_to_speak.speak(chat=True))
+            return
+
+        semaphore = asyncio.Semaphore(self.chat_settings.max_concurrent_replies)
+
+        async def reply(ai_player: AIPlayer):
+            async with semaphore:
+                return ai_player, await ai_player.speak(chat=True)
+
+        reply_tasks = [asyncio.create_task(reply(ai)) for ai in ais_to_speak]
+        try:
+            if self.chat_settings.reply_order == "as_completed":
+                for next_reply in asyncio.as_completed(reply_tasks):
+                    await show_reply(*await next_reply)
+            else:
+                for reply_task in reply_tasks:
+                    await show_reply(*await reply_task)
+        finally:
+            for reply_task in reply_tasks:
+                reply_task.cancel()
+            await asyncio.gather(*reply_tasks, return_exceptions=True)
+
+    @staticmethod
+    def ai_spending(ai_players: List[AIPlayer]) -> Tuple[float, int]:
+        """Total cost and tokens used so far by the given AIs"""
+        return (
+            sum(p.total_cost for p in ai_players),
+            sum(p.total_tokens for p in ai_players),
         )
 
     async def play_game(self) -> None:
@@ -318,13 +533,16 @@ class OneNightWerewolf(Game):
         finally:
             logger.info(f"Game {self.id} ended")
             self.game_over = True
-            await everyone_observe(
-                players=self.state.players,
-                event=GameEndedMessage(message="The game server shut down."),
+            self.cancel_night_choices()
+            await self.announce(
+                GameEndedMessage(message="The game server shut down."),
             )
+            self.spectators.close()
+            await self.save_replay()
 
     def get_key(self):
-        """Returns the key of a random player. Intended to fairly distribute costs to present players."""
+        """Returns the key of a random player. Intended to fairly distribute costs to present players.
+        Doesn't use the game's rng since it doesn't affect the game."""
         web_players = [
             player
             for player in self.state.players
@@ -0,0 +1,587 @@
+"""Exact enumeration of the night phase, for working out where cards ended up.
+
+Given one player's view of the night (their seat, starting role, what their night
+action showed them and how often a Thing tapped them), every deal and every choice the
+other players could have made is enumerated, giving the probability of each seat's
+final role. Other players are assumed to pick uniformly among their legal choices, and
+everything else follows the rules in onuw_roles.
+
+The enumeration stays small by only telling apart what the observer could:
+- Only the roles whose night action moves cards or taps someone are dealt up front.
+  Every other card stays face down until the observer needs to know what it is, and
+  face down cards are an even shuffle of what's left wherever they get moved to.
+- Seats the observation says nothing about are interchangeable, so states that only
+  differ by how those seats are ordered are computed once.
+- Robber and Troublemaker swaps after the observer's turn are averaged straight into
+  the final probabilities, rather than followed one choice at a time.
+
+A cold query can take most of a second at 7 to 10 players, with Insomniacs in the
+pool the worst. Anything on the event loop, such as a game or an AI player, must use
+final_role_probabilities_async, which answers from the cache straight away and runs
+cold queries in a thread so other games keep running. final_role_probabilities and
+NightEnumerator.given block until done, for tests, benchmarks and code already off
+the event loop.
+"""
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from games.one_night_ultimate_werewolf.onuw_roles import ONUWRole
+
+# Observations whose results each enumerator keeps
+MAX_CACHED = 1024
+
+WAKE_ORDER: Dict[str, float] = {
+    role.name: role.wake_order for role in (cls() for cls in ONUWRole.__subclasses__())
+}
+
+# Roles whose night action can change the cards or tap the observer. Anything else
+# only changes what that player knows.
+CHANGES_CARDS = {"Doppelganger", "Thing", "Robber", "Troublemaker"}
+# Roles whose night action is a swap with targets picked regardless of the cards
+SWAPS = {"Robber", "Troublemaker"}
+
+FACE_DOWN = "?"  # A card that hasn't been dealt or looked at yet
+ACTED = ""  # Original role of a seat that won't wake up (any more)
+
+# Seats are (original role still to wake up, current card), cards in the center are
+# just the card. Locations are ("known", i), ("others", i) or ("center", i).
+Seat = Tuple[str, str]
+Location = Tuple[str, int]
+
+
+@dataclass(frozen=True)
+class NightObservation:
+    """What one player knows after the night.
+
+    action is what their own night action showed them, one of
+    - ("werewolves", (seat, ...)): the other Werewolves
+    - ("center_card", role): a lone Werewolf's look at the center
+    - ("center", (role, role)): the Seer's look at the first two center cards
+    - ("seat", seat, role): the Seer's look at a player
+    - ("rob", seat, role): the Robber's swap and their new role
+    - ("swap", seat, seat): the Troublemaker's swap
+    - ("own_card", role): the Insomniac's look at their own card
+    - ("tap", seat): the Thing's tap
+    - ("copy", seat, role, action): the Doppelganger's copy, then the copied role's action
+    or None for roles without a night action.
+    """
+
+    seat: int
+    role: str
+    action: Optional[tuple] = None
+    taps: int = 0
+
+
+def mentioned_seats(action: Optional[tuple]) -> List[int]:
+    if action is None:
+        return []
+    kind = action[0]
+    if kind == "werewolves":
+        return list(action[1])
+    if kind in ("seat", "rob", "tap"):
+        return [action[1]]
+    if kind == "swap":
+        return [action[1], action[2]]
+    if kind == "copy":
+        return [action[1]] + mentioned_seats(action[3])
+    return []
+
+
+@dataclass
+class _State:
+    known: List[Seat]
+    others: List[Seat]
+    center: List[str]
+    hidden: List[int]  # Counts of each role among the face down cards
+    taps: int = 0
+
+    def copy(self) -> "_State":
+        return _State(
+            self.known[:], self.others[:], self.center[:], self.hidden[:], self.taps
+        )
+
+    def key(self, step: int) -> tuple:
+        return (
+            step,
+            tuple(self.known),
+            tuple(sorted(self.others)),
+            tuple(sorted(self.center)),
+            tuple(self.hidden),
+            self.taps,
+        )
+
+    def card(self, location: Location) -> str:
+        group, i = location
+        if group == "center":
+            return self.center[i]
+        return getattr(self, group)[i][1]
+
+    def set_card(self, location: Location, card: str, original: str = None) -> None:
+        group, i = location
+        if group == "center":
+            self.center[i] = card
+        else:
+            seats = getattr(self, group)
+            seats[i] = (seats[i][0] if original is None else original, card)
+
+
+Branches = List[Tuple[float, _State]]
+
+
+class NightEnumerator:
+    """Final role probabilities for a role pool and player count.
+
+    Results are cached per observation, see get_night_enumerator for a shared instance.
+    Safe to query from several threads at once.
+    """
+
+    def __init__(self, role_pool: Sequence[str], num_players: int):
+        if len(role_pool) != num_players + 3:
+            raise ValueError(
+                f"A {num_players} player game needs {num_players + 3} roles, got {len(role_pool)}"
+            )
+        self.num_players = num_players
+        self.pool_counts = Counter(role_pool)
+        self.roles = sorted(self.pool_counts)
+        self.columns = {role: i for i, role in enumerate(self.roles)}
+        self.night_roles = sorted(
+            (role for role in self.roles if WAKE_ORDER[role] < 100),
+            key=WAKE_ORDER.__getitem__,
+        )
+        self.results: "OrderedDict[NightObservation, List[Dict[str, float]]]" = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+    def cached(
+        self, observation: NightObservation
+    ) -> Optional[List[Dict[str, float]]]:
+        with self.lock:
+            result = self.results.get(observation)
+            if result is not None:
+                self.results.move_to_end(observation)
+            return result
+
+    def given(self, observation: NightObservation) -> List[Dict[str, float]]:
+        """For each seat, the probability of each final role. Raises ValueError if the
+        observation can't happen with this role pool."""
+        result = self.cached(observation)
+        if result is None:
+            result = _ObservedNight(self, observation).final_roles()
+            with self.lock:
+                self.results[observation] = result
+                if len(self.results) > MAX_CACHED:
+                    self.results.popitem(last=False)
+        return result
+
+    async def given_async(
+        self, observation: NightObservation
+    ) -> List[Dict[str, float]]:
+        """given, without blocking the event loop on a cold query."""
+        result = self.cached(observation)
+        if result is None:
+            result = await asyncio.to_thread(self.given, observation)
+        return result
+
+
+@lru_cache(maxsize=64)
+def get_night_enumerator(role_pool: Tuple[str, ...], num_players: int) -> NightEnumerator:
+    return NightEnumerator(role_pool, num_players)
+
+
+def final_role_probabilities(
+    role_pool: Sequence[str], num_players: int, observation: NightObservation
+) -> List[Dict[str, float]]:
+    enumerator = get_night_enumerator(tuple(sorted(role_pool)), num_players)
+    return enumerator.given(observation)
+
+
+async def final_role_probabilities_async(
+    role_pool: Sequence[str], num_players: int, observation: NightObservation
+) -> List[Dict[str, float]]:
+    enumerator = get_night_enumerator(tuple(sorted(role_pool)), num_players)
+    return await enumerator.given_async(observation)
+
+
+class _ObservedNight:
+    """The enumeration for a single observation.
+
+    "known" seats are the ones the observer can tell apart: themself first, then seats
+    their observation mentions and, if a Thing could tap them, their neighbors.
+    The interchangeable rest are "others".
+    """
+
+    def __init__(self, night: NightEnumerator, observation: NightObservation):
+        self.night = night
+        self.observation = observation
+        num_players = night.num_players
+        seat = observation.seat
+        if observation.role not in night.pool_counts:
+            raise ValueError(f"{observation.role} is not in the role pool")
+
+        seats = set(mentioned_seats(observation.action))
+        if not all(0 <= s < num_players for s in seats | {seat}):
+            raise ValueError(f"{observation} mentions a seat outside the game")
+        neighbors = {(seat - 1) % num_players, (seat + 1) % num_players}
+        if "Thing" in night.pool_counts:
+            seats |= neighbors
+        self.seats = [seat] + sorted(seats - {seat})
+        self.index = {s: i for i, s in enumerate(self.seats)}
+        self.neighbors = {
+            ("known", i) for i, s in enumerate(self.seats) if s in neighbors
+        }
+        self.num_others = num_players - len(self.seats)
+        # Everyone else only wakes up to learn something, which changes nothing
+        self.turns = [
+            role
+            for role in night.night_roles
+            if role in CHANGES_CARDS or role == observation.role
+        ]
+        # Swaps after the observer's turn and any taps can be averaged over, rather
+        # than followed one by one
+        self.swaps_from = len(self.turns)
+        while (
+            self.swaps_from
+            and self.turns[self.swaps_from - 1] in SWAPS
+            and self.turns[self.swaps_from - 1] != observation.role
+        ):
+            self.swaps_from -= 1
+        self.memo: Dict[tuple, np.ndarray] = {}
+        self.nothing = np.zeros((len(self.seats) + 1, len(night.roles)))
+
+    def final_roles(self) -> List[Dict[str, float]]:
+        role = self.observation.role
+        hidden = [self.night.pool_counts[r] for r in self.night.roles]
+        hidden[self.night.columns[role]] -= 1
+        state = _State(
+            known=[(role if role in self.turns else ACTED, role)]
+            + [(ACTED, FACE_DOWN)] * (len(self.seats) - 1),
+            others=[(ACTED, FACE_DOWN)] * self.num_others,
+            center=[FACE_DOWN] * 3,
+            hidden=hidden,
+        )
+        deals = [(1.0, state)]
+        for night_role in self.turns:
+            if night_role in CHANGES_CARDS:
+                deals = [
+                    (p * q, dealt)
+                    for p, before in deals
+                    for q, dealt in self.place(before, night_role)
+                ]
+        result = np.zeros_like(self.nothing)
+        for p, dealt in deals:
+            result += p * self.solve(0, dealt)
+
+        # Every consistent outcome gives the observer's own seat exactly one role
+        total = result[0].sum()
+        if total <= 0:
+            raise ValueError(f"{self.observation} is not possible")
+        table = []
+        for seat in range(self.night.num_players):
+            if seat in self.index:
+                row = result[self.index[seat]] / total
+            else:
+                row = result[-1] / (total * self.num_others)
+            table.append(
+                {role: float(row[i]) for i, role in enumerate(self.night.roles) if row[i] > 0}
+            )
+        return table
+
+    def solve(self, step: int, state: _State) -> np.ndarray:
+        """Probability weighted final roles of every outcome from here that matches the
+        observation. Rows are the known seats, then the others summed."""
+        state = self.forget(step, state)
+        key = state.key(step)
+        cached = self.memo.get(key)
+        if cached is not None:
+            return cached
+
+        if step >= self.swaps_from:
+            result = self.final_cards(step, state)
+        else:
+            role = self.turns[step]
+            actors = [
+                (group, i)
+                for group in ("known", "others")
+                for i, seat in enumerate(getattr(state, group))
+                if seat[0] == role
+            ]
+            branches = [(1.0, state)]
+            for actor in actors:
+                branches = [
+                    (p * q, after)
+                    for p, before in branches
+                    for q, after in self.act(before, actor, role)
+                ]
+            result = np.zeros_like(self.nothing)
+            for p, after in branches:
+                result += p * self.solve(step + 1, after)
+
+        self.memo[key] = result
+        return result
+
+    def forget(self, step: int, state: _State) -> _State:
+        """Drops what can't matter any more, so states only differing by it are computed
+        once: who has already had their turn, and once the observer has had theirs,
+        the center cards."""
+        upcoming = self.turns[step:]
+        stale_seats = any(
+            seat[0] and seat[0] not in upcoming for seat in state.known + state.others
+        )
+        stale_center = state.center and state.known[0][0] not in upcoming
+        if not stale_seats and not stale_center:
+            return state
+        # Branches can share a state, so never change one in place
+        state = state.copy()
+        for group in (state.known, state.others):
+            for i, (original, card) in enumerate(group):
+                if original not in upcoming:
+                    group[i] = (ACTED, card)
+        if stale_center:
+            state.center = []
+        return state
+
+    def final_cards(self, step: int, state: _State) -> np.ndarray:
+        """Final roles after the remaining swaps, which are all with uniformly picked
+        targets. A swap's effect on each seat's role probabilities is linear, so its
+        average effect can be applied directly."""
+        if state.taps != self.observation.taps:
+            return self.nothing
+        # Whatever is still face down is an even draw from the cards left
+        face_down = np.array(state.hidden, dtype=float) / max(sum(state.hidden), 1)
+        seats = state.known + state.others
+        rows = np.zeros((len(seats), len(self.night.roles)))
+        for row, (_, card) in zip(rows, seats):
+            self.add_card(row, card, face_down)
+
+        num_targets = self.night.num_players - 1
+        for role in self.turns[step:]:
+            for actor, seat in enumerate(seats):
+                if seat[0] != role:
+                    continue
+                targets = np.arange(len(seats)) != actor
+                if role == "Robber":
+                    # The Robber ends up with a random target's card, and each target
+                    # has a chance of ending up with the Robber's
+                    mine = rows[actor].copy()
+                    rows[actor] = rows[targets].sum(axis=0) / num_targets
+                    rows[targets] += (mine - rows[targets]) / num_targets
+                else:
+                    # Each target has a 2 / num_targets chance of being one of the two
+                    # swapped, and then gets a random other target's card
+                    total = rows[targets].sum(axis=0)
+                    swapped = (total - rows[targets]) / (num_targets - 1)
+                    rows[targets] += (swapped - rows[targets]) * 2 / num_targets
+
+        result = np.empty_like(self.nothing)
+        result[: len(state.known)] = rows[: len(state.known)]
+        result[-1] = rows[len(state.known) :].sum(axis=0)
+        return result
+
+    def add_card(self, row: np.ndarray, card: str, face_down: np.ndarray) -> None:
+        if card == FACE_DOWN:
+            row += face_down
+        else:
+            row[self.night.columns[card]] += 1
+
+    def place(self, state: _State, role: str) -> Branches:
+        """Deals every face down copy of role. Face down cards are an even shuffle of
+        what's left, so each set of places is equally likely."""
+        column = self.night.columns[role]
+        copies = state.hidden[column]
+        if not copies:
+            return [(1.0, state)]
+        known = [i for i, (_, card) in enumerate(state.known) if card == FACE_DOWN]
+        others = [i for i, (_, card) in enumerate(state.others) if card == FACE_DOWN]
+        center = [i for i, card in enumerate(state.center) if card == FACE_DOWN]
+        ways = comb(len(known) + len(others) + len(center), copies)
+
+        branches = []
+        for num_known in range(copies + 1):
+            for chosen in combinations(known, num_known):
+                for num_others in range(copies - num_known + 1):
+                    num_center = copies - num_known - num_others
+                    weight = comb(len(others), num_others) * comb(len(center), num_center)
+                    if not weight:
+                        continue
+                    placed = state.copy()
+                    placed.hidden[column] = 0
+                    # Only roles that change the cards still need to wake up
+                    seat = (role if role in CHANGES_CARDS else ACTED, role)
+                    for i in chosen:
+                        placed.known[i] = seat
+                    for i in others[:num_others]:
+                        placed.others[i] = seat
+                    for i in center[:num_center]:
+                        placed.center[i] = role
+                    branches.append((weight / ways, placed))
+        return branches
+
+    def reveal(self, state: _State, location: Location) -> Branches:
+        if state.card(location) != FACE_DOWN:
+            return [(1.0, state)]
+        total = sum(state.hidden)
+        branches = []
+        for column, count in enumerate(state.hidden):
+            if count:
+                branches.append(
+                    (count / total, self.revealed_as(state, location, column))
+                )
+        return branches
+
+    def reveal_as(self, state: _State, location: Location, role: str) -> Branches:
+        card = state.card(location)
+        if card == role:
+            return [(1.0, state)]
+        column = self.night.columns.get(role)
+        if card != FACE_DOWN or column is None or not state.hidden[column]:
+            return []
+        p = state.hidden[column] / sum(state.hidden)
+        return [(p, self.revealed_as(state, location, column))]
+
+    def revealed_as(self, state: _State, location: Location, column: int) -> _State:
+        role = self.night.roles[column]
+        revealed = state.copy()
+        revealed.hidden[column] -= 1
+        # Roles that change the cards were dealt up front, so this one won't wake up
+        revealed.set_card(location, role, ACTED)
+        return revealed
+
+    def swap(self, state: _State, first: Location, second: Location) -> Branches:
+        swapped = state.copy()
+        first_card = swapped.card(first)
+        swapped.set_card(first, swapped.card(second))
+        swapped.set_card(second, first_card)
+        return [(1.0, swapped)]
+
+    def targets(self, state: _State, actor: Location) -> List[List[Location]]:
+        """Everyone but the actor, with interchangeable seats grouped together."""
+        targets = [[("known", i)] for i in range(len(state.known)) if ("known", i) != actor]
+        groups: Dict[Seat, List[Location]] = {}
+        for i, seat in enumerate(state.others):
+            if ("others", i) != actor:
+                groups.setdefault(seat, []).append(("others", i))
+        return targets + list(groups.values())
+
+    def act(self, state: _State, actor: Location, role: str) -> Branches:
+        if actor == ("known", 0):
+            return self.observer_acts(state, role, self.observation.action)
+
+        num_targets = self.night.num_players - 1
+        branches = []
+        if role == "Doppelganger":
+            for group in self.targets(state, actor):
+                for p, revealed in self.reveal(state, group[0]):
+                    copied = revealed.card(group[0])
+                    copying = revealed.copy()
+                    copying.set_card(actor, copied)
+                    for q, after in self.act(copying, actor, copied):
+                        branches.append((len(group) / num_targets * p * q, after))
+        elif role == "Robber":
+            for group in self.targets(state, actor):
+                for p, after in self.swap(state, actor, group[0]):
+                    branches.append((len(group) / num_targets * p, after))
+        elif role == "Troublemaker":
+            groups = self.targets(state, actor)
+            pairs = [(a[0], b[0], len(a) * len(b)) for a, b in combinations(groups, 2)]
+            pairs += [(g[0], g[1], comb(len(g), 2)) for g in groups if len(g) > 1]
+            for first, second, weight in pairs:
+                for p, after in self.swap(state, first, second):
+                    branches.append((weight / comb(num_targets, 2) * p, after))
+        elif role == "Thing" and actor in self.neighbors:
+            # One of their two neighbors is the observer
+            tapped = state.copy()
+            tapped.taps += 1
+            branches = [(0.5, state), (0.5, tapped)]
+        else:
+            # Nothing else changes any cards or what the observer knows
+            branches = [(1.0, state)]
+        return branches
+
+    def observer_acts(self, state: _State, role: str, action: Optional[tuple]) -> Branches:
+        me = ("known", 0)
+        kind = action[0] if action else None
+
+        if role == "Doppelganger" and kind == "copy":
+            _, seat, copied, then = action
+            branches = []
+            for p, revealed in self.reveal_as(state, self.location(seat), copied):
+                copying = revealed.copy()
+                copying.set_card(me, copied)
+                for q, after in self.observer_acts(copying, copied, then):
+                    branches.append((p * q, after))
+            return branches
+
+        if role == "Werewolf" and kind in ("werewolves", "center_card"):
+            # A Doppelganger looks before the Werewolves have woken up and been placed
+            return [
+                (p * q, after)
+                for p, placed in self.place(state, "Werewolf")
+                for q, after in self.werewolf_looks(placed, action)
+            ]
+
+        if role == "Seer" and kind == "center":
+            # The Seer sees the first two center cards, in order
+            first, second = action[1]
+            return [
+                (p * q / 6, after)
+                for i in range(3)
+                for p, revealed in self.reveal_as(state, ("center", i), first)
+                for j in range(3)
+                if j != i
+                for q, after in self.reveal_as(revealed, ("center", j), second)
+            ]
+        if role == "Seer" and kind == "seat":
+            return self.reveal_as(state, self.location(action[1]), action[2])
+
+        if role == "Robber" and kind == "rob":
+            target = self.location(action[1])
+            return [
+                (p, after)
+                for p, revealed in self.reveal_as(state, target, action[2])
+                for _, after in self.swap(revealed, me, target)
+            ]
+
+        if role == "Troublemaker" and kind == "swap":
+            return self.swap(state, self.location(action[1]), self.location(action[2]))
+
+        if role == "Insomniac" and kind == "own_card":
+            return self.reveal_as(state, me, action[1])
+
+        if role == "Thing" and kind == "tap":
+            return [(1.0, state)]
+
+        if WAKE_ORDER[role] >= 100 and action is None:
+            return [(1.0, state)]
+
+        raise ValueError(f"{action} is not a night action for {role}")
+
+    def werewolf_looks(self, state: _State, action: tuple) -> Branches:
+        wolves = {
+            self.seats[i]
+            for i, (_, card) in enumerate(state.known[1:], 1)
+            if card == "Werewolf"
+        }
+        if any(card == "Werewolf" for _, card in state.others):
+            return []
+        if action[0] == "werewolves":
+            return [(1.0, state)] if wolves == set(action[1]) else []
+        if wolves:
+            return []
+        # A lone Werewolf sees a random center card
+        return [
+            (p / 3, after)
+            for i in range(3)
+            for p, after in self.reveal_as(state, ("center", i), action[1])
+        ]
+
+    def location(self, seat: int) -> Location:
+        return ("known", self.index[seat])
@@ -2,7 +2,7 @@ import random
 from typing import List, TYPE_CHECKING, Optional
 
 from message_types import ObservationMessage, PromptChoice
-from roles import Role, RoleInteraction
+from roles import ChoiceRequest, Role, RoleInteraction
 
 if TYPE_CHECKING:
     from game_state import GameState
@@ -10,6 +10,9 @@ if TYPE_CHECKING:
 
 
 class ONUWRole(Role):
+    # Whether the night action tells a neighbour something, before they may wake
+    taps_neighbours = False
+
     def __init__(self, name, wake_order=999.0):
         super().__init__(name)
         self.wake_order = wake_order
@@ -21,15 +24,13 @@ class Werewolf(ONUWRole):
 
     async def night_action(self, player: "Player", game_state: "GameState") -> str:
         other_werewolves = [
-            p
-            for p in game_state.players
-            if p != player and isinstance(p.role, Werewolf)
+            p for p in game_state.players_with_role("Werewolf") if p != player
         ]
         if other_werewolves:
             other_werewolves_names = ", ".join(w.name for w in other_werewolves)
             return f"You see that {other_werewolves_names} is/are also Werewolf/Werewolves."
         else:
-            random_center_card = random.choice(game_state.center_cards)
+            random_center_card = game_state.rng.choice(game_state.center_cards)
             return f"You see there is no other Werewolf. You see a {random_center_card.name} in the center."
 
     def get_inner_rules(self) -> str:
@@ -101,15 +102,17 @@ class Seer(ONUWRole):
     def __init__(self):
         super().__init__("Seer", wake_order=5)
 
-    async def night_action(self, player: "Player", game_state: "GameState") -> str:
-        players = game_state.players
+    def night_choice(self, player: "Player", game_state: "GameState") -> ChoiceRequest:
         choices = [PromptChoice(index=0, name="Look at two center cards")] + [
             PromptChoice(index=i, name=f"Look at {p.name}'s card")
-            for i, p in enumerate(players, 1)
+            for i, p in enumerate(game_state.players, 1)
             if p != player
         ]
-        prompt = f"Choose an action:"
-        choice = await player.get_choice(prompt, choices)
+        return ChoiceRequest("Choose an action:", choices)
+
+    async def night_action(self, player: "Player", game_state: "GameState") -> str:
+        players = game_state.players
+        choice = await player.get_choice(*self.night_choice(player, game_state))
 
         if choice[0] == 0:
             cards = game_state.center_cards[:2]
@@ -151,18 +154,20 @@ class Robber(ONUWRole):
     def __init__(self):
         super().__init__("Robber", wake_order=6)
 
-    async def night_action(self, player: "Player", game_state: "GameState") -> str:
-        players = game_state.players
+    def night_choice(self, player: "Player", game_state: "GameState") -> ChoiceRequest:
         choices = [
             PromptChoice(index=i, name=f"Rob {p.name}")
-            for i, p in enumerate(players)
+            for i, p in enumerate(game_state.players)
             if p != player
         ]
-        prompt = f"Choose a player to rob:"
-        choice = await player.get_choice(prompt, choices)
+        return ChoiceRequest("Choose a player to rob:", choices)
+
+    async def night_action(self, player: "Player", game_state: "GameState") -> str:
+        players = game_state.players
+        choice = await player.get_choice(*self.night_choice(player, game_state))
 
         target = players[choice[0]]
-        player.role, target.role = target.role, player.role
+        game_state.swap_roles(player, target, cause="Robber")
         return f"You swapped roles with {target.name}. Your new role is: {player.role.name}"
 
     def get_inner_rules(self) -> str:
@@ -191,21 +196,27 @@ class Troublemaker(ONUWRole):
     def __init__(self):
         super().__init__("Troublemaker", wake_order=7)
 
-    async def night_action(self, player: "Player", game_state: "GameState") -> str:
-        players = game_state.players
+    def night_choice(self, player: "Player", game_state: "GameState") -> ChoiceRequest:
         legal_choices = [
             PromptChoice(index=i, name=p.name)
-            for i, p in enumerate(players)
+            for i, p in enumerate(game_state.players)
             if p != player
         ]
-        prompt = f"Choose two players to swap roles:"
-        choices = await player.get_choice(
-            prompt, legal_choices, choose_multiple=True, min_choices=2, max_choices=2
+        return ChoiceRequest(
+            "Choose two players to swap roles:",
+            legal_choices,
+            choose_multiple=True,
+            min_choices=2,
+            max_choices=2,
         )
 
+    async def night_action(self, player: "Player", game_state: "GameState") -> str:
+        players = game_state.players
+        choices = await player.get_choice(*self.night_choice(player, game_state))
+
         player1 = players[choices[0]]
         player2 = players[choices[1]]
-        player1.role, player2.role = player2.role, player1.role
+        game_state.swap_roles(player1, player2, cause="Troublemaker")
         return f"You swapped the roles of {player1.name} and {player2.name}."
 
     def get_inner_rules(self) -> str:
@@ -293,6 +304,8 @@ class Insomniac(ONUWRole):
 
 
 class Thing(ONUWRole):
+    taps_neighbours = True
+
     def __init__(self):
         super().__init__("Thing", wake_order=4.2)
 
@@ -313,24 +326,26 @@ class Thing(ONUWRole):
             "Werewolves may not want to confirm they were tapped to avoid backing you up.",
         ]
 
-    async def night_action(
+    def adjacent_players(
         self, player: "Player", game_state: "GameState"
-    ) -> Optional[str]:
+    ) -> List["Player"]:
         my_index = game_state.players.index(player)
         previous_index = my_index - 1
         next_index = (my_index + 1) % len(game_state.players)
-        adjacent_players = [
-            game_state.players[previous_index],
-            game_state.players[next_index],
-        ]
+        return [game_state.players[previous_index], game_state.players[next_index]]
+
+    def night_choice(self, player: "Player", game_state: "GameState") -> ChoiceRequest:
         legal_choices = [
             PromptChoice(index=i, name=f"Tap {p.name}")
-            for i, p in enumerate(adjacent_players)
+            for i, p in enumerate(self.adjacent_players(player, game_state))
         ]
+        return ChoiceRequest("choose an adjacent player to tap: ", legal_choices)
 
-        choices = await player.get_choice(
-            "choose an adjacent player to tap: ", legal_choices
-        )
+    async def night_action(
+        self, player: "Player", game_state: "GameState"
+    ) -> Optional[str]:
+        adjacent_players = self.adjacent_players(player, game_state)
+        choices = await player.get_choice(*self.night_choice(player, game_state))
         choice = choices[0]
         tapped_player = adjacent_players[choice]
 
@@ -360,24 +375,25 @@ class Doppelganger(ONUWRole):
             or not werewolves_exist
         )
 
-    async def night_action(
-        self, player: "Player", game_state: "GameState"
-    ) -> Optional[str]:
-        players = game_state.players
+    def night_choice(self, player: "Player", game_state: "GameState") -> ChoiceRequest:
         legal_choices = [
             PromptChoice(index=i, name=f"Copy {p.name}")
-            for i, p in enumerate(players)
+            for i, p in enumerate(game_state.players)
             if p != player
         ]
-        choices = await player.get_choice(
-            prompt="Choose a player to copy their role:", choices=legal_choices
-        )
+        return ChoiceRequest("Choose a player to copy their role:", legal_choices)
+
+    async def night_action(
+        self, player: "Player", game_state: "GameState"
+    ) -> Optional[str]:
+        players = game_state.players
+        choices = await player.get_choice(*self.night_choice(player, game_state))
         choice = choices[0]
 
         target = players[choice]
         action_text = f"You copied the role of {target.name}. Your new role is: {target.role.name}"
 
-        player.role = target.role
+        game_state.set_role(player, target.role, cause="Doppelganger")
         second_night_action_text = await player.role.night_action(player, game_state)
         if second_night_action_text:
             action_text += f"\nThen, as the new role: " + second_night_action_text
@@ -390,7 +406,7 @@ class Doppelganger(ONUWRole):
         ]
 
 
-def get_roles_in_game(num_players: int) -> List[Role]:
+def get_roles_in_game(num_players: int, rng: random.Random = random) -> List[Role]:
     global_role_pool = [Werewolf(), Werewolf()]
 
     village_roles = [
@@ -403,18 +419,22 @@ def get_roles_in_game(num_players: int) -> List[Role]:
         Thing(),
         Doppelganger(),
     ]
-    random.shuffle(village_roles)
+    rng.shuffle(village_roles)
     global_role_pool += village_roles
 
-    role_pool_for_this_many_players = global_role_pool[: num_players + 3]
+    num_roles = num_players + 3
+    # Pad large games with Villagers
+    global_role_pool += [Villager() for _ in range(num_roles - len(global_role_pool))]
+
+    role_pool_for_this_many_players = global_role_pool[:num_roles]
     return role_pool_for_this_many_players
 
 
 async def assign_roles(
-    players: List["Player"], roles_in_game: List[Role]
+    players: List["Player"], roles_in_game: List[Role], rng: random.Random = random
 ) -> List[Role]:
     roles = roles_in_game[:]
-    random.shuffle(roles)
+    rng.shuffle(roles)
 
     for player, role in zip(players, roles[: len(players)]):
         await player.set_role(role)
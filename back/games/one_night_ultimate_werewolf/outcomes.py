@@ -0,0 +1,103 @@
+"""Vectorized win evaluation, for analyzing balance over many deals and votes at once.
+
+A batch of scenarios is encoded as integer arrays:
+- final_roles: (scenarios, players) role ids, see ROLE_IDS
+- votes: (scenarios, players) seat index each player voted for, or ABSTAIN
+
+The rules mirror each role's did_win, which check_win_condition uses for a single game.
+"""
+import itertools
+from typing import Dict, List
+
+import numpy as np
+
+from roles import Role
+
+ROLE_NAMES = [
+    "Werewolf",
+    "Villager",
+    "Seer",
+    "Robber",
+    "Troublemaker",
+    "Tanner",
+    "Insomniac",
+    "Thing",
+    "Doppelganger",
+]
+ROLE_IDS: Dict[str, int] = {name: i for i, name in enumerate(ROLE_NAMES)}
+WEREWOLF = ROLE_IDS["Werewolf"]
+TANNER = ROLE_IDS["Tanner"]
+ABSTAIN = -1
+
+
+def encode_roles(roles: List[Role]) -> np.ndarray:
+    return np.array([ROLE_IDS[role.name] for role in roles], dtype=np.int8)
+
+
+def executed_mask(votes: np.ndarray) -> np.ndarray:
+    """(scenarios, players) bool, True for players with the most votes (all on a tie).
+    Nobody is executed if nobody voted."""
+    num_scenarios, num_players = votes.shape
+    did_vote = votes != ABSTAIN
+    # Offset each scenario's seats so one bincount tallies every scenario
+    flat_votes = (votes + np.arange(num_scenarios)[:, None] * num_players)[did_vote]
+    vote_counts = np.bincount(flat_votes, minlength=num_scenarios * num_players)
+    vote_counts = vote_counts.reshape(num_scenarios, num_players)
+    max_votes = vote_counts.max(axis=1, keepdims=True)
+    return (vote_counts == max_votes) & (vote_counts > 0)
+
+
+def winners_mask(final_roles: np.ndarray, votes: np.ndarray) -> np.ndarray:
+    """(scenarios, players) bool, True for each player who won."""
+    executed = executed_mask(votes)
+    is_werewolf = final_roles == WEREWOLF
+    is_tanner = final_roles == TANNER
+
+    werewolf_executed = (executed & is_werewolf).any(axis=1, keepdims=True)
+    tanner_executed = (executed & is_tanner).any(axis=1, keepdims=True)
+    werewolves_exist = is_werewolf.any(axis=1, keepdims=True)
+
+    werewolf_team_wins = ~werewolf_executed & ~tanner_executed
+    village_team_wins = werewolf_executed | ~werewolves_exist
+    return np.where(
+        is_werewolf,
+        werewolf_team_wins,
+        np.where(is_tanner, executed, village_team_wins),
+    )
+
+
+def random_deals(
+    role_pool: List[Role], num_players: int, num_scenarios: int, rng: np.random.Generator
+) -> np.ndarray:
+    """(scenarios, players) role ids of random deals from the pool, center cards excluded."""
+    pool = np.broadcast_to(encode_roles(role_pool), (num_scenarios, len(role_pool)))
+    return rng.permuted(pool, axis=1)[:, :num_players]
+
+
+def random_votes(
+    num_players: int, num_scenarios: int, rng: np.random.Generator
+) -> np.ndarray:
+    """(scenarios, players) where each player votes for a random other player."""
+    # Draw from the other players by skipping over the voter's own seat
+    votes = rng.integers(0, num_players - 1, size=(num_scenarios, num_players))
+    return votes + (votes >= np.arange(num_players))
+
+
+def all_vote_patterns(num_players: int) -> np.ndarray:
+    """(patterns, players) every way players can each vote for another player."""
+    options = [
+        [target for target in range(num_players) if target != voter]
+        for voter in range(num_players)
+    ]
+    return np.array(list(itertools.product(*options)), dtype=np.int64)
+
+
+def win_rates(final_roles: np.ndarray, votes: np.ndarray) -> Dict[str, float]:
+    """Fraction of games each role won, over the scenarios where it was in play."""
+    winners = winners_mask(final_roles, votes)
+    rates = {}
+    for name, role_id in ROLE_IDS.items():
+        has_role = final_roles == role_id
+        if has_role.any():
+            rates[name] = float(winners[has_role].mean())
+    return rates
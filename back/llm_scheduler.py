@@ -0,0 +1,177 @@
+"""Shares the LLM call slots fairly between games.
+
+Each game is a flow with its own FIFO queue. Each call a game makes moves its tag on
+by 1 / weight, and a freed slot goes to the game whose next call would finish first
+in those terms (weighted fair queueing), so over time games get slots in proportion
+to their weight.
+Games with a human in them weigh more than headless simulations.
+
+In a game with a human, someone is waiting on every turn, so those calls also get a
+deadline, and a call whose deadline has passed goes ahead of every tag. A few slots are
+kept for them, since a call can't be preempted and waiting for one to finish would
+double a turn.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from metrics import metrics
+
+
+@dataclass
+class SchedulerSettings:
+    interactive_weight: float = 4.0
+    headless_weight: float = 1.0
+    # How long a human-facing call may wait for a slot before it's served first
+    turn_deadline_s: float = 2.0
+    # Slots headless games can't use, so a human's turn rarely waits for a call to
+    # finish
+    reserved_for_interactive: int = 2
+
+
+@dataclass
+class Waiter:
+    future: asyncio.Future
+    queued_at: float
+    deadline: Optional[float]
+
+
+@dataclass
+class Flow:
+    weight: float
+    kind: str
+    waiters: Deque[Waiter] = field(default_factory=deque)
+    # Start tag of the flow's next call, and finish tag of its last one
+    start: float = 0.0
+    finish: float = 0.0
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        capacity: int,
+        settings: SchedulerSettings = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.settings = settings or SchedulerSettings()
+        self.clock = clock
+        self.in_use = 0
+        self.flows: Dict[str, Flow] = {}
+        self.virtual_time = 0.0
+        self.num_waiting = 0
+
+    @asynccontextmanager
+    async def hold(self, game_id: str, interactive: bool) -> AsyncIterator[None]:
+        await self.acquire(game_id, interactive)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, game_id: str, interactive: bool) -> None:
+        flow = self.flows.get(game_id)
+        if flow is None:
+            if interactive:
+                flow = Flow(self.settings.interactive_weight, "interactive")
+            else:
+                flow = Flow(self.settings.headless_weight, "headless")
+            self.flows[game_id] = flow
+        if not flow.waiters:
+            # Idle flows don't bank credit
+            flow.start = max(self.virtual_time, flow.finish)
+        now = self.clock()
+        deadline = now + self.settings.turn_deadline_s if interactive else None
+        waiter = Waiter(asyncio.get_running_loop().create_future(), now, deadline)
+        flow.waiters.append(waiter)
+        self.num_waiting += 1
+        self.dispatch()
+        try:
+            # Already done if there was a free slot
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Given a slot just as it was cancelled
+                self.release()
+            else:
+                flow.waiters.remove(waiter)
+                self.num_waiting -= 1
+                self.update_gauges()
+            raise
+
+    def release(self) -> None:
+        self.in_use -= 1
+        self.dispatch()
+        self.forget_idle_flows()
+
+    def dispatch(self) -> None:
+        """Gives free slots to waiting calls."""
+        while self.num_waiting:
+            flow = self.next_flow()
+            if flow is None:
+                break
+            waiter = flow.waiters.popleft()
+            self.num_waiting -= 1
+            self.in_use += 1
+            self.charge(flow, flow.start)
+            metrics.observe(
+                f"llm_slot_wait_s.{flow.kind}", self.clock() - waiter.queued_at
+            )
+            waiter.future.set_result(None)
+        self.update_gauges()
+
+    def limit(self, flow: Flow) -> int:
+        if flow.kind == "interactive":
+            return self.capacity
+        return max(1, self.capacity - self.settings.reserved_for_interactive)
+
+    def next_flow(self) -> Optional[Flow]:
+        """The flow to give a free slot to, if any can use it."""
+        backlogged = [
+            flow
+            for flow in self.flows.values()
+            if flow.waiters and self.in_use < self.limit(flow)
+        ]
+        if not backlogged:
+            return None
+        now = self.clock()
+        overdue = [
+            flow
+            for flow in backlogged
+            if flow.waiters[0].deadline is not None
+            and flow.waiters[0].deadline <= now
+        ]
+        if overdue:
+            metrics.increment("llm_deadline_promotions")
+            return min(overdue, key=lambda flow: flow.waiters[0].deadline)
+        # By finish tag, so a game with more weight wins a tie
+        return min(backlogged, key=lambda flow: flow.start + 1 / flow.weight)
+
+    def charge(self, flow: Flow, start: float) -> None:
+        """Accounts for a call from the flow with this start tag getting a slot."""
+        self.virtual_time = max(self.virtual_time, start)
+        flow.finish = start + 1 / flow.weight
+        if flow.waiters:
+            flow.start = flow.finish
+
+    def forget_idle_flows(self) -> None:
+        """Drops flows that would start level with a new one, such as finished
+        games'. With nothing running, no game is ahead of another."""
+        if not self.in_use and not self.num_waiting:
+            self.flows.clear()
+            self.virtual_time = 0.0
+            return
+        idle = [
+            game_id
+            for game_id, flow in self.flows.items()
+            if not flow.waiters and flow.finish <= self.virtual_time
+        ]
+        for game_id in idle:
+            del self.flows[game_id]
+
+    def update_gauges(self) -> None:
+        metrics.set_gauge("llm_calls_in_use", self.in_use)
+        metrics.set_gauge("llm_calls_waiting", self.num_waiting)
@@ -0,0 +1,195 @@
+"""Matchmaking for games with several humans.
+
+Waiting humans are queued by game type and player count. A game forms as soon as a
+queue has enough humans to fill its human seats, or once the longest waiting human in
+a queue has waited max_wait_s. Then whoever is waiting plays, and AIs fill the rest.
+
+Each queue is a heap ordered by join time, with an index from user to ticket, so
+joining, leaving and matching are O(log n) with thousands of users waiting. Leaving
+only marks the ticket, and it's dropped once it reaches the top of its heap.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from metrics import metrics
+from websocket_management import UserLogin
+
+QueueKey = Tuple[str, int]
+
+
+@dataclass
+class LobbySettings:
+    max_wait_s: float = 30.0
+    # Human seats per game, capped at the game's player count. AIs fill the rest
+    max_humans: int = 4
+
+
+@dataclass
+class Ticket:
+    login: UserLogin
+    game_type: str
+    num_players: int
+    joined_at: float
+    seq: int
+    # Left the lobby or was matched, so skipped when it reaches the top of a heap
+    done: bool = False
+
+    @property
+    def user_id(self) -> str:
+        return self.login.user_id
+
+    @property
+    def key(self) -> QueueKey:
+        return self.game_type, self.num_players
+
+
+@dataclass
+class Match:
+    game_type: str
+    num_players: int
+    logins: List[UserLogin]
+    # How long each human waited, in the same order
+    waits: List[float] = field(default_factory=list)
+
+
+class MatchQueue:
+    def __init__(self):
+        self.heap: List[Tuple[float, int, Ticket]] = []
+        self.size = 0
+
+    def push(self, ticket: Ticket) -> None:
+        heapq.heappush(self.heap, (ticket.joined_at, ticket.seq, ticket))
+        self.size += 1
+
+    def oldest(self) -> Optional[Ticket]:
+        while self.heap and self.heap[0][2].done:
+            heapq.heappop(self.heap)
+        return self.heap[0][2] if self.heap else None
+
+    def discard(self) -> None:
+        """A ticket in the queue was marked done."""
+        self.size -= 1
+        if len(self.heap) > 2 * self.size + 64:
+            # Mostly tickets that left, rebuild rather than let them pile up
+            self.heap = [entry for entry in self.heap if not entry[2].done]
+            heapq.heapify(self.heap)
+
+    def pop(self) -> Ticket:
+        ticket = self.oldest()
+        heapq.heappop(self.heap)
+        ticket.done = True
+        self.size -= 1
+        return ticket
+
+
+class Lobby:
+    def __init__(
+        self,
+        settings: LobbySettings = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.settings = settings or LobbySettings()
+        self.clock = clock
+        self.queues: Dict[QueueKey, MatchQueue] = {}
+        self.tickets: Dict[str, Ticket] = {}
+        # (deadline, seq, ticket) across all queues, for the next max wait to expire
+        self.deadlines: List[Tuple[float, int, Ticket]] = []
+        self.ready: Deque[Match] = deque()
+        self.seq = itertools.count()
+        self.wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def num_waiting(self) -> int:
+        return len(self.tickets)
+
+    def humans_per_game(self, num_players: int) -> int:
+        return max(1, min(self.settings.max_humans, num_players))
+
+    def join(self, login: UserLogin, game_type: str, num_players: int) -> Ticket:
+        """Queues a user, replacing any place they already had."""
+        self.leave(login.user_id)
+        ticket = Ticket(login, game_type, num_players, self.clock(), next(self.seq))
+        self.tickets[ticket.user_id] = ticket
+        queue = self.queues.setdefault(ticket.key, MatchQueue())
+        queue.push(ticket)
+        heapq.heappush(
+            self.deadlines,
+            (ticket.joined_at + self.settings.max_wait_s, ticket.seq, ticket),
+        )
+        if queue.size >= self.humans_per_game(num_players):
+            self.ready.append(self.form_match(ticket.key))
+        metrics.set_gauge("lobby_waiting", self.num_waiting)
+        self.wake()
+        return ticket
+
+    def leave(self, user_id: str) -> bool:
+        ticket = self.tickets.pop(user_id, None)
+        if ticket is None:
+            return False
+        ticket.done = True
+        self.queues[ticket.key].discard()
+        metrics.set_gauge("lobby_waiting", self.num_waiting)
+        return True
+
+    def form_match(self, key: QueueKey) -> Match:
+        """A match from the oldest humans waiting in a queue."""
+        game_type, num_players = key
+        queue = self.queues[key]
+        now = self.clock()
+        match = Match(game_type, num_players, [])
+        for _ in range(min(queue.size, self.humans_per_game(num_players))):
+            ticket = queue.pop()
+            del self.tickets[ticket.user_id]
+            match.logins.append(ticket.login)
+            match.waits.append(now - ticket.joined_at)
+            metrics.observe("matchmaking_wait_s", now - ticket.joined_at)
+        if not queue.size:
+            del self.queues[key]
+        metrics.increment("lobby_matches")
+        metrics.increment("lobby_ai_seats", num_players - len(match.logins))
+        metrics.set_gauge("lobby_waiting", self.num_waiting)
+        return match
+
+    def poll(self) -> List[Match]:
+        """Matches that are ready, including ones formed because a wait ran out."""
+        now = self.clock()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, _, ticket = heapq.heappop(self.deadlines)
+            if not ticket.done:
+                self.ready.append(self.form_match(ticket.key))
+        matches = list(self.ready)
+        self.ready.clear()
+        return matches
+
+    def next_deadline(self) -> Optional[float]:
+        while self.deadlines and self.deadlines[0][2].done:
+            heapq.heappop(self.deadlines)
+        return self.deadlines[0][0] if self.deadlines else None
+
+    def wake(self) -> None:
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def run(self, start_match: Callable[[Match], Awaitable[None]]) -> None:
+        """Starts matches as they form, until cancelled."""
+        self.wakeup = asyncio.Event()
+        while True:
+            for match in self.poll():
+                try:
+                    await start_match(match)
+                except Exception:
+                    logger.exception(f"Failed to start {match.game_type} match")
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock())
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
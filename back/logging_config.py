@@ -0,0 +1,81 @@
+"""Log setup, and sampling for messages on the game's hot paths.
+
+LOG_LEVEL sets the level for everything, and LOG_LEVELS overrides it per module,
+eg "player=WARNING,websocket_management=INFO". Verbose categories are sampled, with
+LOG_SAMPLE_RATES setting the fraction kept, eg "events=0.01,prompts=0.5". LOG_JSON
+writes app.log as one JSON object per line.
+
+Messages on hot paths take their values as format arguments rather than f-strings,
+so nothing is formatted for a message that isn't kept, and log events by type
+rather than their full repr.
+"""
+import itertools
+import os
+import sys
+from typing import Dict
+
+from loguru import logger
+
+# Every event sent to a web player, every prompt, every input received
+DEFAULT_SAMPLE_RATES = {"events": 0.05, "prompts": 0.2, "input": 0.2}
+
+
+def parse_settings(text: str) -> Dict[str, str]:
+    """Parses "a=1,b=2" into {"a": "1", "b": "2"}."""
+    settings = {}
+    for item in text.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            settings[name.strip()] = value.strip()
+    return settings
+
+
+def module_levels() -> Dict[str, str]:
+    levels = {"": os.getenv("LOG_LEVEL", "DEBUG").upper()}
+    for module, level in parse_settings(os.getenv("LOG_LEVELS", "")).items():
+        levels[module] = level.upper()
+    return levels
+
+
+sample_rates: Dict[str, float] = {
+    **DEFAULT_SAMPLE_RATES,
+    **{
+        category: float(rate)
+        for category, rate in parse_settings(os.getenv("LOG_SAMPLE_RATES", "")).items()
+    },
+}
+_sample_counters: Dict[str, "itertools.count[int]"] = {}
+
+
+def should_sample(category: str) -> bool:
+    """Keeps every nth message of a category. Counting rather than random, so it
+    doesn't need a random number and keeps a steady trickle."""
+    rate = sample_rates.get(category, 1.0)
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    count = next(_sample_counters.setdefault(category, itertools.count()))
+    return count % round(1 / rate) == 0
+
+
+def log_sampled(category: str, level: str, message: str, *args, **kwargs) -> None:
+    """Logs a message from a verbose category if it's sampled. The message is only
+    formatted if it's kept, and is attributed to the caller's module."""
+    if should_sample(category):
+        logger.opt(depth=1).bind(category=category).log(level, message, *args, **kwargs)
+
+
+def configure_logging(log_file: str = "app.log") -> None:
+    levels = module_levels()
+    logger.remove()
+    logger.add(sys.stderr, level=0, filter=levels)
+    # enqueue writes the file from a background thread
+    logger.add(
+        log_file,
+        rotation="500 MB",
+        level=0,
+        filter=levels,
+        enqueue=True,
+        serialize=os.getenv("LOG_JSON", "false").lower() == "true",
+    )
@@ -1,11 +1,20 @@
-from aiohttp.web_response import BaseClass
-from pydantic import BaseModel
-from typing import Optional, List, Literal
+from pydantic import BaseModel, PrivateAttr
+from typing import Optional, List, Literal, Dict
 
 
 class BaseEvent(BaseModel):
     type: str
 
+    # Cached wire encoding, see serialization.encode_event
+    _encoded: Optional[str] = PrivateAttr(default=None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            # Changed after being sent, so encode it again next time. Mutating a
+            # field in place, like appending to a list, isn't noticed
+            self.__pydantic_private__["_encoded"] = None
+
 
 from datetime import datetime
 from pydantic import Field
@@ -63,6 +72,8 @@ class PromptMessage(BaseMessage):
     multiple: bool = False
     min_choices: int = 1
     max_choices: Optional[int] = None
+    # Echoed back in the answer, see WebSocketManager.receive_input
+    promptId: Optional[str] = None
 
     @property
     def text(self):
@@ -86,6 +97,14 @@ class PlayerActionMessage(BaseMessage):
     player: str
     action: str
     message: Optional[str] = None
+    # The prompt this answers
+    promptId: Optional[str] = None
+
+
+class VoteResultsMessage(BaseMessage):
+    type: Literal["vote_results"] = "vote_results"
+    votes: Dict[str, Optional[str]]  # Voter name to voted player name, None if abstained
+    executed: List[str]
 
 
 class ObservationMessage(BaseMessage):
@@ -0,0 +1,62 @@
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+# How many recent samples to keep per timing for percentiles
+TIMING_WINDOW = 1000
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Metrics:
+    """In-process counters, gauges and timings, exposed as JSON on /metrics."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=TIMING_WINDOW)
+        )
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        self.counters[name] += amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def adjust_gauge(self, name: str, delta: float) -> None:
+        self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    def snapshot(self) -> dict:
+        uptime = time.time() - self.start_time
+        timings = {}
+        for name, values in self.timings.items():
+            sorted_values = sorted(values)
+            timings[name] = {
+                "count": len(sorted_values),
+                "p50": percentile(sorted_values, 0.5),
+                "p95": percentile(sorted_values, 0.95),
+                "p99": percentile(sorted_values, 0.99),
+                "max": sorted_values[-1] if sorted_values else 0.0,
+            }
+        return {
+            "uptime_s": uptime,
+            "counters": dict(self.counters),
+            "rates_per_min": {
+                name: value / uptime * 60 for name, value in self.counters.items()
+            },
+            "gauges": dict(self.gauges),
+            "timings": timings,
+        }
+
+
+metrics = Metrics()
@@ -1,13 +1,45 @@
+import copy
 import json
+from collections import defaultdict, deque
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Deque, Dict, Tuple
 
-from player import AIPlayer
+from metrics import percentile
+from persistence import persistence_writer
+
+if TYPE_CHECKING:
+    from player import AIPlayer
+
+
+# How many recent requests per model the rolling request stats cover
+REQUEST_WINDOW = 200
+
+
+@dataclass
+class RequestStats:
+    samples: int = 0
+    p50_latency_s: float = 0.0
+    p95_latency_s: float = 0.0
+    error_rate: float = 0.0
+    avg_cost: float = 0.0
 
 
 class ModelPerformanceTracker:
     def __init__(self):
         self.performance_file = Path("model_performance.json")
-        self.performance_data = self.load_performance_data()
+        self._performance_data = None
+        # Recent (latency_s, cost, error) per model. Kept in memory only, for routing
+        self.requests: Dict[str, Deque[Tuple[float, float, bool]]] = defaultdict(
+            lambda: deque(maxlen=REQUEST_WINDOW)
+        )
+
+    @property
+    def performance_data(self) -> dict:
+        # Loaded on first use rather than at import time
+        if self._performance_data is None:
+            self._performance_data = self.load_performance_data()
+        return self._performance_data
 
     def load_performance_data(self):
         if self.performance_file.exists():
@@ -31,9 +63,33 @@ class ModelPerformanceTracker:
             self.performance_data[player.model]["games_won"] += 1
             self.performance_data[player.name]["games_won"] += 1
 
+    def record_request(
+        self, model: str, latency_s: float, cost: float = 0.0, error: bool = False
+    ):
+        self.requests[model].append((latency_s, cost, error))
+
+    def request_stats(self, model: str) -> RequestStats:
+        requests = self.requests.get(model)
+        if not requests:
+            return RequestStats()
+        latencies = sorted(latency for latency, _, error in requests if not error)
+        return RequestStats(
+            samples=len(requests),
+            p50_latency_s=percentile(latencies, 0.5),
+            p95_latency_s=percentile(latencies, 0.95),
+            error_rate=sum(error for _, _, error in requests) / len(requests),
+            avg_cost=sum(cost for _, cost, _ in requests) / len(requests),
+        )
+
     def save_performance_data(self):
-        with open(self.performance_file, "w") as f:
-            json.dump(self.performance_data, f, indent=2)
+        write_json(self.performance_file, self.performance_data)
+
+    async def save_in_background(self):
+        """Saves a snapshot of the data on the persistence writer thread."""
+        path, data = self.performance_file, copy.deepcopy(self.performance_data)
+        await persistence_writer.submit(
+            lambda: write_json(path, data), key=f"performance:{path}"
+        )
 
     def get_performance_summary(self):
         summary = []
@@ -43,4 +99,9 @@ class ModelPerformanceTracker:
             summary.append(f"{model}: Win Rate: {win_rate:.2%}, Avg Cost: ${avg_cost:.4f}, Games Played: {data['games_played']}")
         return "\n".join(summary)
 
+def write_json(path: Path, data: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
 performance_tracker = ModelPerformanceTracker()
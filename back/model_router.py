@@ -0,0 +1,242 @@
+"""Chooses a model for each AI player, and runs their requests with failover and hedging.
+
+Routing uses the rolling request stats in model_performance. A model fits if its p95
+latency, average cost per request and error rate are within the router's targets.
+Models without enough requests yet are assumed to fit, so new models get tried.
+
+Each model and each provider has a circuit breaker. Models whose breaker is open are
+skipped without sending anything, see circuit_breaker.
+
+A request that fails is sent straight to the next best model. A request that is still
+running after its model's p95 latency gets a second, hedged request to the next best
+model, and whichever answers first is used.
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from ai_models import fallback_models, models
+from circuit_breaker import CircuitBreaker
+from metrics import metrics
+from model_performance import ModelPerformanceTracker, performance_tracker
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    cost: float = 0.0
+    tokens: int = 0
+
+
+class ModelUnavailable(Exception):
+    """Every model tried failed, or had its breaker open."""
+
+
+# Sends one request to the given model, raising if it fails
+Send = Callable[[str], Awaitable[Completion]]
+
+
+@dataclass
+class RouterSettings:
+    latency_target_s: float = 20.0
+    cost_target: float = 0.02
+    max_error_rate: float = 0.2
+    # Stats are only trusted once a model has this many recent requests
+    min_samples: int = 10
+    hedge: bool = True
+    # Hedge after the model's p95 latency, but never sooner than this
+    min_hedge_delay_s: float = 2.0
+    # Hedge delay for models without enough requests yet
+    default_hedge_delay_s: float = 15.0
+    request_timeout_s: float = 60.0
+    # Requests sent per prompt, including hedges and failovers
+    max_attempts: int = 3
+    # Consecutive failures before a model's breaker opens. A provider's breaker
+    # counts failures across all its models, so needs more
+    model_failure_threshold: int = 3
+    provider_failure_threshold: int = 8
+    breaker_reset_timeout_s: float = 30.0
+
+
+def provider_of(model: str) -> str:
+    """The litellm provider prefix, eg openrouter for openrouter/openai/gpt-4o."""
+    return model.split("/", 1)[0]
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        tracker: ModelPerformanceTracker,
+        models: Sequence[str],
+        fallback_models: Sequence[str] = (),
+        settings: Optional[RouterSettings] = None,
+    ):
+        self.tracker = tracker
+        self.models = list(models)
+        self.fallback_models = [m for m in fallback_models if m not in self.models]
+        self.settings = settings or RouterSettings()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, name: str, failure_threshold: int) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(
+                name, failure_threshold, self.settings.breaker_reset_timeout_s
+            )
+        return self.breakers[name]
+
+    def breakers_for(self, model: str) -> Tuple[CircuitBreaker, CircuitBreaker]:
+        return (
+            self.breaker(model, self.settings.model_failure_threshold),
+            self.breaker(
+                f"provider:{provider_of(model)}",
+                self.settings.provider_failure_threshold,
+            ),
+        )
+
+    def available(self, model: str) -> bool:
+        return all(breaker.available() for breaker in self.breakers_for(model))
+
+    def overshoot(self, model: str) -> float:
+        """How far a model is over the targets, 0 if it fits."""
+        stats = self.tracker.request_stats(model)
+        if stats.samples < self.settings.min_samples:
+            return 0.0
+        return (
+            max(0.0, stats.p95_latency_s / self.settings.latency_target_s - 1)
+            + max(0.0, stats.avg_cost / self.settings.cost_target - 1)
+            + max(0.0, stats.error_rate - self.settings.max_error_rate) * 10
+        )
+
+    def choose_model(self, rng: random.Random = random) -> str:
+        """A random available model among those that fit, or the closest to fitting
+        if none do. Draws exactly one number from rng, so seeded games stay
+        reproducible."""
+        available = [model for model in self.models if self.available(model)]
+        eligible = [model for model in available if self.overshoot(model) == 0]
+        if not eligible:
+            eligible = [min(available or self.models, key=self.overshoot)]
+        return eligible[int(rng.random() * len(eligible))]
+
+    def ranked_models(self) -> List[str]:
+        """Every model, including fallbacks, best first. Models known to fit come
+        before ones without enough requests to tell."""
+
+        def rank(model: str) -> Tuple[float, bool, float]:
+            stats = self.tracker.request_stats(model)
+            untried = stats.samples < self.settings.min_samples
+            return self.overshoot(model), untried, stats.p50_latency_s
+
+        return sorted(self.models + self.fallback_models, key=rank)
+
+    def hedge_delay(self, model: str) -> float:
+        stats = self.tracker.request_stats(model)
+        if stats.samples < self.settings.min_samples:
+            return self.settings.default_hedge_delay_s
+        return max(self.settings.min_hedge_delay_s, stats.p95_latency_s)
+
+    async def complete(self, model: str, send: Send) -> Completion:
+        """Sends a request to model, hedging and failing over to other models.
+        Raises ModelUnavailable if no model answered."""
+        settings = self.settings
+        # The first model goes again last, so there's something to hedge or retry
+        # with when every other model is unavailable
+        candidates = iter(
+            [model] + [m for m in self.ranked_models() if m != model] + [model]
+        )
+        running: Dict[asyncio.Future, Tuple[str, float]] = {}
+        attempts = 0
+
+        def launch() -> bool:
+            nonlocal attempts
+            if attempts >= settings.max_attempts:
+                return False
+            for candidate in candidates:
+                if self.available(candidate):
+                    break
+                # Skipped rather than waiting for it to fail again
+                metrics.increment("llm_breaker_skips")
+                metrics.increment(
+                    "llm_breaker_time_saved_s",
+                    max(b.failure_latency_s for b in self.breakers_for(candidate)),
+                )
+            else:
+                return False
+            attempts += 1
+            for breaker in self.breakers_for(candidate):
+                breaker.on_request()
+            task = asyncio.ensure_future(
+                asyncio.wait_for(send(candidate), settings.request_timeout_s)
+            )
+            running[task] = (candidate, time.perf_counter())
+            return True
+
+        if not launch():
+            metrics.increment("llm_unavailable")
+            raise ModelUnavailable("No model available")
+        hedged = not settings.hedge
+        last_error: Optional[BaseException] = None
+        answered = False
+        try:
+            while running:
+                timeout = None
+                if not hedged:
+                    first_model, started = next(iter(running.values()))
+                    timeout = max(
+                        0.0,
+                        started + self.hedge_delay(first_model) - time.perf_counter(),
+                    )
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    if launch():
+                        metrics.increment("llm_hedges")
+                    continue
+
+                for task in done:
+                    candidate, started = running.pop(task)
+                    latency = time.perf_counter() - started
+                    try:
+                        completion = task.result()
+                    except Exception as e:
+                        last_error = e
+                        self.tracker.record_request(candidate, latency, error=True)
+                        for breaker in self.breakers_for(candidate):
+                            breaker.on_failure(latency)
+                        metrics.increment("llm_errors")
+                        logger.warning(f"Request to {candidate} failed: {e!r}")
+                        continue
+                    self.tracker.record_request(candidate, latency, completion.cost)
+                    for breaker in self.breakers_for(candidate):
+                        breaker.on_success()
+                    metrics.observe("llm_latency_s", latency)
+                    if hedged and candidate != model:
+                        metrics.increment("llm_hedge_wins")
+                    answered = True
+                    return completion
+
+                if not running and launch():
+                    metrics.increment("llm_failovers")
+        finally:
+            for task, (candidate, started) in running.items():
+                task.cancel()
+                for breaker in self.breakers_for(candidate):
+                    breaker.on_cancel()
+                if answered:
+                    # The slower request took at least this long, which keeps the
+                    # slow model's p95 honest even though it never finishes
+                    self.tracker.record_request(
+                        candidate, time.perf_counter() - started
+                    )
+
+        metrics.increment("llm_unavailable")
+        raise ModelUnavailable(f"No model answered, last error: {last_error!r}")
+
+
+model_router = ModelRouter(performance_tracker, models, fallback_models)
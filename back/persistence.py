@@ -0,0 +1,116 @@
+"""Write-behind disk writes, so games never do file I/O on the event loop.
+
+Writes are queued as callables and run in batches on a single writer thread. Writes
+with the same key replace each other if they're still queued, so saving a snapshot
+that changes often only writes the latest one. When the queue is full, submit waits
+without blocking the event loop until there's room.
+"""
+import asyncio
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from loguru import logger
+
+from metrics import metrics
+
+Write = Callable[[], Any]
+# (key, write, loop, future) or None to stop the writer
+Job = Optional[Tuple[Optional[str], Write, asyncio.AbstractEventLoop, asyncio.Future]]
+
+
+class PersistenceWriter:
+    def __init__(self, max_queued: int = 256, max_batch: int = 64):
+        self.queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_queued)
+        self.max_batch = max_batch
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name="persistence-writer", daemon=True
+                )
+                self.thread.start()
+
+    async def submit(self, write: Write, key: Optional[str] = None) -> asyncio.Future:
+        """Queues write to run on the writer thread. Returns a future for its result,
+        which callers can await if they need the write to have happened."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        job = (key, write, loop, loop.create_future())
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            metrics.increment("persistence_backpressure_waits")
+            await asyncio.to_thread(self.queue.put, job)
+        metrics.set_gauge("persistence_queue_depth", self.queue.qsize())
+        return job[3]
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write_batch([job for job in batch if job is not None])
+            for _ in batch:
+                self.queue.task_done()
+            if None in batch:
+                return
+
+    def write_batch(self, batch: List[Job]) -> None:
+        started = time.perf_counter()
+        latest = {key: i for i, (key, _, _, _) in enumerate(batch) if key is not None}
+        results = {}
+        for i, (key, write, _, _) in enumerate(batch):
+            if key is not None and latest[key] != i:
+                continue
+            try:
+                results[i] = (write(), None)
+            except Exception as e:
+                logger.exception(f"Persistence write {key or write} failed")
+                metrics.increment("persistence_errors")
+                results[i] = (None, e)
+        metrics.increment("persistence_writes", len(results))
+        metrics.increment("persistence_coalesced", len(batch) - len(results))
+        metrics.observe("persistence_batch_s", time.perf_counter() - started)
+
+        for i, (key, _, loop, future) in enumerate(batch):
+            # A replaced write is done once the write that replaced it is
+            result, error = results[latest[key] if key is not None else i]
+            try:
+                loop.call_soon_threadsafe(resolve, future, result, error)
+            except RuntimeError:
+                pass  # The loop closed, nobody is waiting
+
+    def flush(self) -> None:
+        """Blocks until every queued write has run."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self) -> None:
+        """Runs the queued writes and stops the writer thread."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+def resolve(future: asyncio.Future, result, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+        # Already logged by the writer, don't warn again if nobody awaits it
+        future.exception()
+    else:
+        future.set_result(result)
+
+
+persistence_writer = PersistenceWriter()
+atexit.register(persistence_writer.close)
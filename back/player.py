@@ -1,5 +1,5 @@
 import asyncio
-import random
+import functools
 from typing import Optional, TYPE_CHECKING, Tuple, Union
 
 from loguru import logger
@@ -14,10 +14,12 @@ from message_types import (
     PromptChoice,
 )
 from typing import List
-from core import Prompt
-from roles import Role
-
-from aioconsole import ainput
+from admission import admission_control
+from core import GenerationLimits, Prompt, apply_limits
+from logging_config import log_sampled
+from model_router import Completion, ModelUnavailable, model_router
+from replay import summarize_request
+from roles import ChoiceRequest, Role
 
 from websocket_management import UserLogin
 
@@ -56,7 +58,8 @@ class Player:
             return action_result
         return None
 
-    async def speak(self, chat=False) -> str:
+    async def speak(self, chat=False) -> Optional[str]:
+        """What the player says, or None if they have nothing to say."""
         raise NotImplementedError
 
     async def vote(self, players: List["Player"]) -> "Player":
@@ -80,17 +83,21 @@ class Player:
         min_choices=1,
         max_choices=None,
     ) -> List[int]:
-        prompt_message = self.make_choice_prompt(
-            prompt=prompt,
-            choices=choices,
-            choose_multiple=choose_multiple,
-            min_choices=min_choices,
-            max_choices=max_choices,
+        request = ChoiceRequest(
+            prompt, choices, choose_multiple, min_choices, max_choices
         )
-        response = await self.prompt_with(prompt_message, should_think=True)
+        prefetched = self.take_prefetched(request)
+        if prefetched is not None:
+            response = await prefetched
+        else:
+            response = await self.prompt_with(
+                self.make_choice_prompt(*request), should_think=True
+            )
 
         valid_choices = [choice.index for choice in choices]
         try:
+            if response is None:
+                raise ValueError("No response")
             formatted_answer = response.split("{")[-1]
             words = (
                 formatted_answer.replace(",", " ")
@@ -114,9 +121,9 @@ class Player:
         except (ValueError, AttributeError) as e:
             logger.warning(e)
             # If no valid choice was made, pick random valid choices
-            random_choice_numbers = random.sample(valid_choices, min_choices)
+            random_choice_numbers = self.game.rng.sample(valid_choices, min_choices)
             random_choice_names = [
-                choice[1] for choice in choices if choice[0] in random_choice_numbers
+                choice.name for choice in choices if choice.index in random_choice_numbers
             ]
             await self.observe(
                 BaseMessage(
@@ -142,6 +149,10 @@ class Player:
             max_choices=max_choices,
         )
 
+    def take_prefetched(self, request: ChoiceRequest) -> Optional["asyncio.Future"]:
+        """The response to a choice that was started ahead of time, if any."""
+        return None
+
     async def prompt_with(
         self, prompt: Union[str, PromptMessage], should_think=False
     ) -> str:
@@ -150,6 +161,14 @@ class Player:
     async def observe(self, event: BaseEvent):
         self.observations.append(event)
 
+    def record(self, kind: str, **data) -> None:
+        """Adds an entry about this player to the game's replay."""
+        self.game.record(kind, player=self.name, **data)
+
+    def replay_info(self) -> dict:
+        """What's needed to seat an equivalent player when replaying the game."""
+        return {"name": self.name, "type": "human"}
+
     def __str__(self):
         return self.name
 
@@ -185,11 +204,15 @@ class LocalHumanPlayer(HumanPlayer):
     async def prompt_with(
         self, prompt: Union[str, PromptMessage], should_think=False, params: dict = None
     ) -> str:
+        from aioconsole import ainput
+
         if isinstance(prompt, PromptMessage):
             prompt_text = prompt.text
         else:
             prompt_text = prompt
-        return await ainput(prompt_text)
+        response = await ainput(prompt_text)
+        self.record("input", prompt=prompt_text, response=response)
+        return response
 
     async def print(self, event: BaseEvent):
         if isinstance(event, BaseMessage):
@@ -202,8 +225,8 @@ from websocket_management import websocket_manager
 
 
 class WebHumanPlayer(HumanPlayer):
-    def __init__(self, game, login: UserLogin):
-        super().__init__(game, login.name)
+    def __init__(self, game, login: UserLogin, name: str = None):
+        super().__init__(game, name or login.name)
         self.login = login
         self.user_id = login.user_id
         self.last_activity = time.time()
@@ -218,11 +241,15 @@ class WebHumanPlayer(HumanPlayer):
             prompt_text = prompt
             prompt_event = PromptMessage(message=prompt, username="System")
 
-        logger.info(f"prompting {self.login.name} with {prompt_text[:20]}")
-        return await websocket_manager.get_input(self.user_id, prompt_event)
+        log_sampled(
+            "prompts", "INFO", "Prompting {} ({} chars)", self.login.name, len(prompt_text)
+        )
+        response = await websocket_manager.get_input(self.user_id, prompt_event)
+        self.record("input", prompt=prompt_text, response=response)
+        return response
 
     async def print(self, event: BaseEvent):
-        logger.info(f"informing {self.login.name} with {event}")
+        log_sampled("events", "INFO", "Sending {} to {}", event.type, self.login.name)
         await websocket_manager.send_personal_message(event, self.user_id)
 
     def update_activity(self):
@@ -237,6 +264,12 @@ class WebHumanPlayer(HumanPlayer):
 
 
 def get_rules(roles: List[Role]) -> str:
+    return _rules_text(tuple(roles))
+
+
+@functools.lru_cache(maxsize=64)
+def _rules_text(roles: Tuple[Role, ...]) -> str:
+    # Every prompt starts with the rules, so this is built once per role pool
     rules = "Rules:\n"
     rules += "You and each other player, has a secret role with an ability and objective. Most players need to identify and vote for a werewolf, while werewolves need to look like innocents."
     rules += "You see your role at the start of the game, but that role may be changed during the night phase. Three more unused roles are in the center.\n\n"
@@ -262,6 +295,48 @@ def get_rules(roles: List[Role]) -> str:
 from typing import Optional
 import os
 
+# Answers from the examples in the prompts. A model repeating one while thinking hasn't
+# answered yet.
+EXAMPLE_ANSWERS = {"this is my message.", "1, bob", "1 3, bob clyde"}
+
+
+def final_answer(text: str) -> Optional[str]:
+    """What's in the {} block text ends with, if it ends with one."""
+    if not text.rstrip().endswith("}"):
+        return None
+    before, bracket, answer = text.rstrip()[:-1].rpartition("{")
+    if not bracket:
+        return None
+    answer = answer.strip()
+    if not answer or answer.lower() in EXAMPLE_ANSWERS:
+        return None
+    return answer
+
+
+def ends_with_message(text: str) -> bool:
+    return final_answer(text) is not None
+
+
+def ends_with_choice(text: str) -> bool:
+    answer = final_answer(text)
+    return answer is not None and any(character.isdigit() for character in answer)
+
+
+# Speech and choices end with their answer block, so generation stops there. The rules
+# check's reasoning often repeats '{No errors found}' before reaching its verdict, so
+# it only gets a budget. The budgets leave room for the thinking that comes first,
+# running out before the answer loses the whole response.
+GENERATION_LIMITS = {
+    "speech": GenerationLimits(
+        name="speech", max_tokens=1000, is_complete=ends_with_message
+    ),
+    "choice": GenerationLimits(
+        name="choice", max_tokens=800, is_complete=ends_with_choice
+    ),
+    "rules_check": GenerationLimits(name="rules_check", max_tokens=1000),
+    "chat": GenerationLimits(name="chat", max_tokens=250),
+}
+
 
 class AIPlayer(Player):
     def __init__(
@@ -278,6 +353,7 @@ class AIPlayer(Player):
         self.personality = personality
 
         self.total_cost = 0
+        self.total_tokens = 0
         self.games_played = 0
         self.games_won = 0
 
@@ -289,9 +365,18 @@ class AIPlayer(Player):
                 
                 Then answer the following question in the correct {} format:\n"""
 
+        # A choice being answered ahead of time, see prefetch_choice
+        self.prefetched: Optional[Tuple[ChoiceRequest, asyncio.Task]] = None
+
         self.use_mock_api = os.environ.get("USE_MOCK_API", "false").lower() == "true"
+        # Simulated seconds per mock completion, for measuring latency locally
+        self.mock_api_latency = float(os.environ.get("MOCK_API_LATENCY", "0"))
+        # Plus simulated seconds per generated token
+        self.mock_api_token_latency = float(
+            os.environ.get("MOCK_API_TOKEN_LATENCY", "0")
+        )
 
-    async def speak(self, chat=False) -> str:
+    async def speak(self, chat=False) -> Optional[str]:
         prompt = ""
         if self.personality:
             prompt += f"\nYour personality is: {self.personality} Don't over do it, focus on the game.\n"
@@ -299,13 +384,21 @@ class AIPlayer(Player):
         if chat:
             prompt += "What would you like to say to the other players? This is just post game chat, there's no more need to hide or be deceptive."
             response = await self.prompt_with(
-                prompt, should_think=False, should_rules_check=False
+                prompt,
+                should_think=False,
+                should_rules_check=False,
+                limits=GENERATION_LIMITS["chat"],
             )
         else:
             prompt += "What would you like to say to the other players? After thinking, enter your message between curly brackets like {This is my message.} Focus on showing reasoning to be convincing, usually 1-3 sentences. Be intentional about what you share - don't self incriminate. Try to *accomplish* something with your message, don't pass or be scared of risk. Players expect you to tell your role and observations, and you will look suspicious if you don't. If you say you're a role, they'll expect you to have the information that role would have. If you say you have information, they will expect your role to back it up. Don't say you have a hunch or feeling, make solid claims."
             response = await self.prompt_with(
-                prompt, should_think=True, should_rules_check=True
+                prompt,
+                should_think=True,
+                should_rules_check=True,
+                limits=GENERATION_LIMITS["speech"],
             )
+        if response is None:
+            return None
         message_to_broadcast = response.split("{")[-1]
         message_to_broadcast = message_to_broadcast.replace("}", "")
         return f"{message_to_broadcast}"
@@ -315,8 +408,13 @@ class AIPlayer(Player):
         prompt: Union[str, PromptMessage],
         should_think=False,
         should_rules_check=False,
-    ) -> str:
-        litellm_prompt = Prompt().add_message(
+        limits: GenerationLimits = None,
+    ) -> Optional[str]:
+        """The model's response, or None if no model could answer."""
+        if limits is None:
+            is_choice = isinstance(prompt, PromptMessage) and prompt.choices
+            limits = GENERATION_LIMITS["choice" if is_choice else "speech"]
+        litellm_prompt = Prompt(limits).add_message(
             f"You're playing a social deduction game. Your name is {self.name}",
             role="system",
         )
@@ -352,6 +450,8 @@ class AIPlayer(Player):
 
         litellm_prompt = litellm_prompt.add_message(prompt_text, role="system")
         response = await self.prompt_model(litellm_prompt)
+        if response is None:
+            return None
 
         await self.observe(
             BaseMessage(
@@ -368,7 +468,10 @@ class AIPlayer(Player):
                     + prompt_text
                 )
                 response = await self.prompt_with(
-                    prompt=new_prompt, should_think=True, should_rules_check=False
+                    prompt=new_prompt,
+                    should_think=True,
+                    should_rules_check=False,
+                    limits=limits,
                 )
 
         return response
@@ -391,9 +494,14 @@ class AIPlayer(Player):
         """
 
         response = await self.prompt_model(
-            litellm_prompt=Prompt().add_message(prompt, role="system")
+            litellm_prompt=Prompt(GENERATION_LIMITS["rules_check"]).add_message(
+                prompt, role="system"
+            )
         )
 
+        if response is None:
+            # Not a rules error, there's just no genie to ask
+            return False
         error_found = "no errors found" not in response.lower()
 
         if error_found:
@@ -409,18 +517,106 @@ class AIPlayer(Player):
             )
         return error_found
 
-    async def prompt_model(self, litellm_prompt: Prompt):
+    def prefetch_choice(self, request: ChoiceRequest) -> asyncio.Task:
+        """Starts answering a choice before it's asked, so the LLM call overlaps
+        with other work. Only the response is fetched, it's parsed when the choice
+        is asked, so random fallbacks draw from the game's rng in the usual order."""
+        self.cancel_prefetch()
+        task = asyncio.ensure_future(
+            self.prompt_with(self.make_choice_prompt(*request), should_think=True)
+        )
+        self.prefetched = (request, task)
+        return task
+
+    def take_prefetched(self, request: ChoiceRequest) -> Optional[asyncio.Task]:
+        if self.prefetched is None or self.prefetched[0] != request:
+            return None
+        task = self.prefetched[1]
+        self.prefetched = None
+        return task
+
+    def cancel_prefetch(self) -> None:
+        if self.prefetched is not None:
+            self.prefetched[1].cancel()
+            self.prefetched = None
+
+    def replay_info(self) -> dict:
+        return {
+            "name": self.name,
+            "type": "ai",
+            "model": self.model,
+            "personality": self.personality,
+        }
+
+    async def prompt_model(self, litellm_prompt: Prompt) -> Optional[str]:
+        """The model's response, or None if no model could answer."""
+        start_time = time.time()
+        async def make_call():
+            async with admission_control.llm_calls.hold(
+                self.game.id, interactive=self.game.has_human
+            ):
+                return await model_router.complete(
+                    self.model, lambda model: self.send_prompt(litellm_prompt, model)
+                )
+
+        supervisor = self.game.supervisor
+        try:
+            if supervisor is None:
+                completion = await make_call()
+            else:
+                completion = await supervisor.llm_call(make_call)
+        except ModelUnavailable as e:
+            logger.warning(f"{self.name} got no response: {e}")
+            # Recorded, so replays take the same path
+            self.record(
+                "llm",
+                model=self.model,
+                request=summarize_request(litellm_prompt.messages),
+                response=None,
+                latency_s=round(time.time() - start_time, 3),
+                cost=0.0,
+            )
+            return None
+        self.total_cost += completion.cost
+        self.total_tokens += completion.tokens
+        litellm_prompt.total_cost += completion.cost
+        litellm_prompt.total_tokens += completion.tokens
+
+        self.record(
+            "llm",
+            model=completion.model,
+            request=summarize_request(litellm_prompt.messages),
+            response=completion.text,
+            latency_s=round(time.time() - start_time, 3),
+            cost=completion.cost,
+        )
+        return completion.text
+
+    async def send_prompt(self, litellm_prompt: Prompt, model: str) -> Completion:
+        """One attempt at the prompt, the router may run several against different
+        models at once."""
         if self.use_mock_api:
-            return self.mock_api_response(litellm_prompt)
+            text = await self.mock_api_response(litellm_prompt)
+            return Completion(text=text, model=model)
+        attempt = litellm_prompt.copy()
+        text = await attempt.run(model=model, api_key=self.api_key, should_print=False)
+        return Completion(
+            text=text, model=model, cost=attempt.total_cost, tokens=attempt.total_tokens
+        )
 
-        response = litellm_prompt.run(
-            model=self.model, api_key=self.api_key, should_print=False
+    async def mock_api_response(self, litellm_prompt: Prompt) -> str:
+        """The stand-in model, which generates mock_text but stops where a real model
+        given the prompt's limits would."""
+        text = apply_limits(self.mock_text(litellm_prompt), litellm_prompt.limits)
+        latency = self.mock_api_latency + self.mock_api_token_latency * len(
+            text.split(" ")
         )
-        self.total_cost += litellm_prompt.total_cost
-        return response
+        if latency:
+            await asyncio.sleep(latency)
+        return text
 
-    def mock_api_response(self, litellm_prompt: Prompt) -> str:
-        return f"Mock response."
+    def mock_text(self, litellm_prompt: Prompt) -> str:
+        return "Mock response."
 
     def make_choice_prompt(
         self,
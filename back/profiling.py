@@ -0,0 +1,278 @@
+"""On demand CPU and memory profiling, for the admin endpoints in app.py.
+
+The sampling profiler runs a thread that looks at the event loop thread's stack every
+few milliseconds and counts each stack, in the folded format flamegraph.pl and
+speedscope read ("outer;inner;leaf count" per line). To profile one game, each
+sample is kept only if the task running at the time belongs to it. Supervisors tag
+their game's tasks, and while profiling, tasks a tagged task creates are tagged too.
+
+cProfile mode traces every call on the loop thread, so it's exact but slows the
+server down, and can't tell games apart.
+
+Memory snapshots use tracemalloc, which starts with the first snapshot and stops
+when asked. Each snapshot is compared to the one before it, so allocations that
+keep growing between two snapshots, like observations piling up, stand out.
+
+Nothing here runs until asked for, apart from tagging each game's main task.
+"""
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from metrics import metrics
+
+
+@dataclass
+class ProfilingSettings:
+    interval_s: float = 0.005
+    max_duration_s: float = 300.0
+    # Frames kept per sample, counted from the innermost
+    max_stack_depth: int = 64
+    # Frames stored per allocation by tracemalloc
+    memory_frames: int = 10
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+# Which game each task belongs to, and each game's main task. Weak, so finished
+# tasks drop out.
+_task_games: "weakref.WeakKeyDictionary[asyncio.Task, str]" = (
+    weakref.WeakKeyDictionary()
+)
+_main_tasks: "weakref.WeakValueDictionary[str, asyncio.Task]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def tag_task(task: asyncio.Task, game_id: str, main: bool = False) -> None:
+    _task_games[task] = game_id
+    if main:
+        _main_tasks[game_id] = task
+
+
+def game_of(task: Optional[asyncio.Task]) -> Optional[str]:
+    if task is None:
+        return None
+    return _task_games.get(task)
+
+
+def frame_label(code) -> str:
+    # co_qualname is new in Python 3.11
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)})"
+
+
+@dataclass
+class Profile:
+    mode: str
+    game_id: Optional[str]
+    duration_s: float
+    # Samples taken and kept, for the sampling profiler
+    num_samples: int
+    num_kept: int
+    # Folded stacks for sampling, pstats text for cProfile
+    text: str
+
+
+class Profiler:
+    """Runs one CPU profile at a time."""
+
+    def __init__(self, settings: ProfilingSettings = None):
+        self.settings = settings or ProfilingSettings()
+        self.running = False
+        self.last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    async def profile(
+        self, duration_s: float, game_id: Optional[str] = None, mode: str = "sampling"
+    ) -> Profile:
+        """Profiles the event loop for duration_s, or until the game ends if
+        game_id is given and it ends first."""
+        if mode not in ("sampling", "cprofile"):
+            raise ValueError(f"Unknown profiling mode {mode}")
+        if mode == "cprofile" and game_id is not None:
+            raise ValueError("cProfile can't profile one game, use sampling")
+        if self.running:
+            raise ProfilerBusy("Already profiling")
+        duration_s = min(duration_s, self.settings.max_duration_s)
+        self.running = True
+        metrics.increment(f"profiles.{mode}")
+        try:
+            if mode == "cprofile":
+                return await self._cprofile(duration_s)
+            return await self._sample(duration_s, game_id)
+        finally:
+            self.running = False
+
+    async def _cprofile(self, duration_s: float) -> Profile:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(duration_s)
+        finally:
+            profile.disable()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(100)
+        return Profile("cprofile", None, duration_s, 0, 0, out.getvalue())
+
+    async def _sample(self, duration_s: float, game_id: Optional[str]) -> Profile:
+        loop = asyncio.get_running_loop()
+        sampler = StackSampler(
+            loop,
+            threading.get_ident(),
+            game_id,
+            self.settings.interval_s,
+            self.settings.max_stack_depth,
+        )
+        previous_factory = loop.get_task_factory()
+        if game_id is not None:
+            loop.set_task_factory(tagging_task_factory(previous_factory))
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self._wait(duration_s, game_id)
+        finally:
+            sampler.stop()
+            if game_id is not None:
+                loop.set_task_factory(previous_factory)
+        return Profile(
+            "sampling",
+            game_id,
+            time.perf_counter() - start,
+            sampler.num_samples,
+            sampler.num_kept,
+            sampler.folded(),
+        )
+
+    async def _wait(self, duration_s: float, game_id: Optional[str]) -> None:
+        main_task = _main_tasks.get(game_id) if game_id is not None else None
+        if main_task is None:
+            await asyncio.sleep(duration_s)
+        else:
+            await asyncio.wait({main_task}, timeout=duration_s)
+
+    def memory_diff(self, limit: int = 30, group_by: str = "lineno") -> Dict:
+        """Takes a tracemalloc snapshot and compares it to the last one. The
+        first call starts tracing, so only has allocations made since."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.settings.memory_frames)
+            self.last_snapshot = None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ]
+        )
+        previous = self.last_snapshot or tracemalloc.Snapshot(
+            (), snapshot.traceback_limit
+        )
+        diffs = snapshot.compare_to(previous, group_by)
+        self.last_snapshot = snapshot
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracedBytes": traced,
+            "peakBytes": peak,
+            "top": [
+                {
+                    "sizeDiff": diff.size_diff,
+                    "size": diff.size,
+                    "countDiff": diff.count_diff,
+                    "count": diff.count,
+                    "traceback": diff.traceback.format(),
+                }
+                for diff in diffs[:limit]
+            ],
+        }
+
+    def stop_memory_tracing(self) -> None:
+        self.last_snapshot = None
+        tracemalloc.stop()
+
+
+def tagging_task_factory(previous_factory):
+    """Tags tasks made by a tagged task with the same game."""
+
+    def factory(loop, coro, **kwargs):
+        if previous_factory is None:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        else:
+            task = previous_factory(loop, coro, **kwargs)
+        game_id = game_of(asyncio.current_task(loop))
+        if game_id is not None:
+            tag_task(task, game_id)
+        return task
+
+    return factory
+
+
+class StackSampler:
+    """Samples one thread's stack from another thread."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        thread_id: int,
+        game_id: Optional[str],
+        interval_s: float,
+        max_depth: int,
+    ):
+        self.loop = loop
+        self.thread_id = thread_id
+        self.game_id = game_id
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.num_samples = 0
+        self.num_kept = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="stack sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval_s):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        self.num_samples += 1
+        if self.game_id is not None:
+            # Only a dict lookup, so safe from this thread
+            if game_of(asyncio.current_task(self.loop)) != self.game_id:
+                return
+        self.num_kept += 1
+        labels: List[str] = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        self.stacks[";".join(labels)] += 1
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+profiler = Profiler()
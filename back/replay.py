@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List
+
+REPLAY_DIR = Path(os.environ.get("REPLAY_DIR", "replays"))
+REPLAY_VERSION = 1
+
+
+def summarize_request(messages: List[dict]) -> dict:
+    """Compact record of an LLM request. The full message list is mostly the same
+    rules and observations every time, so only its hash and the final prompt are kept."""
+    serialized = json.dumps(messages, sort_keys=True).encode()
+    return {
+        "sha1": hashlib.sha1(serialized).hexdigest(),
+        "num_messages": len(messages),
+        "prompt": messages[-1]["content"] if messages else "",
+    }
+
+
+class ReplayRecorder:
+    """Collects everything needed to replay a game: seating, role deal, public
+    events, night actions, every LLM exchange and human input, and the result.
+
+    Entries are kept in memory and written once at the end of the game as
+    gzipped JSON lines, see replay_runner for reading them back.
+    """
+
+    def __init__(self, game_id: str, game_type: str, num_players: int, seed: int):
+        self.game_id = game_id
+        self.start_time = time.time()
+        self.entries: List[dict] = []
+        self.record(
+            "header",
+            version=REPLAY_VERSION,
+            game_id=game_id,
+            game_type=game_type,
+            num_players=num_players,
+            seed=seed,
+            started_at=self.start_time,
+        )
+
+    def record(self, kind: str, **data) -> None:
+        self.entries.append(
+            {"kind": kind, "t": round(time.time() - self.start_time, 3), **data}
+        )
+
+    def save(self, directory: Path = None) -> Path:
+        directory = directory or REPLAY_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.game_id}.jsonl.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        return path
+
+
+def load_replay(path: Path) -> List[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
@@ -0,0 +1,151 @@
+"""Re-runs a recorded game offline from its replay file.
+
+Recorded LLM responses and human inputs are served back in order, so the real
+prompt assembly, parsing and game logic run without network access or waiting.
+
+Usage, from the back directory: python replay_runner.py replays/GAMEID.jsonl.gz
+"""
+import asyncio
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Union
+
+from loguru import logger
+
+from core import Prompt
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from message_types import BaseEvent, PromptMessage
+from player import AIPlayer, HumanPlayer, Player
+from replay import load_replay
+from roles import Role
+
+
+class ReplayDivergedError(Exception):
+    """The replayed game went differently than the recorded one."""
+
+
+class ReplayAIPlayer(AIPlayer):
+    def __init__(self, game, name, model, personality, responses: Deque[str]):
+        super().__init__(game, name, model=model, personality=personality)
+        self.responses = responses
+
+    async def prompt_model(self, litellm_prompt: Prompt):
+        if not self.responses:
+            raise ReplayDivergedError(f"No recorded LLM response left for {self.name}")
+        return self.responses.popleft()
+
+
+class ReplayHumanPlayer(HumanPlayer):
+    def __init__(self, game, name, inputs: Deque[str]):
+        super().__init__(game, name)
+        self.inputs = inputs
+
+    async def prompt_with(
+        self, prompt: Union[str, PromptMessage], should_think=False, params: dict = None
+    ) -> str:
+        if not self.inputs:
+            raise ReplayDivergedError(f"No recorded input left for {self.name}")
+        return self.inputs.popleft()
+
+    async def print(self, event: BaseEvent):
+        pass
+
+
+class ReplayGame(OneNightWerewolf):
+    def __init__(self, entries: List[dict]):
+        self.entries = entries
+        header = self.get_entry("header")
+        players = self.get_entry("players")["players"]
+        super().__init__(
+            num_players=header["num_players"],
+            has_human=any(p["type"] == "human" for p in players),
+            record_replay=False,
+            seed=header["seed"],
+        )
+        self.id = header["game_id"]
+
+    def get_entry(self, kind: str) -> dict:
+        return next(entry for entry in self.entries if entry["kind"] == kind)
+
+    def create_players(self) -> List[HumanPlayer]:
+        self.decisions: Dict[str, Deque[str]] = defaultdict(deque)
+        for entry in self.entries:
+            if entry["kind"] in ("llm", "input"):
+                self.decisions[entry["player"]].append(entry["response"])
+        self.recorded_players = {
+            info["name"]: info for info in self.get_entry("players")["players"]
+        }
+
+        # The game's seed reproduces the seating, so only the players are replaced
+        humans = super().create_players()
+        if [p.name for p in self.state.players] != list(self.recorded_players):
+            raise ReplayDivergedError("Players were seated differently")
+        return humans
+
+    def make_human_players(self) -> List[HumanPlayer]:
+        players_entry = self.get_entry("players")
+        # Older replays have at most one human and don't list them separately
+        names = players_entry.get("humans") or [
+            name
+            for name, info in self.recorded_players.items()
+            if info["type"] == "human"
+        ]
+        return [
+            ReplayHumanPlayer(self, name, inputs=self.decisions[name]) for name in names
+        ]
+
+    def make_ai_player(self, name: str, model: str, personality: str) -> AIPlayer:
+        return ReplayAIPlayer(
+            self,
+            name,
+            model=model,
+            personality=personality,
+            responses=self.decisions[name],
+        )
+
+    async def deal_roles(self, roles_in_game: List[Role]) -> List[Role]:
+        center_cards = await super().deal_roles(roles_in_game)
+        assignment = {p.name: p.role.name for p in self.state.players}
+        if assignment != self.get_entry("roles")["assignment"]:
+            raise ReplayDivergedError("Roles were dealt differently")
+        return center_cards
+
+    async def update_performance(self, winners: List[Player]) -> None:
+        pass
+
+    async def save_replay(self) -> None:
+        pass
+
+    @property
+    def recorded_result(self) -> dict:
+        return self.get_entry("result")
+
+
+async def run_replay(path: Path) -> ReplayGame:
+    game = ReplayGame(load_replay(path))
+    await game.play_game()
+    return game
+
+
+def final_roles(game: OneNightWerewolf) -> Dict[str, str]:
+    return {p.name: p.role.name for p in game.state.players}
+
+
+if __name__ == "__main__":
+    logger.remove()
+    replay_path = Path(sys.argv[1])
+    start = time.perf_counter()
+    try:
+        replayed_game = asyncio.run(run_replay(replay_path))
+    except ReplayDivergedError as e:
+        sys.exit(f"Replay diverged from the recorded game: {e}")
+    elapsed = time.perf_counter() - start
+
+    recorded = replayed_game.recorded_result
+    print(f"Replayed game {replayed_game.id} in {elapsed:.3f}s")
+    print(f"Recorded game took {recorded['t']:.1f}s to reach the result")
+    print(f"Final roles: {final_roles(replayed_game)}")
+    if final_roles(replayed_game) != recorded["final_roles"]:
+        print(f"DIVERGED, recorded final roles were {recorded['final_roles']}")
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from typing import Optional, TYPE_CHECKING, List
+from typing import NamedTuple, Optional, TYPE_CHECKING, List
+
+from message_types import PromptChoice
 
 if TYPE_CHECKING:
     from game_state import GameState
@@ -12,6 +14,16 @@ class RoleInteraction:
     interaction: str
 
 
+class ChoiceRequest(NamedTuple):
+    """Arguments for Player.get_choice, so a choice can be asked ahead of time."""
+
+    prompt: str
+    choices: List[PromptChoice]
+    choose_multiple: bool = False
+    min_choices: int = 1
+    max_choices: Optional[int] = None
+
+
 class Role:
     def __init__(self, name: str):
         self.name: str = name
@@ -21,6 +33,13 @@ class Role:
     ) -> Optional[str]:
         return None
 
+    def night_choice(
+        self, player: "Player", game_state: "GameState"
+    ) -> Optional[ChoiceRequest]:
+        """The choice night_action starts by asking for, if it can be known once
+        roles are dealt."""
+        return None
+
     def get_rules(self) -> str:
         return f"*{self.name}*: {self.get_inner_rules()}"
 
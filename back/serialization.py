@@ -0,0 +1,40 @@
+from typing import Optional
+
+from loguru import logger
+from pydantic import ValidationError
+
+from message_types import BaseEvent, PlayerActionMessage
+
+try:
+    # Optional, faster encoder. Falls back to pydantic's own JSON serializer.
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_event(event: BaseEvent) -> str:
+    """Encodes an event to the JSON text sent over websockets.
+
+    The result is cached on the event until one of its fields is set, so an event
+    observed by many players is only serialized once no matter how many sockets it
+    is sent to.
+    """
+    # Pydantic's private attribute access is slow, so go through the dict directly
+    private = event.__pydantic_private__
+    encoded = private["_encoded"]
+    if encoded is None:
+        if orjson is not None:
+            encoded = orjson.dumps(event.model_dump()).decode()
+        else:
+            encoded = event.model_dump_json()
+        private["_encoded"] = encoded
+    return encoded
+
+
+def decode_client_message(text: str) -> Optional[PlayerActionMessage]:
+    """Parses and validates a message sent by the frontend. Returns None if invalid."""
+    try:
+        return PlayerActionMessage.model_validate_json(text)
+    except ValidationError as e:
+        logger.warning(f"Dropping invalid client message {text[:100]!r}: {e}")
+        return None
@@ -0,0 +1,104 @@
+import asyncio
+from typing import List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from loguru import logger
+
+from message_types import BaseEvent
+from metrics import metrics
+from serialization import encode_event
+
+# Frames buffered per spectator before the oldest are dropped
+MAX_PENDING_FRAMES = 200
+SEND_TIMEOUT = 10.0
+
+
+class Spectator:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pending: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_FRAMES)
+        self.dropped = 0
+
+    def push(self, text: Optional[str]) -> None:
+        """Queues a frame without ever blocking. None closes the connection."""
+        if self.pending.full():
+            # Slow viewer, drop their oldest frame rather than hold up the game
+            self.pending.get_nowait()
+            self.dropped += 1
+            metrics.increment("spectator_frames_dropped")
+        self.pending.put_nowait(text)
+
+
+class SpectatorHub:
+    """Streams a game's public events to any number of spectators.
+
+    Public events are the ones announced to every player, so private night results,
+    role assignments and AI thinking are never published. Each event is encoded once,
+    and publishing only queues it per spectator, so the game loop never waits on a
+    spectator's socket.
+    """
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.history: List[str] = []
+        self.spectators: Set[Spectator] = set()
+        self.closed = False
+
+    def publish(self, event: BaseEvent) -> None:
+        text = encode_event(event)
+        self.history.append(text)
+        for spectator in self.spectators:
+            spectator.push(text)
+
+    def close(self) -> None:
+        self.closed = True
+        for spectator in self.spectators:
+            spectator.push(None)
+
+    async def serve(self, websocket: WebSocket) -> None:
+        """Streams the game so far and then live events, until either side closes."""
+        spectator = Spectator(websocket)
+        # Snapshot the history before subscribing so no event is sent twice or skipped
+        history = list(self.history)
+        self.spectators.add(spectator)
+        metrics.adjust_gauge("spectators", 1)
+        if self.closed:
+            spectator.push(None)
+
+        sender = asyncio.create_task(self._send_frames(spectator, history))
+        receiver = asyncio.create_task(self._wait_for_disconnect(websocket))
+        try:
+            await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            self.spectators.discard(spectator)
+            metrics.adjust_gauge("spectators", -1)
+            logger.info(
+                f"Spectator left game {self.game_id}, dropped {spectator.dropped} frames"
+            )
+
+    async def _send_frames(self, spectator: Spectator, history: List[str]) -> None:
+        try:
+            for text in history:
+                await asyncio.wait_for(
+                    spectator.websocket.send_text(text), timeout=SEND_TIMEOUT
+                )
+            while True:
+                text = await spectator.pending.get()
+                if text is None:
+                    await spectator.websocket.close()
+                    return
+                await asyncio.wait_for(
+                    spectator.websocket.send_text(text), timeout=SEND_TIMEOUT
+                )
+        except (asyncio.TimeoutError, RuntimeError, WebSocketDisconnect) as e:
+            logger.info(f"Stopped streaming game {self.game_id} to spectator: {e!r}")
+
+    async def _wait_for_disconnect(self, websocket: WebSocket) -> None:
+        # Spectators don't send anything meaningful, this just notices them leaving
+        try:
+            while True:
+                await websocket.receive_text()
+        except (WebSocketDisconnect, RuntimeError):
+            return
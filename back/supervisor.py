@@ -0,0 +1,126 @@
+"""Stops a game's LLM work while no human is connected to it.
+
+Every AI completion in a supervised game goes through GameSupervisor.llm_call. Once
+the last human disconnects or leaves, calls in flight are cancelled and new ones wait.
+If someone reconnects within the grace window, the waiting calls run. Otherwise the
+game is cancelled, and the calls that were waiting are counted as saved.
+
+The game and its calls run as tasks of the supervisor, which cancels whatever is left
+when the game ends, like asyncio.TaskGroup (not available before Python 3.11).
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Coroutine, Optional, Set, TypeVar
+
+from loguru import logger
+
+from metrics import metrics
+from profiling import tag_task
+
+T = TypeVar("T")
+
+
+@dataclass
+class SupervisorSettings:
+    # How long a game waits for a human to come back before it's cancelled
+    grace_s: float = 120.0
+
+
+class GameSupervisor:
+    def __init__(
+        self,
+        game_id: str,
+        is_watched: Callable[[], bool],
+        settings: SupervisorSettings = None,
+    ):
+        self.game_id = game_id
+        self.is_watched = is_watched
+        self.settings = settings or SupervisorSettings()
+        self.watched = asyncio.Event()
+        self.watched.set()
+        self.main: Optional[asyncio.Task] = None
+        self.in_flight: Set[asyncio.Task] = set()
+        # Calls cancelled by a pause, to be made again
+        self.interrupted: Set[asyncio.Task] = set()
+        self.num_waiting = 0
+        self.grace_timer: Optional[asyncio.TimerHandle] = None
+        self.abandoned = False
+
+    async def run(self, game: Coroutine[Any, Any, None]) -> None:
+        """Plays the game until it ends, or is abandoned."""
+        if self.abandoned:
+            # Everyone left while it was queued
+            game.close()
+            logger.info(f"Game {self.game_id} abandoned before it started")
+            return
+        self.main = asyncio.ensure_future(game)
+        tag_task(self.main, self.game_id, main=True)
+        self.presence_changed()
+        try:
+            await self.main
+        except asyncio.CancelledError:
+            if not self.abandoned:
+                raise
+            logger.info(f"Game {self.game_id} abandoned, nobody came back")
+        finally:
+            self.cancel_grace_timer()
+            for task in self.in_flight:
+                task.cancel()
+
+    def presence_changed(self) -> None:
+        """Call when a human in the game connects, disconnects or leaves."""
+        if self.is_watched():
+            if not self.watched.is_set():
+                logger.info(f"Resuming game {self.game_id}")
+                self.cancel_grace_timer()
+                self.watched.set()
+        elif self.watched.is_set():
+            self.pause()
+
+    def pause(self) -> None:
+        logger.info(f"Pausing game {self.game_id}, no humans connected")
+        self.watched.clear()
+        metrics.increment("llm_calls_cancelled", len(self.in_flight))
+        for task in self.in_flight:
+            task.cancel()
+        self.interrupted.update(self.in_flight)
+        self.grace_timer = asyncio.get_running_loop().call_later(
+            self.settings.grace_s, self.abandon
+        )
+
+    def cancel_grace_timer(self) -> None:
+        if self.grace_timer is not None:
+            self.grace_timer.cancel()
+            self.grace_timer = None
+
+    def abandon(self) -> None:
+        self.cancel_grace_timer()
+        self.abandoned = True
+        metrics.increment("llm_calls_saved", self.num_waiting)
+        if self.main is not None:
+            self.main.cancel()
+
+    async def llm_call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """Runs an LLM call while someone is watching. A call cancelled because
+        everyone left is made again if they come back."""
+        while True:
+            if not self.watched.is_set():
+                self.num_waiting += 1
+                metrics.increment("llm_calls_paused")
+                try:
+                    await self.watched.wait()
+                finally:
+                    self.num_waiting -= 1
+            task = asyncio.ensure_future(make_call())
+            tag_task(task, self.game_id)
+            self.in_flight.add(task)
+            try:
+                await asyncio.wait({task})
+            finally:
+                self.in_flight.discard(task)
+                task.cancel()
+            if not task.cancelled():
+                return task.result()
+            if task not in self.interrupted:
+                raise asyncio.CancelledError()
+            self.interrupted.discard(task)
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionControl, AdmissionSettings, ServerBusy, Slots
+
+
+@pytest.mark.asyncio
+async def test_slots_are_first_come_first_served():
+    slots = Slots(1, "test")
+    order = []
+
+    async def use(name):
+        async with slots.hold():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    first = asyncio.create_task(use("first"))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(use("cancelled"))
+    rest = [asyncio.create_task(use(name)) for name in ("second", "third")]
+    await asyncio.sleep(0)
+    assert slots.num_waiting == 3
+    cancelled.cancel()
+    await asyncio.gather(first, *rest)
+
+    assert order == ["first", "second", "third"]
+    assert slots.in_use == 0 and slots.num_waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_queues_then_sheds_games():
+    admission = AdmissionControl(
+        AdmissionSettings(
+            max_active_games=2, max_queued_games=2, default_game_duration_s=100
+        )
+    )
+    positions = [admission.request().position for _ in range(4)]
+    assert positions == [0, 0, 1, 2]
+    assert admission.estimate_wait_s(2) == 100
+    with pytest.raises(ServerBusy):
+        admission.request()
+    # Lobby games are queued regardless
+    assert admission.request(can_shed=False).position == 3
+
+    playing = []
+
+    async def play(i):
+        async with admission.game_slot():
+            playing.append(i)
+            assert admission.games.in_use <= 2
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[play(i) for i in range(5)])
+    assert playing == list(range(5))
+    assert admission.num_games == 0 and admission.queue_length == 0
+    assert admission.request().position == 0
@@ -0,0 +1,39 @@
+import pytest
+
+from card_state import CardState
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+
+
+def test_branches_share_history_and_leave_original_alone():
+    dealt = CardState.deal(("Werewolf", "Robber", "Seer"), ("Tanner", "Villager", "Thing"))
+    robbed = dealt.swap(1, 0, cause="Robber")
+    branch_a = robbed.swap(0, 2, cause="Troublemaker")
+    branch_b = robbed.set_role(2, "Werewolf", cause="Doppelganger")
+
+    assert dealt.seats == ("Werewolf", "Robber", "Seer")
+    assert robbed.seats == ("Robber", "Werewolf", "Seer")
+    assert branch_a.seats == ("Seer", "Werewolf", "Robber")
+    assert branch_b.seats_with("Werewolf") == [1, 2]
+    assert branch_b.seats_with("Robber", original=True) == [1]
+
+    assert [c.cause for c in branch_a.changes()] == ["Robber"] * 2 + ["Troublemaker"] * 2
+    # Both branches point at the same earlier changes rather than copies
+    assert branch_a.last_change.previous.previous is robbed.last_change
+    assert branch_b.last_change.previous is robbed.last_change
+
+
+@pytest.mark.asyncio
+async def test_game_state_snapshot_follows_the_night(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(num_players=7, seed=3)
+    await game.setup_game()
+    dealt = game.state.snapshot()
+    await game.play_night_phase()
+
+    state = game.state
+    snapshot = state.snapshot()
+    assert snapshot.seats == tuple(p.role.name for p in state.players)
+    assert snapshot.original_seats == dealt.seats
+    assert snapshot.center == tuple(role.name for role in state.center_cards)
+    assert len(snapshot.changes()) == len(state.role_changes)
+    assert dealt.last_change is None
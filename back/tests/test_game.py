@@ -1,7 +1,16 @@
+import asyncio
+
 import pytest
 
-from games.one_night_ultimate_werewolf.game import OneNightWerewolf
-from player import AIPlayer
+from games.one_night_ultimate_werewolf.game import (
+    OneNightWerewolf,
+    ChatSettings,
+    VotingSettings,
+)
+from message_types import SpeechMessage, VoteResultsMessage
+from model_performance import ModelPerformanceTracker
+from model_router import ModelRouter, RouterSettings
+from player import AIPlayer, HumanPlayer
 from websocket_management import UserLogin
 
 
@@ -17,7 +26,9 @@ def test_game_setup(game):
 
 
 @pytest.mark.asyncio
-async def test_game_setup_with_human():
+async def test_game_setup_with_human(monkeypatch):
+    # Setup starts the AI players' night choices
+    monkeypatch.setenv("USE_MOCK_API", "true")
     login = UserLogin(name="TestUser", api_key="test_api_key")
     game = OneNightWerewolf(num_players=5, has_human=True, login=login)
     await game.setup_game()
@@ -26,4 +37,153 @@ async def test_game_setup_with_human():
     assert any(player.name == "TestUser" for player in game.state.players)
 
 
+@pytest.mark.asyncio
+async def test_night_choices_start_once_roles_are_dealt(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(num_players=10, seed=3, record_replay=True)
+    await game.setup_game()
+
+    told = game.players_told_at_night()
+    assert told  # Every role is in a 10 player game, including the Thing
+    prefetched = [p for p in game.state.players if p.prefetched]
+    assert prefetched and not told & set(prefetched)
+    night_choosers = [
+        p
+        for p in game.state.players
+        if p.original_role.night_choice(p, game.state) is not None
+    ]
+    assert set(prefetched) == set(night_choosers) - told
+
+    await game.play_night_phase()
+    assert not any(p.prefetched for p in game.state.players)
+    llm_calls = [e["player"] for e in game.recorder.entries if e["kind"] == "llm"]
+    # Each prefetched choice was asked once, and used. A Doppelganger may then be
+    # asked for its new role's choice
+    assert all(
+        llm_calls.count(p.name) == 1
+        for p in prefetched
+        if p.original_role.name != "Doppelganger"
+    )
+
+
+class ChattyHuman(HumanPlayer):
+    async def prompt_with(self, prompt, should_think=False, params=None) -> str:
+        return "gg"
+
+    async def print(self, event):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_chat_replies_in_order_within_budget(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(
+        num_players=5, chat_settings=ChatSettings(max_ai_replies=8)
+    )
+    await game.setup_game()
+    human = ChattyHuman(game, "Human")
+    game.state.players[0] = human
+
+    await game.chat()
+
+    ai_names = [p.name for p in game.state.players if isinstance(p, AIPlayer)]
+    speakers = [
+        event.username
+        for event in human.observations
+        if isinstance(event, SpeechMessage) and event.username != "Human"
+    ]
+    assert speakers == ai_names * 2
+
+
+@pytest.mark.asyncio
+async def test_voting_deadline(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(
+        num_players=5,
+        voting_settings=VotingSettings(deadline=0.1, deadline_policy="abstain"),
+    )
+    await game.setup_game()
+    slow_voter = game.state.players[0]
+
+    async def never_votes(players):
+        await asyncio.sleep(10)
+
+    slow_voter.vote = never_votes
+
+    executed_players = await game.voting_phase()
+
+    results = [
+        e for e in game.state.players[1].observations if isinstance(e, VoteResultsMessage)
+    ]
+    assert len(results) == 1
+    assert results[0].votes[slow_voter.name] is None
+    assert sum(vote is not None for vote in results[0].votes.values()) == 4
+    assert results[0].executed == [p.name for p in executed_players]
+
+
+@pytest.mark.asyncio
+async def test_ais_stay_quiet_when_no_model_answers(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    router = ModelRouter(
+        ModelPerformanceTracker(),
+        ["fast", "slow"],
+        settings=RouterSettings(model_failure_threshold=1),
+    )
+    for model in router.ranked_models():
+        router.breakers_for(model)[0].on_failure(1.0)
+    monkeypatch.setattr("player.model_router", router)
+    monkeypatch.setattr("games.one_night_ultimate_werewolf.game.model_router", router)
+    game = OneNightWerewolf(num_players=5)
+    await game.setup_game()
+    human = ChattyHuman(game, "Human")
+    game.state.players[0] = human
+
+    await game.play_day_phase()
+    executed_players = await game.voting_phase()
+
+    ai_speech = [
+        event
+        for event in human.observations
+        if isinstance(event, SpeechMessage) and event.username != "Human"
+    ]
+    assert ai_speech == []
+    assert not any(
+        "No response" in event.model_dump_json() for event in human.observations
+    )
+    # Every AI still voted, at random
+    [results] = [e for e in human.observations if isinstance(e, VoteResultsMessage)]
+    assert all(vote is not None for vote in results.votes.values())
+    assert results.executed == [p.name for p in executed_players]
+
+
+async def play_seeded_game(seed: int):
+    game = OneNightWerewolf(num_players=5, seed=seed, record_replay=True)
+    game.save_replay = lambda: asyncio.sleep(0)
+    await game.play_game()
+
+    log = []
+    for entry in game.recorder.entries:
+        entry = {k: v for k, v in entry.items() if k not in ("t", "started_at")}
+        entry.pop("latency_s", None)
+        if "event" in entry:
+            entry["event"] = {
+                k: v for k, v in entry["event"].items() if k != "timestamp"
+            }
+        log.append(entry)
+    return log
+
+
+@pytest.mark.asyncio
+async def test_same_seed_gives_identical_games(monkeypatch, tmp_path):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    monkeypatch.setattr(
+        "model_performance.performance_tracker.performance_file",
+        tmp_path / "model_performance.json",
+    )
+
+    first_log = await play_seeded_game(seed=1234)
+    assert first_log == await play_seeded_game(seed=1234)
+    assert first_log != await play_seeded_game(seed=4321)
+
+
 # Add more tests as needed
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+from games import create_game, GameConfigError
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from games.one_night_ultimate_werewolf.onuw_roles import get_roles_in_game
+
+
+def test_registry_imports_games_lazily():
+    code = (
+        "import sys, games; "
+        "assert 'games.one_night_ultimate_werewolf.game' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_create_game():
+    game = create_game("one_night_ultimate_werewolf", num_players=7)
+    assert isinstance(game, OneNightWerewolf)
+    assert game.game_type == "one_night_ultimate_werewolf"
+    assert game.num_players == 7
+
+
+def test_create_game_rejects_bad_config():
+    with pytest.raises(GameConfigError):
+        create_game("chess", num_players=2)
+    with pytest.raises(GameConfigError):
+        create_game("one_night_ultimate_werewolf", num_players=50)
+
+
+@pytest.mark.parametrize("num_players", [3, 5, 7, 10])
+def test_role_pool_covers_players_and_center(num_players):
+    assert len(get_roles_in_game(num_players)) == num_players + 3
@@ -0,0 +1,53 @@
+import pytest
+
+from game_state import GameState
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from games.one_night_ultimate_werewolf.onuw_roles import Robber, Villager, Werewolf
+from player import Player
+
+
+def make_state(roles):
+    state = GameState(num_players=len(roles))
+    for i, role in enumerate(roles):
+        player = Player(None, f"P{i}")
+        player.role = player.original_role = role
+        state.add_player(player)
+    state.index_roles()
+    return state
+
+
+def test_swap_roles_updates_indexes_and_history():
+    state = make_state([Werewolf(), Robber(), Villager(), Werewolf()])
+    p0, p1, p2, p3 = state.players
+    assert state.players_with_role("Werewolf") == [p0, p3]
+
+    state.swap_roles(p1, p3, cause="Robber")
+    assert state.players_with_role("Werewolf") == [p0, p1]
+    assert state.players_with_role("Robber") == [p3]
+    assert state.players_with_role("Robber", original=True) == [p1]
+    assert [(c.player, c.new_role.name) for c in state.role_changes] == [
+        (p1, "Werewolf"),
+        (p3, "Robber"),
+    ]
+
+    state.set_role(p2, Werewolf(), cause="Doppelganger")
+    state.remove_player(p0)
+    assert state.players_with_role(Werewolf()) == [p1, p2]
+    assert not state.has_role("Villager")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(5))
+async def test_indexes_match_roles_after_night(monkeypatch, seed):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(num_players=7, seed=seed)
+    await game.setup_game()
+    await game.play_night_phase()
+
+    state = game.state
+    for role in {p.role.name for p in state.players} | {"Werewolf"}:
+        assert state.players_with_role(role) == [
+            p for p in state.players if p.role.name == role
+        ]
+    for change in state.role_changes:
+        assert change.cause in ("Robber", "Troublemaker", "Doppelganger")
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import GenerationLimits, Prompt, apply_limits
+from player import GENERATION_LIMITS
+
+THINKING = (
+    "I saw Bob's card. The answer must look like {1, Bob}. "
+    "Dave claimed Seer, which conflicts with what I saw."
+)
+
+
+def test_choice_stops_after_the_answer_not_the_example():
+    text = THINKING + " {2, Dave} To explain further, Dave is lying."
+    assert apply_limits(text, GENERATION_LIMITS["choice"]) == THINKING + " {2, Dave}"
+
+
+def test_speech_stops_after_the_message():
+    text = "{} Thinking. {I'm the Seer, Dave is a Werewolf.} I hope they believe me."
+    limited = apply_limits(text, GENERATION_LIMITS["speech"])
+    assert limited == "{} Thinking. {I'm the Seer, Dave is a Werewolf.}"
+
+
+def test_max_tokens_and_stop():
+    text = "one two three\n\nfour five"
+    assert apply_limits(text, GenerationLimits(max_tokens=2)) == "one two"
+    assert apply_limits(text, GenerationLimits(stop=("\n\n",))) == "one two three"
+    assert apply_limits(text, GenerationLimits()) == text
+
+
+def test_rules_check_isnt_cut_at_the_example():
+    text = "If fine I'd say {No errors found}. But Bob can't be Seer. {Bob's claim}"
+    assert apply_limits(text, GENERATION_LIMITS["rules_check"]) == text
+
+
+class FakeStreamingLitellm:
+    """Streams the given chunks, and notes how many were read before closing."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.num_sent = 0
+        self.closed = False
+
+    async def acompletion(self, **request):
+        assert request["stream"]
+        return self.stream()
+
+    async def stream(self):
+        try:
+            for content in self.chunks:
+                self.num_sent += 1
+                yield SimpleNamespace(
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=content))]
+                )
+        finally:
+            self.closed = True
+
+    def stream_chunk_builder(self, chunks, messages):
+        text = "".join(chunk.choices[0].delta.content for chunk in chunks)
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(content=text), finish_reason=None
+                )
+            ]
+        )
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_at_an_answer_mid_chunk():
+    chunks = ["I saw {1, Bob}", " so I pick {2,", " Dave} and then", " more", " more"]
+    litellm = FakeStreamingLitellm(chunks)
+    prompt = Prompt(GENERATION_LIMITS["choice"])
+
+    response = await prompt._stream_until_complete(litellm, {})
+
+    assert response.choices[0].message.content == "I saw {1, Bob} so I pick {2, Dave}"
+    assert response.choices[0].finish_reason == "stop"
+    assert litellm.num_sent == 3 and litellm.closed
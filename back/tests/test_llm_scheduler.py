@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import LLMScheduler, SchedulerSettings
+
+
+async def queue_calls(scheduler, calls):
+    """Queues (game_id, interactive) calls behind a held slot, then lets them run
+    one at a time, returning the order they got slots in."""
+    order = []
+
+    async def call(game_id, interactive):
+        async with scheduler.hold(game_id, interactive):
+            order.append(game_id)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("blocker", interactive=True)
+    tasks = [asyncio.create_task(call(*c)) for c in calls]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_weighted_share_between_games():
+    scheduler = LLMScheduler(
+        1, SchedulerSettings(reserved_for_interactive=0, turn_deadline_s=60)
+    )
+    calls = [("sim", False)] * 10 + [("human", True)] * 10
+    order = await queue_calls(scheduler, calls)
+    # The human's game has 4 times the weight, so gets 4 of every 5 slots
+    assert order[:10].count("human") == 8
+    assert scheduler.in_use == 0 and not scheduler.flows
+
+
+@pytest.mark.asyncio
+async def test_overdue_turn_goes_first():
+    now = [0.0]
+    scheduler = LLMScheduler(
+        1,
+        SchedulerSettings(reserved_for_interactive=0, turn_deadline_s=1),
+        clock=lambda: now[0],
+    )
+    # The human's game has used its share, so would wait behind the simulations
+    await scheduler.acquire("human", interactive=True)
+    scheduler.flows["human"].finish = 10.0
+    tasks = [
+        asyncio.create_task(scheduler.acquire(game_id, interactive))
+        for game_id, interactive in [("sim1", False), ("human", True), ("sim2", False)]
+    ]
+    await asyncio.sleep(0)
+    now[0] = 2.0
+    scheduler.release()
+    await asyncio.sleep(0)
+    assert [task.done() for task in tasks] == [False, True, False]
+    for task in tasks:
+        task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_headless_games_leave_reserved_slots():
+    scheduler = LLMScheduler(3, SchedulerSettings(reserved_for_interactive=1))
+    sims = [asyncio.create_task(scheduler.acquire("sim", False)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert [task.done() for task in sims] == [True, True, False]
+
+    await asyncio.wait_for(scheduler.acquire("human", interactive=True), 0.1)
+    assert scheduler.in_use == 3
+    sims[2].cancel()
@@ -0,0 +1,89 @@
+import pytest
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from lobby import Lobby, LobbySettings
+from player import AIPlayer, WebHumanPlayer
+from websocket_management import UserLogin
+
+
+def login(i: int) -> UserLogin:
+    return UserLogin(name=f"Human{i}", api_key=f"key{i}")
+
+
+@pytest.fixture
+def clock():
+    now = [0.0]
+    clock = lambda: now[0]
+    clock.now = now
+    return clock
+
+
+def test_full_match_forms_on_join(clock):
+    lobby = Lobby(LobbySettings(max_humans=3), clock=clock)
+    for i in range(4):
+        lobby.join(login(i), "one_night_ultimate_werewolf", 5)
+
+    matches = lobby.poll()
+    assert len(matches) == 1
+    assert [l.name for l in matches[0].logins] == ["Human0", "Human1", "Human2"]
+    assert lobby.num_waiting == 1
+
+
+def test_max_wait_fills_with_ai(clock):
+    lobby = Lobby(LobbySettings(max_wait_s=30, max_humans=4), clock=clock)
+    lobby.join(login(0), "one_night_ultimate_werewolf", 5)
+    clock.now[0] = 10
+    lobby.join(login(1), "one_night_ultimate_werewolf", 5)
+    lobby.join(login(2), "one_night_ultimate_werewolf", 7)
+    lobby.leave(login(1).user_id)
+
+    assert lobby.poll() == []
+    assert lobby.next_deadline() == 30
+    clock.now[0] = 30
+    matches = lobby.poll()
+    assert [(m.num_players, len(m.logins), m.waits) for m in matches] == [(5, 1, [30])]
+    assert lobby.next_deadline() == 40
+
+
+def test_rejoining_replaces_place(clock):
+    lobby = Lobby(LobbySettings(max_humans=2), clock=clock)
+    lobby.join(login(0), "one_night_ultimate_werewolf", 5)
+    lobby.join(login(0), "one_night_ultimate_werewolf", 5)
+    assert lobby.poll() == []
+    assert lobby.num_waiting == 1
+
+
+def test_thousands_waiting(clock):
+    lobby = Lobby(LobbySettings(max_humans=4), clock=clock)
+    sizes = [5, 6, 7]
+    left = 0
+    for i in range(6000):
+        clock.now[0] = i * 0.001
+        lobby.join(login(i), "one_night_ultimate_werewolf", sizes[i % 3])
+        if i % 5 == 0:
+            left += lobby.leave(login(i).user_id)
+    matches = lobby.poll()
+    assert all(len(m.logins) == 4 for m in matches)
+    seated = sum(len(m.logins) for m in matches)
+    assert seated + lobby.num_waiting == 6000 - left
+
+
+@pytest.mark.asyncio
+async def test_game_seats_several_humans(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    game = OneNightWerewolf(num_players=5, logins=[login(0), login(1)])
+    humans = game.create_players()
+    assert [h.name for h in humans] == ["Human0", "Human1"]
+    assert sum(isinstance(p, WebHumanPlayer) for p in game.state.players) == 2
+    assert sum(isinstance(p, AIPlayer) for p in game.state.players) == 3
+    assert len({p.name for p in game.state.players}) == 5
+
+
+@pytest.mark.asyncio
+async def test_humans_with_the_same_name_get_numbered(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    logins = [UserLogin(name="Alex", api_key=f"key{i}") for i in range(3)]
+    game = OneNightWerewolf(num_players=5, logins=logins)
+    humans = game.create_players()
+    assert [h.name for h in humans] == ["Alex", "Alex2", "Alex3"]
+    assert [h.user_id for h in humans] == [l.user_id for l in logins]
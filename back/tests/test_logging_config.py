@@ -0,0 +1,28 @@
+from loguru import logger
+
+import logging_config
+from logging_config import log_sampled, module_levels, should_sample
+
+
+def test_sampling_keeps_every_nth(monkeypatch):
+    monkeypatch.setitem(logging_config.sample_rates, "test", 0.25)
+    kept = [should_sample("test") for _ in range(12)]
+    assert kept == [True, False, False, False] * 3
+    assert all(should_sample("unsampled") for _ in range(5))
+
+
+def test_module_levels_and_caller_attribution(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "info")
+    monkeypatch.setenv("LOG_LEVELS", "player=WARNING, spectators=debug")
+    levels = module_levels()
+    assert levels == {"": "INFO", "player": "WARNING", "spectators": "DEBUG"}
+
+    records = []
+    handler = logger.add(lambda m: records.append(m.record), filter=levels)
+    try:
+        log_sampled("kept", "INFO", "Sending {} to {}", "speech", "Alice")
+    finally:
+        logger.remove(handler)
+    assert records[0]["message"] == "Sending speech to Alice"
+    assert records[0]["name"] == "test_logging_config"
+    assert records[0]["extra"]["category"] == "kept"
@@ -0,0 +1,111 @@
+import asyncio
+import random
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from model_performance import ModelPerformanceTracker
+from model_router import Completion, ModelRouter, ModelUnavailable, RouterSettings
+
+
+def make_router(**settings) -> ModelRouter:
+    return ModelRouter(
+        ModelPerformanceTracker(),
+        ["fast", "slow"],
+        ["backup"],
+        RouterSettings(min_samples=5, **settings),
+    )
+
+
+def test_choose_model_skips_models_over_target():
+    router = make_router(latency_target_s=1.0)
+    for _ in range(10):
+        router.tracker.record_request("fast", 0.5)
+        router.tracker.record_request("slow", 3.0)
+
+    rng = random.Random(0)
+    assert {router.choose_model(rng) for _ in range(20)} == {"fast"}
+    assert router.ranked_models() == ["fast", "backup", "slow"]
+
+
+def test_choose_model_tries_models_without_stats():
+    router = make_router()
+    rng = random.Random(0)
+    assert {router.choose_model(rng) for _ in range(50)} == {"fast", "slow"}
+
+
+@pytest.mark.asyncio
+async def test_hedges_slow_request():
+    router = make_router(default_hedge_delay_s=0.05)
+    started = []
+
+    async def send(model):
+        started.append(model)
+        await asyncio.sleep(10 if model == "slow" else 0.01)
+        return Completion(text=model, model=model)
+
+    completion = await asyncio.wait_for(router.complete("slow", send), 1)
+    assert completion.model == "fast"
+    assert started == ["slow", "fast"]
+    # The abandoned request still counts towards the slow model's latency
+    assert router.tracker.request_stats("slow").samples == 1
+
+
+@pytest.mark.asyncio
+async def test_fails_over_then_gives_up():
+    router = make_router(max_attempts=2)
+    started = []
+
+    async def send(model):
+        started.append(model)
+        raise RuntimeError("rate limited")
+
+    with pytest.raises(ModelUnavailable):
+        await router.complete("fast", send)
+    assert started == ["fast", "slow"]
+    assert router.tracker.request_stats("fast").error_rate == 1.0
+
+
+def test_circuit_breaker_opens_and_probes():
+    now = [0.0]
+    breaker = CircuitBreaker("model", failure_threshold=2, reset_timeout_s=10, clock=lambda: now[0])
+    breaker.on_failure(1.0)
+    assert breaker.state == CLOSED
+    breaker.on_failure(1.0)
+    assert breaker.state == OPEN and not breaker.available()
+
+    now[0] = 10
+    assert breaker.state == HALF_OPEN and breaker.available()
+    breaker.on_request()
+    assert not breaker.available()
+    breaker.on_failure(1.0)
+    assert breaker.state == OPEN
+
+    now[0] = 20
+    breaker.on_request()
+    breaker.on_success()
+    assert breaker.state == CLOSED and breaker.available()
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_model():
+    router = ModelRouter(
+        ModelPerformanceTracker(),
+        ["fast", "slow"],
+        settings=RouterSettings(model_failure_threshold=2),
+    )
+    started = []
+
+    async def send(model):
+        started.append(model)
+        if model == "fast":
+            raise RuntimeError("provider down")
+        return Completion(text=model, model=model)
+
+    for _ in range(3):
+        completion = await router.complete("fast", send)
+        assert completion.model == "slow"
+    # The third request goes straight to the healthy model
+    assert started == ["fast", "slow", "fast", "slow", "slow"]
+    assert not router.available("fast")
+    assert router.choose_model(random.Random(0)) == "slow"
@@ -0,0 +1,155 @@
+import itertools
+from collections import Counter, defaultdict
+from math import comb
+
+import pytest
+
+from games.one_night_ultimate_werewolf.night_enumerator import (
+    WAKE_ORDER,
+    NightEnumerator,
+    NightObservation,
+)
+
+
+def play_night(cards, num_players):
+    """Every way the night can go from a deal, as (probability, final cards, actions, taps).
+    A direct simulation of the rules in onuw_roles, with uniform choices."""
+    original = list(cards)
+    actors = [
+        seat
+        for role in sorted(
+            {r for r in original[:num_players] if WAKE_ORDER[r] < 100},
+            key=WAKE_ORDER.__getitem__,
+        )
+        for seat in range(num_players)
+        if original[seat] == role
+    ]
+
+    def act(cards, seat, role):
+        others = [s for s in range(num_players) if s != seat]
+        if role == "Doppelganger":
+            for target in others:
+                copied = cards[:]
+                copied[seat] = cards[target]
+                for p, after, action, taps in act(copied, seat, cards[target]):
+                    yield p / len(others), after, ("copy", target, cards[target], action), taps
+        elif role == "Werewolf":
+            wolves = tuple(s for s in others if cards[s] == "Werewolf")
+            if wolves:
+                yield 1, cards, ("werewolves", wolves), []
+            else:
+                for i in range(3):
+                    yield 1 / 3, cards, ("center_card", cards[num_players + i]), []
+        elif role == "Seer":
+            center = (cards[num_players], cards[num_players + 1])
+            yield 1 / num_players, cards, ("center", center), []
+            for target in others:
+                yield 1 / num_players, cards, ("seat", target, cards[target]), []
+        elif role == "Robber":
+            for target in others:
+                after = cards[:]
+                after[seat], after[target] = cards[target], cards[seat]
+                yield 1 / len(others), after, ("rob", target, after[seat]), []
+        elif role == "Troublemaker":
+            for first, second in itertools.combinations(others, 2):
+                after = cards[:]
+                after[first], after[second] = cards[second], cards[first]
+                yield 1 / comb(len(others), 2), after, ("swap", first, second), []
+        elif role == "Insomniac":
+            yield 1, cards, ("own_card", cards[seat]), []
+        elif role == "Thing":
+            for tapped in [(seat - 1) % num_players, (seat + 1) % num_players]:
+                yield 1 / 2, cards, ("tap", tapped), [tapped]
+        else:
+            yield 1, cards, None, []
+
+    def play(i, cards, actions, taps):
+        if i == len(actors):
+            yield 1, cards, actions, taps
+            return
+        seat = actors[i]
+        for p, after, action, tapped in act(cards, seat, original[seat]):
+            for q, final, all_actions, all_taps in play(
+                i + 1, after, {**actions, seat: action}, taps + tapped
+            ):
+                yield p * q, final, all_actions, all_taps
+
+    yield from play(0, list(cards), {}, [])
+
+
+def brute_force(role_pool, num_players):
+    """Final role probabilities for every observation, from every deal and choice."""
+    tables = defaultdict(lambda: [Counter() for _ in range(num_players)])
+    deals = set(itertools.permutations(role_pool))
+    for deal in deals:
+        for p, final, actions, taps in play_night(deal, num_players):
+            for seat in range(num_players):
+                observation = NightObservation(
+                    seat, deal[seat], actions.get(seat), taps.count(seat)
+                )
+                for other, card in enumerate(final[:num_players]):
+                    tables[observation][other][card] += p / len(deals)
+    return tables
+
+
+@pytest.mark.parametrize(
+    "role_pool,num_players",
+    [
+        (["Werewolf", "Werewolf", "Doppelganger", "Seer", "Robber", "Troublemaker"], 3),
+        (["Werewolf", "Doppelganger", "Thing", "Insomniac", "Robber", "Tanner"], 3),
+        (
+            ["Werewolf", "Werewolf", "Thing", "Robber", "Troublemaker", "Villager", "Tanner"],
+            4,
+        ),
+    ],
+)
+def test_matches_brute_force(role_pool, num_players):
+    enumerator = NightEnumerator(role_pool, num_players)
+    for observation, table in brute_force(role_pool, num_players).items():
+        total = sum(table[observation.seat].values())
+        expected = [
+            {role: p / total for role, p in seat.items()} for seat in table
+        ]
+        result = enumerator.given(observation)
+        for seat_result, seat_expected in zip(result, expected):
+            assert seat_result.keys() == seat_expected.keys(), observation
+            for role, p in seat_expected.items():
+                assert seat_result[role] == pytest.approx(p), observation
+
+
+def test_impossible_observation_raises():
+    enumerator = NightEnumerator(
+        ["Werewolf", "Werewolf", "Seer", "Robber", "Troublemaker", "Villager", "Tanner", "Insomniac"],
+        5,
+    )
+    with pytest.raises(ValueError):
+        enumerator.given(NightObservation(0, "Seer", ("center", ("Seer", "Villager"))))
+    with pytest.raises(ValueError):
+        enumerator.given(NightObservation(0, "Robber", ("swap", 1, 2)))
+
+
+@pytest.mark.asyncio
+async def test_async_queries_only_use_a_thread_when_cold(monkeypatch):
+    from games.one_night_ultimate_werewolf import night_enumerator
+
+    enumerator = NightEnumerator(
+        ["Werewolf", "Werewolf", "Seer", "Robber", "Troublemaker", "Villager", "Tanner", "Insomniac"],
+        5,
+    )
+    observation = NightObservation(0, "Robber", ("rob", 2, "Werewolf"))
+    num_threaded = 0
+    to_thread = night_enumerator.asyncio.to_thread
+
+    async def counting_to_thread(*args):
+        nonlocal num_threaded
+        num_threaded += 1
+        return await to_thread(*args)
+
+    monkeypatch.setattr(night_enumerator.asyncio, "to_thread", counting_to_thread)
+    cold = await enumerator.given_async(observation)
+    warm = await enumerator.given_async(observation)
+
+    assert num_threaded == 1
+    assert cold is warm
+    fresh = NightEnumerator(list(enumerator.pool_counts.elements()), 5)
+    assert cold == fresh.given(observation)
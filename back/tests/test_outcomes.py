@@ -0,0 +1,59 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from games.one_night_ultimate_werewolf import outcomes
+from games.one_night_ultimate_werewolf.onuw_roles import get_roles_in_game
+
+
+def did_win_loop(roles, votes):
+    """Winners as check_win_condition finds them, one game at a time."""
+    players = [SimpleNamespace(role=role) for role in roles]
+    vote_counts = [0] * len(players)
+    for target in votes:
+        if target != outcomes.ABSTAIN:
+            vote_counts[target] += 1
+    max_votes = max(vote_counts)
+    executed = [
+        p for p, count in zip(players, vote_counts) if count == max_votes and count > 0
+    ]
+    werewolves_exist = any(p.role.name == "Werewolf" for p in players)
+    return [p.role.did_win(p, executed, werewolves_exist) for p in players]
+
+
+@pytest.mark.parametrize("num_players", [3, 5])
+def test_matches_did_win_for_every_vote_pattern(num_players):
+    rng = random.Random(0)
+    patterns = outcomes.all_vote_patterns(num_players)
+    # Include some abstentions, which the deadline policy can produce
+    patterns = np.concatenate([patterns, np.where(patterns % 3 == 0, -1, patterns)])
+
+    for _ in range(10):
+        pool = get_roles_in_game(num_players, rng=rng)
+        rng.shuffle(pool)
+        roles = pool[:num_players]
+        final_roles = np.broadcast_to(
+            outcomes.encode_roles(roles), (len(patterns), num_players)
+        )
+        winners = outcomes.winners_mask(final_roles, patterns)
+        for votes, vectorized in zip(patterns, winners):
+            assert list(vectorized) == did_win_loop(roles, votes)
+
+
+def test_tie_executes_everyone_tied_and_no_votes_executes_nobody():
+    votes = np.array([[1, 0, -1], [1, 2, 0], [1, 2, 1], [-1, -1, -1]])
+    executed = outcomes.executed_mask(votes)
+    assert executed.tolist() == [
+        [True, True, False],
+        [True, True, True],
+        [False, True, False],
+        [False, False, False],
+    ]
+
+
+def test_random_votes_never_vote_for_self():
+    votes = outcomes.random_votes(6, 1000, np.random.default_rng(0))
+    assert not (votes == np.arange(6)).any()
+    assert votes.min() == 0 and votes.max() == 5
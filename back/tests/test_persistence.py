@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+
+from persistence import PersistenceWriter
+
+
+@pytest.mark.asyncio
+async def test_writes_run_in_order_and_coalesce_by_key():
+    writer = PersistenceWriter()
+    gate = threading.Event()
+    written = []
+    # Holds the writer thread so the rest queue up into one batch
+    await writer.submit(gate.wait)
+    futures = [
+        await writer.submit(lambda i=i: written.append(("snapshot", i)), key="snapshot")
+        for i in range(5)
+    ]
+    futures.append(await writer.submit(lambda: written.append(("log", 0)) or "done"))
+    gate.set()
+
+    assert await futures[-1] == "done"
+    await asyncio.gather(*futures)
+    assert written == [("snapshot", 4), ("log", 0)]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_reaches_awaiting_caller():
+    writer = PersistenceWriter()
+
+    def fail():
+        raise OSError("disk full")
+
+    future = await writer.submit(fail)
+    with pytest.raises(OSError):
+        await future
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_waits_without_blocking_loop():
+    writer = PersistenceWriter(max_queued=1)
+    gate = threading.Event()
+    await writer.submit(gate.wait)
+    while writer.queue.qsize():
+        await asyncio.sleep(0.01)  # The writer took the first job
+    await writer.submit(lambda: None)
+
+    blocked = asyncio.ensure_future(writer.submit(lambda: None))
+    await asyncio.sleep(0.05)
+    # The loop still runs, the submit is waiting for room
+    assert not blocked.done()
+    gate.set()
+    await asyncio.wait_for(blocked, 1)
+    writer.close()
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import pytest
+
+from profiling import (
+    Profiler,
+    ProfilingSettings,
+    StackSampler,
+    game_of,
+    tag_task,
+)
+
+
+@pytest.mark.asyncio
+async def test_samples_only_the_profiled_games_tasks():
+    # Sampled from inside the tasks, so which task is running doesn't depend on
+    # when the sampler thread gets the GIL
+    sampler = StackSampler(
+        asyncio.get_running_loop(), threading.get_ident(), "profiled", 0.001, 64
+    )
+
+    async def busy_game():
+        for _ in range(3):
+            sampler.sample()
+            await asyncio.sleep(0)
+
+    async def other_game():
+        for _ in range(3):
+            sampler.sample()
+            await asyncio.sleep(0)
+
+    profiled = asyncio.ensure_future(busy_game())
+    tag_task(profiled, "profiled", main=True)
+    other = asyncio.ensure_future(other_game())
+    tag_task(other, "other", main=True)
+    await asyncio.gather(profiled, other)
+    sampler.sample()  # No task running
+
+    assert (sampler.num_kept, sampler.num_samples) == (3, 7)
+    [(stack, count)] = sampler.stacks.items()
+    assert count == 3
+    assert "busy_game" in stack and "other_game" not in stack
+
+
+@pytest.mark.asyncio
+async def test_profiling_a_game_stops_when_it_ends():
+    profiler = Profiler(ProfilingSettings(interval_s=0.001))
+    main = asyncio.ensure_future(asyncio.sleep(0.05))
+    tag_task(main, "game", main=True)
+
+    profile = await profiler.profile(5, game_id="game")
+
+    assert profile.duration_s < 2
+    assert profile.num_samples > 0
+
+
+@pytest.mark.asyncio
+async def test_tasks_made_by_a_game_are_profiled_with_it():
+    profiler = Profiler(ProfilingSettings(interval_s=0.001))
+    helper_games = []
+
+    async def helper():
+        helper_games.append(game_of(asyncio.current_task()))
+
+    async def game():
+        await asyncio.sleep(0.01)
+        await asyncio.create_task(helper())
+
+    main = asyncio.ensure_future(game())
+    tag_task(main, "game", main=True)
+    await profiler.profile(5, game_id="game")
+
+    assert helper_games == ["game"]
+
+
+@pytest.mark.asyncio
+async def test_one_profile_at_a_time():
+    from profiling import ProfilerBusy
+
+    profiler = Profiler()
+    first = asyncio.create_task(profiler.profile(0.05, mode="cprofile"))
+    await asyncio.sleep(0)
+    with pytest.raises(ProfilerBusy):
+        await profiler.profile(0.05)
+    profile = await first
+    assert "function calls" in profile.text
+    with pytest.raises(ValueError):
+        await profiler.profile(0.05, game_id="game", mode="cprofile")
+
+
+def test_memory_diff_shows_what_grew():
+    profiler = Profiler()
+    try:
+        profiler.memory_diff()
+        held = [bytearray(1000) for _ in range(1000)]
+        diff = profiler.memory_diff(limit=5)
+    finally:
+        profiler.stop_memory_tracing()
+
+    top = diff["top"][0]
+    assert top["sizeDiff"] >= 1000 * 1000
+    assert "test_profiling.py" in top["traceback"][0]
+    assert held
+
+
+def test_admin_endpoints_need_the_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import app
+
+    client = TestClient(app)
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/admin/profile?duration_s=0").status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/admin/profile?duration_s=0").status_code == 403
+    response = client.post(
+        "/admin/profile?duration_s=0.05", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
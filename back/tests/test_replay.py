@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from message_types import VoteResultsMessage
+from player import AIPlayer
+from replay import load_replay
+from replay_runner import run_replay, final_roles
+
+
+async def first_choices_response(self, litellm_prompt):
+    """Deterministic stand-in model that picks the first listed choices."""
+    choices = re.findall(r"^(\d+): ", litellm_prompt.messages[-1]["content"], re.M)
+    return "I choose {" + " ".join(choices[:2]) + "}"
+
+
+def vote_results(game):
+    return next(
+        e.votes
+        for e in game.state.players[0].observations
+        if isinstance(e, VoteResultsMessage)
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "mock_api_response",
+    # The default mock's answers can't be parsed, so every choice is random
+    [first_choices_response, AIPlayer.mock_api_response],
+)
+async def test_replay_reproduces_game(monkeypatch, tmp_path, mock_api_response):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    monkeypatch.setattr("replay.REPLAY_DIR", tmp_path)
+    monkeypatch.setattr(
+        "model_performance.performance_tracker.performance_file",
+        tmp_path / "model_performance.json",
+    )
+    monkeypatch.setattr(AIPlayer, "mock_api_response", mock_api_response)
+
+    game = OneNightWerewolf(num_players=5, record_replay=True)
+    await game.play_game()
+    replay_path = tmp_path / f"{game.id}.jsonl.gz"
+    entries = load_replay(replay_path)
+    assert entries[0]["kind"] == "header"
+    assert sum(entry["kind"] == "llm" for entry in entries) > 0
+
+    monkeypatch.setattr(AIPlayer, "mock_api_response", None)  # No LLM allowed
+    replayed_game = await run_replay(replay_path)
+
+    assert final_roles(replayed_game) == final_roles(game)
+    assert vote_results(replayed_game) == vote_results(game)
+    assert all(not p.responses for p in replayed_game.state.players)
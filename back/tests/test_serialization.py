@@ -0,0 +1,39 @@
+import json
+
+from message_types import SpeechMessage, PlayerActionMessage, PromptMessage
+from serialization import encode_event, decode_client_message
+
+
+def test_encode_event_matches_model_dump():
+    event = SpeechMessage(message="Hello", username="Hal")
+    assert json.loads(encode_event(event)) == event.model_dump()
+
+
+def test_encode_event_is_cached():
+    event = SpeechMessage(message="Hello", username="Hal")
+    assert encode_event(event) is encode_event(event)
+
+
+def test_encode_event_after_setting_a_field():
+    prompt = PromptMessage(message="Vote?")
+    encode_event(prompt)
+    prompt.promptId = "abc"
+    assert json.loads(encode_event(prompt))["promptId"] == "abc"
+
+
+def test_decode_client_message():
+    message = decode_client_message(
+        json.dumps(
+            {
+                "type": "player_action",
+                "player": "Human",
+                "action": "speak",
+                "message": "Hi",
+            }
+        )
+    )
+    assert isinstance(message, PlayerActionMessage)
+    assert message.message == "Hi"
+
+    assert decode_client_message("not json") is None
+    assert decode_client_message(json.dumps({"type": "speech"})) is None
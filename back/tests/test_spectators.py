@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from message_types import SpeechMessage
+from serialization import encode_event
+from spectators import SpectatorHub, Spectator, MAX_PENDING_FRAMES
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self._disconnected = asyncio.Event()
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def receive_text(self):
+        await self._disconnected.wait()
+        raise RuntimeError("disconnected")
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_spectators_get_history_and_live_events():
+    hub = SpectatorHub("GAME")
+    first = SpeechMessage(message="first", username="Hal")
+    hub.publish(first)
+
+    websockets = [FakeWebSocket() for _ in range(3)]
+    serve_tasks = [asyncio.create_task(hub.serve(ws)) for ws in websockets]
+    await asyncio.sleep(0)
+
+    second = SpeechMessage(message="second", username="Eliza")
+    hub.publish(second)
+    hub.close()
+    await asyncio.wait_for(asyncio.gather(*serve_tasks), timeout=1)
+
+    for ws in websockets:
+        assert ws.sent == [encode_event(first), encode_event(second)]
+        assert ws.closed
+    assert not hub.spectators
+
+
+def test_slow_spectator_drops_oldest_frames():
+    spectator = Spectator(FakeWebSocket())
+    for i in range(MAX_PENDING_FRAMES + 5):
+        spectator.push(str(i))
+
+    assert spectator.dropped == 5
+    assert spectator.pending.get_nowait() == "5"
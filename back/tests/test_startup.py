@@ -0,0 +1,53 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# Seconds allowed for `import app`. Was ~8s when litellm was imported eagerly.
+STARTUP_BUDGET = 3.0
+
+HEAVY_MODULES = ["litellm", "aioconsole", "aiohttp"]
+
+BACK_DIR = Path(__file__).parent.parent
+
+
+def profile_import(module: str):
+    """Imports module in a fresh interpreter. Returns (seconds, loaded modules,
+    slowest imports as (cumulative microseconds, name))"""
+    code = (
+        "import sys, time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - start); print(','.join(sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACK_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds, modules = result.stdout.strip().splitlines()[-2:]
+
+    import_times = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                import_times.append((int(cumulative), name.strip()))
+    slowest = sorted(import_times, reverse=True)[:10]
+    return float(seconds), set(modules.split(",")), slowest
+
+
+def test_app_startup_time():
+    seconds, modules, slowest = profile_import("app")
+
+    assert seconds < STARTUP_BUDGET, f"import app took {seconds:.2f}s: {slowest}"
+    for heavy_module in HEAVY_MODULES:
+        assert heavy_module not in modules, f"{heavy_module} imported at startup"
+
+
+def test_performance_tracker_loads_lazily():
+    from model_performance import ModelPerformanceTracker
+
+    tracker = ModelPerformanceTracker()
+    assert tracker._performance_data is None
+    assert isinstance(tracker.performance_data, dict)
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from games.one_night_ultimate_werewolf.game import OneNightWerewolf
+from metrics import metrics
+from supervisor import GameSupervisor, SupervisorSettings
+
+
+@pytest.mark.asyncio
+async def test_pauses_llm_calls_until_a_human_returns():
+    watched = [True]
+    supervisor = GameSupervisor("game", lambda: watched[0])
+    started = []
+
+    async def completion():
+        started.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def game():
+        assert await supervisor.llm_call(completion) == "done"
+
+    runner = asyncio.create_task(supervisor.run(game()))
+    await asyncio.sleep(0.01)
+    watched[0] = False
+    supervisor.presence_changed()
+    await asyncio.sleep(0.1)
+    assert len(started) == 1 and not runner.done()
+
+    watched[0] = True
+    supervisor.presence_changed()
+    await runner
+    assert len(started) == 2  # The cancelled call was made again
+    assert not supervisor.abandoned
+
+
+@pytest.mark.asyncio
+async def test_abandons_game_after_grace(monkeypatch):
+    monkeypatch.setenv("USE_MOCK_API", "true")
+    monkeypatch.setenv("MOCK_API_LATENCY", "0.02")
+    game = OneNightWerewolf(num_players=5, record_replay=False)
+    game.save_replay = lambda: asyncio.sleep(0)
+    watched = [True]
+    game.supervisor = GameSupervisor(
+        game.id, lambda: watched[0], SupervisorSettings(grace_s=0.1)
+    )
+    saved_before = metrics.counters["llm_calls_saved"]
+
+    runner = asyncio.create_task(game.supervisor.run(game.play_game()))
+    await asyncio.sleep(0.05)
+    watched[0] = False
+    game.supervisor.presence_changed()
+    await asyncio.wait_for(runner, timeout=2)
+
+    assert game.supervisor.abandoned and game.game_over
+    assert metrics.counters["llm_calls_saved"] > saved_before
+
+
+def test_humans_count_as_watching_before_they_are_seated(monkeypatch):
+    from app import GameManager
+    from websocket_management import UserLogin, websocket_manager
+
+    login = UserLogin(name="Human", api_key="key")
+    game_manager = GameManager(OneNightWerewolf(num_players=5, login=login))
+    assert not game_manager.is_watched()
+    monkeypatch.setitem(websocket_manager.active_connections, login.user_id, None)
+    assert game_manager.is_watched()
+
+
+@pytest.mark.asyncio
+async def test_abandons_at_once_when_the_last_human_leaves(monkeypatch):
+    from app import GameManager
+    from websocket_management import UserLogin, websocket_manager
+
+    login = UserLogin(name="Human", api_key="leaver")
+    game_manager = GameManager(OneNightWerewolf(num_players=5, login=login))
+    game_manager.game.create_players()
+    monkeypatch.setitem(websocket_manager.active_connections, login.user_id, None)
+
+    runner = asyncio.create_task(game_manager.supervisor.run(asyncio.sleep(10)))
+    await asyncio.sleep(0)
+    game_manager.remove_player(login.user_id)
+    # Well inside the grace window
+    await asyncio.wait_for(runner, timeout=1)
+    assert game_manager.supervisor.abandoned
+
+
+@pytest.mark.asyncio
+async def test_a_game_abandoned_while_queued_never_starts():
+    supervisor = GameSupervisor("game", lambda: False)
+    supervisor.abandon()
+    started = []
+
+    async def game():
+        started.append(True)
+
+    await supervisor.run(game())
+    assert not started
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from message_types import PlayerActionMessage, PromptMessage
+from websocket_management import (
+    DISCONNECTED_MESSAGE,
+    InputSettings,
+    REPLACED_CLOSE_CODE,
+    TokenBucket,
+    WebSocketManager,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+        self.incoming = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def receive_text(self):
+        text = await self.incoming.get()
+        if text is None:
+            raise WebSocketDisconnect()
+        return text
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+        self.incoming.put_nowait(None)
+
+    def prompts(self):
+        return [event for event in self.sent if event["type"] == "prompt"]
+
+
+async def prompted(websocket, num_prompts=1):
+    """The id of the websocket's latest prompt, once it has num_prompts."""
+    while len(websocket.prompts()) < num_prompts:
+        await asyncio.sleep(0)
+    return websocket.prompts()[-1]["promptId"]
+
+
+def answer(message, prompt_id=None):
+    return PlayerActionMessage(
+        player="Human", action="make_choice", message=message, promptId=prompt_id
+    )
+
+
+@pytest.mark.asyncio
+async def test_drops_repeated_and_unprompted_answers():
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "user")
+
+    # Nothing is being asked, so this can't answer the next prompt
+    assert not manager.receive_input("user", answer("stale"))
+
+    first = asyncio.create_task(manager.get_input("user", PromptMessage(message="1?")))
+    first_id = await prompted(websocket)
+    # A message is required, the game can't use None
+    assert not manager.receive_input("user", answer(None, first_id))
+    assert manager.receive_input("user", answer("one", first_id))
+    assert not manager.receive_input("user", answer("one", first_id))
+    assert await first == "one"
+
+    second = asyncio.create_task(manager.get_input("user", PromptMessage(message="2?")))
+    second_id = await prompted(websocket, 2)
+    # An answer to the first prompt, resent after reconnecting
+    assert not manager.receive_input("user", answer("one", first_id))
+    assert manager.receive_input("user", answer("two", second_id))
+    assert await second == "two"
+    assert not manager.pending_inputs
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_replaces_the_connection_and_resends_the_prompt():
+    manager = WebSocketManager()
+    old = FakeWebSocket()
+    await manager.connect(old, "user")
+    old_listener = asyncio.create_task(manager.listen_on_connection(old, "user", None))
+    waiting = asyncio.create_task(manager.get_input("user", PromptMessage(message="?")))
+    await prompted(old)
+
+    new = FakeWebSocket()
+    await manager.connect(new, "user")
+    await asyncio.wait_for(old_listener, timeout=1)
+    assert old.close_code == REPLACED_CLOSE_CODE
+    assert manager.active_connections["user"] is new
+
+    await manager.resume_game("user", "game", None)
+    [resent] = new.prompts()
+    assert resent == old.prompts()[0]
+    new_listener = asyncio.create_task(manager.listen_on_connection(new, "user", None))
+    new.incoming.put_nowait(answer("yes", resent["promptId"]).model_dump_json())
+    assert await asyncio.wait_for(waiting, timeout=1) == "yes"
+
+    new.incoming.put_nowait(None)
+    await new_listener
+    assert "user" not in manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_floods_are_dropped_then_closed():
+    manager = WebSocketManager(
+        InputSettings(rate_per_s=0.001, burst=2, max_rate_limited=5)
+    )
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "user")
+    waiting = asyncio.create_task(manager.get_input("user", PromptMessage(message="?")))
+    prompt_id = await prompted(websocket)
+    for _ in range(2):
+        websocket.incoming.put_nowait(answer("spam").model_dump_json())
+    for _ in range(10):
+        websocket.incoming.put_nowait(answer("late", prompt_id).model_dump_json())
+
+    await asyncio.wait_for(
+        manager.listen_on_connection(websocket, "user", None), timeout=1
+    )
+    assert websocket.close_code == 1008
+    # The first message answered, the rest were dropped
+    assert await waiting == "spam"
+
+
+@pytest.mark.asyncio
+async def test_leaving_answers_pending_prompts_as_disconnected():
+    class NoGames:
+        game_id_to_game_manager = {}
+
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "user")
+    waiting = asyncio.create_task(manager.get_input("user", PromptMessage(message="?")))
+    await prompted(websocket)
+    await manager.handle_leave_game("user", NoGames())
+    assert await waiting == DISCONNECTED_MESSAGE
+
+
+def test_token_bucket_refills():
+    now = [0.0]
+    bucket = TokenBucket(rate_per_s=1, burst=2, clock=lambda: now[0])
+    assert bucket.take() and bucket.take() and not bucket.take()
+    now[0] = 1.0
+    assert bucket.take() and not bucket.take()
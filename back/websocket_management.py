@@ -1,12 +1,23 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Callable, Dict, List
 import asyncio
+import time
+import uuid
 
 from loguru import logger
 from pydantic import BaseModel
 import hashlib
 
-from message_types import BaseEvent, GameConnectMessage, PromptMessage
+from message_types import (
+    BaseEvent,
+    GameConnectMessage,
+    PlayerActionMessage,
+    PromptMessage,
+)
+from logging_config import log_sampled
+from metrics import metrics
+from serialization import encode_event, decode_client_message
 
 
 class UserLogin(BaseModel):
@@ -20,76 +31,193 @@ class UserLogin(BaseModel):
 
 NO_RESPONSE_MESSAGE = "(No response)"
 DISCONNECTED_MESSAGE = "(Disconnected)"
+# Close code for a connection replaced by a newer one from the same user, which the
+# frontend doesn't reconnect after
+REPLACED_CLOSE_CODE = 4000
+POLICY_VIOLATION_CLOSE_CODE = 1008
+
+
+@dataclass
+class InputSettings:
+    # Messages a connection may send per second on average, and at once
+    rate_per_s: float = 2.0
+    burst: int = 10
+    # A connection that keeps sending past the rate limit is closed
+    max_rate_limited: int = 50
+    max_message_chars: int = 4000
+
+
+class TokenBucket:
+    def __init__(
+        self, rate_per_s: float, burst: int, clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated_at = clock()
+
+    def take(self) -> bool:
+        now = self.clock()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated_at) * self.rate_per_s
+        )
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+@dataclass
+class PendingInput:
+    prompt: PromptMessage
+    answer: asyncio.Future
 
 
 class WebSocketManager:
-    def __init__(self):
+    """Each user has one live connection. Input is only taken as the answer to a
+    prompt the user is being asked, matched by the prompt's promptId, so answers
+    to old prompts, repeats and messages sent without a prompt are dropped instead
+    of answering whatever is asked next."""
+
+    def __init__(self, settings: InputSettings = None):
+        self.settings = settings or InputSettings()
         self.active_connections: Dict[str, WebSocket] = {}
-        self.message_queues: Dict[str, asyncio.Queue] = {}
+        # By user, then promptId, oldest first. Kept while the user reconnects.
+        self.pending_inputs: Dict[str, Dict[str, PendingInput]] = {}
 
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
+        replaced = self.active_connections.get(user_id)
         self.active_connections[user_id] = websocket
-        self.message_queues[user_id] = asyncio.Queue()
+        if replaced is not None:
+            logger.info(f"User {user_id} connected again, closing their old connection")
+            metrics.increment("ws_connections_replaced")
+            try:
+                await replaced.close(
+                    code=REPLACED_CLOSE_CODE, reason="Connected somewhere else"
+                )
+            except RuntimeError:
+                # Already closed
+                pass
 
-    def disconnect(self, user_id: str):
-        self.active_connections.pop(user_id, None)
-        self.message_queues.pop(user_id, None)
+    def disconnect(self, user_id: str, websocket: WebSocket = None):
+        """Forgets the user's connection. Given a websocket, only if that's still
+        the live one."""
+        if websocket is None or self.active_connections.get(user_id) is websocket:
+            self.active_connections.pop(user_id, None)
 
     async def send_personal_message(self, message: BaseEvent, user_id: str):
+        await self.send_text(encode_event(message), user_id)
+
+    async def send_text(self, text: str, user_id: str):
+        """Sends already encoded event JSON, see serialization.encode_event"""
         if user_id in self.active_connections:
             try:
                 await asyncio.wait_for(
-                    self.active_connections[user_id].send_json(message.model_dump()),
+                    self.active_connections[user_id].send_text(text),
                     timeout=10.0,
                 )
             except RuntimeError as e:
                 raise RuntimeError(f"User {user_id} unexpectedly disconnected", e)
             except asyncio.TimeoutError:
-                raise RuntimeError(f"Timeout sending message to {user_id}. {message}")
+                raise RuntimeError(f"Timeout sending message to {user_id}. {text}")
         else:
             logger.warning(f"User {user_id} not connected")
 
     async def broadcast(self, message: BaseEvent, users: List[str]):
+        text = encode_event(message)
         for user_id in users:
-            await self.send_personal_message(message, user_id)
-
-    async def receive_message(self, user_id: str):
-        if user_id in self.message_queues:
-            return await self.message_queues[user_id].get()
+            await self.send_text(text, user_id)
 
     async def get_input(self, user_id: str, prompt: PromptMessage, timeout=3 * 60.0):
-        await self.send_personal_message(prompt, user_id)
-        logger.info(f"Waiting for input from {user_id}")
+        if prompt.promptId is None:
+            prompt.promptId = uuid.uuid4().hex[:12]
+        pending = PendingInput(prompt, asyncio.get_running_loop().create_future())
+        user_inputs = self.pending_inputs.setdefault(user_id, {})
+        user_inputs[prompt.promptId] = pending
         try:
-            user_input = await asyncio.wait_for(
-                self.message_queues[user_id].get(), timeout=timeout
+            await self.send_personal_message(prompt, user_id)
+            if user_id not in self.active_connections and not pending.answer.done():
+                logger.warning(f"{user_id} disconnected before responding")
+                return DISCONNECTED_MESSAGE
+            logger.debug("Waiting for input from {}", user_id)
+            user_input = await asyncio.wait_for(pending.answer, timeout=timeout)
+            log_sampled(
+                "input",
+                "INFO",
+                "Got input from {} ({} chars)",
+                user_id,
+                len(user_input or ""),
             )
-            logger.info(f"Got input from {user_id}: {user_input}")
             return user_input
         except asyncio.TimeoutError:
             logger.warning(f"Got no input from {user_id}")
             return NO_RESPONSE_MESSAGE
-        except KeyError:
-            logger.warning(f"{user_id} disconnected before responding")
-            return DISCONNECTED_MESSAGE
+        finally:
+            user_inputs.pop(prompt.promptId, None)
+            if not user_inputs and self.pending_inputs.get(user_id) is user_inputs:
+                del self.pending_inputs[user_id]
+
+    def receive_input(self, user_id: str, client_message: PlayerActionMessage) -> bool:
+        """Answers the prompt the message is for. Messages without a promptId
+        answer the oldest prompt. Returns whether the message was used."""
+        if client_message.message is None:
+            logger.debug("Dropping input from {} with no message", user_id)
+            metrics.increment("ws_inputs_dropped")
+            return False
+        user_inputs = self.pending_inputs.get(user_id, {})
+        if client_message.promptId is None:
+            pending = next(iter(user_inputs.values()), None)
+        else:
+            pending = user_inputs.get(client_message.promptId)
+        if pending is None or pending.answer.done():
+            logger.debug("Dropping input from {} with no prompt to answer", user_id)
+            metrics.increment("ws_inputs_dropped")
+            return False
+        pending.answer.set_result(client_message.message)
+        return True
+
+    def cancel_inputs(self, user_id: str):
+        """Answers every prompt the user is being asked as disconnected."""
+        for pending in self.pending_inputs.get(user_id, {}).values():
+            if not pending.answer.done():
+                pending.answer.set_result(DISCONNECTED_MESSAGE)
 
     async def listen_on_connection(
         self, websocket: WebSocket, user_id: str, server_state
     ):
         logger.info(f"listening to {user_id}")
+        rate_limit = TokenBucket(self.settings.rate_per_s, self.settings.burst)
+        num_rate_limited = 0
         try:
             while True:
-                data = await websocket.receive_json()
-                if "type" in data and data["type"] == "player_action":
-                    if data["action"] == "leave_game":
-                        await self.handle_leave_game(user_id, server_state)
+                text = await websocket.receive_text()
+                # Checked before parsing, so a flood costs as little as possible
+                if not rate_limit.take():
+                    metrics.increment("ws_messages_rate_limited")
+                    num_rate_limited += 1
+                    if num_rate_limited > self.settings.max_rate_limited:
+                        logger.warning(f"Closing {user_id}'s connection for flooding")
+                        self.disconnect(user_id, websocket)
+                        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE)
                         return
-
-                await self.message_queues[user_id].put(data["message"])
+                    continue
+                if len(text) > self.settings.max_message_chars:
+                    metrics.increment("ws_messages_too_long")
+                    continue
+                client_message = decode_client_message(text)
+                if client_message is None:
+                    continue
+                if client_message.action == "leave_game":
+                    await self.handle_leave_game(user_id, server_state)
+                    return
+
+                self.receive_input(user_id, client_message)
         except WebSocketDisconnect:
             logger.info(f"User {user_id} disconnected")
-            self.disconnect(user_id)
+            self.disconnect(user_id, websocket)
 
     async def handle_leave_game(self, user_id: str, server_state):
         for game_id, game_manager in list(server_state.game_id_to_game_manager.items()):
@@ -98,6 +226,7 @@ class WebSocketManager:
                 if not game_manager.players:
                     del server_state.game_id_to_game_manager[game_id]
                 break
+        self.cancel_inputs(user_id)
         self.disconnect(user_id)
 
     async def resume_game(self, user_id: str, game_id: str, web_human_player):
@@ -109,6 +238,10 @@ class WebSocketManager:
         if web_human_player:
             for observation in web_human_player.observations:
                 await self.send_personal_message(observation, user_id)
+        # Sent again as they were, so an answer to one sent before reconnecting
+        # still counts, and only once
+        for pending in list(self.pending_inputs.get(user_id, {}).values()):
+            await self.send_personal_message(pending.prompt, user_id)
 
 
 websocket_manager = WebSocketManager()
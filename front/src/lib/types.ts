@@ -64,6 +64,7 @@ export interface PlayerActionMessage {
   timestamp?: string;
   player: string;
   action: string;
+  promptId?: string | null;
 }
 export interface PromptChoice {
   index: number;
@@ -78,6 +79,7 @@ export interface PromptMessage {
   multiple?: boolean;
   min_choices?: number;
   max_choices?: number | null;
+  promptId?: string | null;
 }
 export interface RulesError {
   type?: "rules_error";
@@ -91,3 +93,13 @@ export interface SpeechMessage {
   username?: string;
   timestamp?: string;
 }
+export interface VoteResultsMessage {
+  type?: "vote_results";
+  message: string;
+  username?: string;
+  timestamp?: string;
+  votes: {
+    [k: string]: string | null;
+  };
+  executed: string[];
+}